@@ -0,0 +1,122 @@
+from dataclasses import asdict, dataclass
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from autosub.models.transcription import Transcription
+from autosub.utils import EnhancedJSONEncoder, hash_file
+
+
+AUDIO = 'audio'
+TRANSCRIPTION = 'transcription'
+TRANSLATION = 'translation'
+
+
+@dataclass
+class StageKeys:
+    """Keys of the artifacts of each stage of subtitling one video"""
+    audio: str
+    transcription: str
+    translation: str
+
+
+def make_key(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf8')).hexdigest()
+
+
+class ArtifactStore:
+    """Directory of the results of each stage of subtitling, addressed by the video content and the stage parameters
+
+    A stage whose key is already in the store does not have to be run again, so that e.g. a re-run with another
+    translator starts from the stored transcription.
+    """
+
+    def __init__(self, directory: str):
+        self._directory = directory
+        for stage in (AUDIO, TRANSCRIPTION, TRANSLATION):
+            os.makedirs(os.path.join(directory, stage), exist_ok=True)
+        self._index_path = os.path.join(directory, 'video_hashes.json')
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger(__name__)
+
+    def _read_index(self) -> Dict[str, Any]:
+        try:
+            with open(self._index_path, 'r', encoding='utf8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write_atomically(self, path: str, write: Callable[[str], None]):
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        write(temporary_path)
+        os.replace(temporary_path, path)
+
+    def video_hash(self, video: str) -> str:
+        """Hash the content of a video, remembering the hash as long as the file size and modification time are unchanged"""
+        stat = os.stat(video)
+        path = os.path.abspath(video)
+        with self._lock:
+            entry = self._read_index().get(path)
+            if entry is not None and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                return entry['sha256']
+
+        self._logger.info(f"Hashing {video}")
+        digest = hash_file(video)
+        with self._lock:
+            index = self._read_index()
+            index[path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest}
+
+            def write(temporary_path: str):
+                with open(temporary_path, 'w', encoding='utf8') as f:
+                    json.dump(index, f, indent=4, ensure_ascii=False)
+            self._write_atomically(self._index_path, write)
+        return digest
+
+    def stage_keys(self, video: str, *, audio_parameters: Tuple, transcription_parameters: Tuple, translation_parameters: Tuple) -> StageKeys:
+        """Derive the key of each stage from the video and the parameters of the stage and of the stages before it"""
+        audio = make_key(AUDIO, self.video_hash(video), *audio_parameters)
+        transcription = make_key(TRANSCRIPTION, audio, *transcription_parameters)
+        translation = make_key(TRANSLATION, transcription, *translation_parameters)
+        return StageKeys(audio=audio, transcription=transcription, translation=translation)
+
+    def audio_path(self, key: str) -> str:
+        return os.path.join(self._directory, AUDIO, f"{key}.wav")
+
+    def ensure_audio(self, key: str, extract: Callable[[str], None]) -> str:
+        """Path of the stored audio, extracted first if it is not stored yet
+
+        Args:
+            key (str): key of the audio stage
+            extract (Callable[[str], None]): writes the audio to the path given
+
+        Returns:
+            str: path of the audio
+        """
+        path = self.audio_path(key)
+        if os.path.exists(path):
+            self._logger.info("Using stored audio")
+        else:
+            # ffmpeg picks the format from the extension, so the temporary file keeps it
+            temporary_path = os.path.join(self._directory, AUDIO, f"{key}.{os.getpid()}.tmp.wav")
+            extract(temporary_path)
+            os.replace(temporary_path, path)
+        return path
+
+    def _transcriptions_path(self, stage: str, key: str) -> str:
+        return os.path.join(self._directory, stage, f"{key}.json")
+
+    def load_transcriptions(self, stage: str, key: str) -> Optional[Tuple[Transcription, ...]]:
+        try:
+            with open(self._transcriptions_path(stage, key), 'r', encoding='utf8') as f:
+                return tuple(Transcription.from_dict(data) for data in json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def save_transcriptions(self, stage: str, key: str, transcriptions: Tuple[Transcription, ...]):
+        def write(temporary_path: str):
+            with open(temporary_path, 'w', encoding='utf8') as f:
+                json.dump([asdict(t) for t in transcriptions], f, cls=EnhancedJSONEncoder, ensure_ascii=False)
+        self._write_atomically(self._transcriptions_path(stage, key), write)
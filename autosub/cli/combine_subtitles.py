@@ -3,13 +3,15 @@ from argparse import ArgumentParser, Namespace
 import json
 import logging
 
-from autosub.models.subtitle import SubtitleFile, SubtitleGroup
-from autosub.models.transcription import Transcription
+from autosub.combine import load_cues_in_parallel, merge_cues, write_merged_subtitles
+from autosub.metrics import metrics
+from autosub.models.subtitle import SubtitleGroup
 
 
 def create_combine_subtitles_parser(subparser: ArgumentParser):
     subparser.add_argument('config')
-    subparser.add_argument('output')
+    subparser.add_argument('output', help='subtitle file in any format pysubs2 supports, .ass, .ssa, .srt and .vtt are written as they are merged')
+    subparser.add_argument('--workers', type=int, default=None, help='processes parsing the subtitle JSONs, defaults to one per group up to the number of CPUs')
     return subparser
 
 
@@ -20,13 +22,13 @@ def combine_subtitles(args: Namespace):
     with open(args.config, 'r', encoding='utf8') as f:
         subtitle_groups_raw = json.load(f)
 
-    logger.info('Constructing combined subtitle file')
     groups = [SubtitleGroup(**raw_dict) for raw_dict in subtitle_groups_raw]
-    combined_subtitle_file = SubtitleFile(groups=groups, prefix_group_name=True)
-    for group in groups:
-        with open(group.json_path, 'r', encoding='utf8') as f:
-            subtitle_dict = json.load(f)
-            combined_subtitle_file.add_all(group.name, [Transcription.from_dict(transcription_dict) for transcription_dict in subtitle_dict['translated']])
+    logger.info(f'Loading {len(groups)} subtitle groups')
+    with metrics.stage('load_subtitles', groups=len(groups)):
+        cues_of_groups = load_cues_in_parallel([group.json_path for group in groups], workers=args.workers)
 
     logger.info('Saving combined subtitle file')
-    combined_subtitle_file.save(args.output)
+    with metrics.stage('merge_subtitles') as span:
+        count = write_merged_subtitles(args.output, groups, merge_cues(cues_of_groups), prefix_group_name=True)
+        span.attributes['lines'] = count
+    logger.info(f'Wrote {count} lines')
@@ -2,10 +2,16 @@ from argparse import ArgumentParser, Namespace
 from dataclasses import asdict
 import json
 import logging
+import os
 from autosub.cli.translation import OpenAITranslationCommand
+from autosub.metrics import metrics
 from autosub.models.translation_context import TranslationContext
+from autosub.providers.base.llm import LLM
+from autosub.providers.cache import CachedLLM
 from autosub.utils import EnhancedJSONEncoder
+from autosub.wiki.context_builder import IncrementalContextBuilder
 from autosub.wiki.context_transformer.jp_creative_work_wikipage_transformer import JPCreativeWorkWikipageTransformer
+from autosub.wiki.selection import HeuristicLLM
 
 from autosub.wiki.transport import WikiTransport
 
@@ -16,30 +22,60 @@ def create_context_parser(subparser: ArgumentParser):
     openai_command = OpenAITranslationCommand()
     openai_command.configure_subparser(subparser)
     subparser.add_argument('output')
+    subparser.add_argument('--wiki-cache-dir', dest='wiki_cache_dir', default=None, help='directory caching wiki pages by revision')
+    subparser.add_argument(
+        '--selection-cache', dest='selection_cache', default=None,
+        help='JSON file remembering the LLM choices of sections and pages, defaults to one inside --wiki-cache-dir',
+    )
+    subparser.add_argument(
+        '--no-heuristic-selection', dest='heuristic_selection', action='store_false',
+        help='always ask the LLM to choose sections and pages, even for obvious matches',
+    )
+    subparser.add_argument(
+        '--full-rebuild', dest='full_rebuild', action='store_true',
+        help='rebuild the context from scratch instead of updating an existing output for changed pages only',
+    )
 
 
 def generate_context(args: Namespace):
     logger = logging.getLogger(__name__)
 
-    openai = OpenAITranslationCommand().create_client(args)
+    llm: LLM = OpenAITranslationCommand().create_client(args)
+    selection_cache = args.selection_cache
+    if selection_cache is None and args.wiki_cache_dir is not None:
+        selection_cache = os.path.join(args.wiki_cache_dir, 'selections.json')
+    if selection_cache is not None:
+        llm = CachedLLM(llm, selection_cache)
+    if args.heuristic_selection:
+        llm = HeuristicLLM(llm)
     transport = WikiTransport(
         base_url=args.wiki_domain,
         user_agent='Test',
+        cache_dir=args.wiki_cache_dir,
     )
 
+    previous = None
+    if not args.full_rebuild and os.path.exists(args.output):
+        with open(args.output, 'r', encoding='utf8') as f:
+            previous = TranslationContext.from_dict(json.load(f))
+
     logger.info("Querying wikipedia")
-    wikipage = transport.retrieve_wikipage(args.wiki_title)
-    context_transformer = JPCreativeWorkWikipageTransformer(
-        llm_transport=openai,
-        wikipage=wikipage,
+    builder = IncrementalContextBuilder(
         wiki_transport=transport,
+        create_transformer=lambda wikipage: JPCreativeWorkWikipageTransformer(
+            llm_transport=llm,
+            wikipage=wikipage,
+            wiki_transport=transport,
+        ),
     )
-    context = TranslationContext(
-        synopsis=context_transformer.prepare_synopsis(),
-        phrases=context_transformer.prepare_phrases(),
-    )
+    with metrics.stage('build_context', title=args.wiki_title, incremental=previous is not None) as span:
+        context = builder.build(args.wiki_title, previous)
+        span.attributes['changed'] = context is not None
+    if context is None:
+        logger.info("Wiki pages have not changed since the context was built")
+        return
     logger.info("Writing context to file")
-    with open(args.output, 'w', encoding='utf8') as f:
+    with metrics.span('write_output'), open(args.output, 'w', encoding='utf8') as f:
         json.dump(
             asdict(context),
             f,
@@ -1,9 +1,14 @@
 from argparse import ArgumentParser
+from datetime import timedelta
+import os
 import textwrap
+from typing import TYPE_CHECKING
 
-from autosub.providers.gcloud import GoogleCloud
 from autosub.utils import get_env_var
 
+if TYPE_CHECKING:
+    from autosub.providers.gcloud import GoogleCloud
+
 
 class GCloudCommandMixin:
     ENV_VAR_SERVICE_ACCOUNT_FILE = 'AUTOSUB_GC_SERVICE_ACCOUNT_FILE'
@@ -11,6 +16,8 @@ class GCloudCommandMixin:
     ENV_VAR_LOCATION_ID = 'AUTOSUB_GC_LOCATION_ID'
     ENV_VAR_GLOSSARY_BUCKET = 'AUTOSUB_GC_GLOSSARY_BUCKET'
     ENV_VAR_AUDIO_BUCKET = 'AUTOSUB_GC_AUDIO_BUCKET'
+    ENV_VAR_GLOSSARY_MAX_AGE_DAYS = 'AUTOSUB_GC_GLOSSARY_MAX_AGE_DAYS'
+    ENV_VAR_AUDIO_MAX_AGE_DAYS = 'AUTOSUB_GC_AUDIO_MAX_AGE_DAYS'
 
     @property
     def provider(self) -> str:
@@ -24,13 +31,21 @@ class GCloudCommandMixin:
                 {self.ENV_VAR_LOCATION_ID} - Google Cloud location id
                 {self.ENV_VAR_GLOSSARY_BUCKET} - Bucket to store gloassary information for transcription
                 {self.ENV_VAR_AUDIO_BUCKET} - Bucket to store audio file for transcription
+            Optionally:
+                {self.ENV_VAR_GLOSSARY_MAX_AGE_DAYS} - Days a glossary can stay unused before it is deleted (default 30)
+                {self.ENV_VAR_AUDIO_MAX_AGE_DAYS} - Days uploaded audio can stay unused before it is deleted (default 7)
         """)
 
-    def create_client(self):
+    def create_client(self, **options) -> 'GoogleCloud':
+        from autosub.providers.gcloud import GoogleCloud
+
         return GoogleCloud(
             service_account_file_path=get_env_var(self.ENV_VAR_SERVICE_ACCOUNT_FILE),
             project_id=get_env_var(self.ENV_VAR_PROJECT_ID),
             location_id=get_env_var(self.ENV_VAR_LOCATION_ID),
             glossary_bucket=get_env_var(self.ENV_VAR_GLOSSARY_BUCKET),
             audio_bucket=get_env_var(self.ENV_VAR_AUDIO_BUCKET),
+            glossary_max_age=timedelta(days=float(os.environ.get(self.ENV_VAR_GLOSSARY_MAX_AGE_DAYS, 30))),
+            audio_max_age=timedelta(days=float(os.environ.get(self.ENV_VAR_AUDIO_MAX_AGE_DAYS, 7))),
+            **options,
         )
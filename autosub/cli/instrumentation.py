@@ -0,0 +1,35 @@
+from argparse import ArgumentParser, Namespace
+from contextlib import contextmanager
+import logging
+from typing import Iterator
+
+from autosub.metrics import metrics
+
+
+def configure_instrumentation_arguments(subparser: ArgumentParser):
+    subparser.add_argument('--metrics-json', dest='metrics_json', default=None, help='write the spans and counters of the run to this JSON file')
+    subparser.add_argument(
+        '--metrics-prometheus',
+        dest='metrics_prometheus',
+        default=None,
+        help='write the counters and span durations of the run to this Prometheus textfile',
+    )
+    subparser.add_argument('--profile', dest='profile', default=None, help='directory to write a cProfile .prof file per stage to')
+
+
+@contextmanager
+def instrumented_run(args: Namespace) -> Iterator[None]:
+    """Record the metrics of a command, and write them out even if it fails"""
+    if args.profile is not None:
+        metrics.enable_profiling(args.profile)
+    try:
+        with metrics.span('run', command=args.action):
+            yield
+    finally:
+        metrics.log_summary()
+        if args.metrics_json is not None:
+            metrics.write_json(args.metrics_json)
+        if args.metrics_prometheus is not None:
+            metrics.write_prometheus(args.metrics_prometheus)
+        if args.metrics_json is not None or args.metrics_prometheus is not None:
+            logging.getLogger(__name__).info("Wrote run metrics")
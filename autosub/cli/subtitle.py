@@ -1,9 +1,12 @@
 from argparse import ArgumentParser, Namespace
-from dataclasses import asdict, replace
+from contextlib import contextmanager
+from dataclasses import asdict
+from functools import lru_cache
 import json
 import logging
 import os
-from typing import Mapping, Optional, Tuple
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, TypeVar
 
 from autosub.cli.transcription import (
     GCloudTranscriptionCommand,
@@ -11,11 +14,28 @@ from autosub.cli.transcription import (
     WhisperTranscriptionCommand,
 )
 from autosub.cli.translation import GCloudTranslationCommand, LLAMATranslationCommand, OpenAITranslationCommand, TranslationCommand
-from autosub.models.language import Languages
+from autosub.artifacts import TRANSCRIPTION, TRANSLATION, ArtifactStore, StageKeys
+from autosub.jsonl_output import TRANSCRIBED, TRANSLATED, SubtitleJSONLWriter, read_progress
+from autosub.metrics import Span, metrics
+from autosub.models.audio import AUDIO_SAMPLE_RATE, AudioWindow
+from autosub.models.language import Language, Languages
+from autosub.models.transcription import Transcription
+from autosub.models.translation_plan import TranslationPlan
 from autosub.models.translation_context import TranslationContext
-from autosub.utils import EnhancedJSONEncoder, extract_audio_as_wav, translate_transcriptions
+from autosub.providers.base.transcriber import StreamingTranscriber, Transcriber
+from autosub.providers.base.translator import Translator
+from autosub.providers.cache import CachedTranslator, TranslationCache, hash_context
+from autosub.utils import (
+    EnhancedJSONEncoder,
+    extract_audio_as_wav,
+    stream_audio_as_pcm,
+    translate_transcriptions,
+    translate_transcriptions_in_batches,
+    translate_transcriptions_pipelined,
+)
 
 
+# Commands only carry the provider names and argparse hooks. Each backend is imported when its provider is selected
 __TRANSCRIPTION_COMMANDS: Tuple[TranscriptionCommand, ...] = (
     WhisperTranscriptionCommand(),
     GCloudTranscriptionCommand(),
@@ -34,12 +54,65 @@ TRANSLATION_COMMANDS: Mapping[str, TranslationCommand] = {
 }
 
 
-def create_subtitle_parser(subparser: ArgumentParser):
-    subparser.add_argument('video', help='path to video file')
+T = TypeVar('T')
+
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.avi', '.mov', '.webm', '.ts', '.m4v')
+
+
+def _configure_common_arguments(subparser: ArgumentParser):
     subparser.add_argument('from_language', type=str, choices=[language.name for language in Languages])
     subparser.add_argument('to_language', type=str, choices=[language.name for language in Languages])
-    subparser.add_argument('output_file', help='path to json output')
+
+
+def _configure_provider_subparsers(subparser: ArgumentParser):
     subparser.add_argument('--context', dest='context', default=None)
+    subparser.add_argument(
+        '--pipeline',
+        dest='pipeline',
+        action='store_true',
+        help='translate segments while later audio is still being transcribed (streaming transcribers only)',
+    )
+    subparser.add_argument(
+        '--audio-window-seconds',
+        dest='audio_window_seconds',
+        type=int,
+        default=600,
+        help='length of audio decoded and transcribed at a time by streaming transcribers',
+    )
+    subparser.add_argument(
+        '--dry-run',
+        dest='dry_run',
+        action='store_true',
+        help='transcribe, then only report the planned translation requests, tokens and cost',
+    )
+    subparser.add_argument(
+        '--fsync-interval-seconds',
+        dest='fsync_interval_seconds',
+        type=float,
+        default=5.0,
+        help='with a .jsonl output, how often segments written so far are forced to disk',
+    )
+    subparser.add_argument(
+        '--artifact-dir',
+        dest='artifact_dir',
+        default=None,
+        help='directory storing the audio, transcription and translation of each video, reused by re-runs with the same parameters',
+    )
+    subparser.add_argument('--translation-cache', dest='translation_cache', default=None, help='path to a SQLite file caching translated lines')
+    subparser.add_argument(
+        '--translation-cache-max-entries',
+        dest='translation_cache_max_entries',
+        type=int,
+        default=None,
+        help='evict the least recently used translations beyond this number',
+    )
+    subparser.add_argument(
+        '--translation-cache-max-age-days',
+        dest='translation_cache_max_age_days',
+        type=float,
+        default=None,
+        help='evict translations older than this',
+    )
 
     transcription_subparsers = subparser.add_subparsers(dest='transcription_provider', help='Provider for transcription')
     for transcription_provider, transcrption_command in TRANSCRIPTION_COMMANDS.items():
@@ -51,46 +124,361 @@ def create_subtitle_parser(subparser: ArgumentParser):
             translation_command.configure_subparser(translation_subparser)
 
 
+def create_subtitle_parser(subparser: ArgumentParser):
+    subparser.add_argument('video', help='path to video file')
+    _configure_common_arguments(subparser)
+    subparser.add_argument(
+        'output_file',
+        help='path to json output, or to a .jsonl output written segment by segment and resumed if interrupted',
+    )
+    _configure_provider_subparsers(subparser)
+
+
+def create_batch_subtitle_parser(subparser: ArgumentParser):
+    subparser.add_argument('videos', help='directory of video files, or a manifest file listing one video path per line')
+    _configure_common_arguments(subparser)
+    subparser.add_argument('output_dir', help='directory to write one json output per video')
+    subparser.add_argument(
+        '--jsonl',
+        dest='jsonl',
+        action='store_true',
+        help='write .jsonl outputs segment by segment, and resume videos whose output was interrupted',
+    )
+    _configure_provider_subparsers(subparser)
+
+
 def load_context(args: Namespace) -> Optional[TranslationContext]:
     if args.context is None:
         return None
 
     with open(args.context, 'r', encoding='utf8') as f:
-        context = TranslationContext.from_dict(json.load(f))
-        context = replace(context, phrases=context.phrases[:30])
-        return context
+        return TranslationContext.from_dict(json.load(f))
 
 
-def generate_subtitle(args: Namespace):
-    logger = logging.getLogger(__name__)
-    from_language = Languages[args.from_language]
-    to_language = Languages[args.to_language]
-
-    transcription_cmd = TRANSCRIPTION_COMMANDS[args.transcription_provider]
-    transcriber = transcription_cmd.create_transcriber(args)
+def _create_translator(args: Namespace) -> Tuple[Translator, Optional[TranslationCache]]:
     translation_cmd = TRANSLATION_COMMANDS[args.translation_provider]
     translator = translation_cmd.create_translator(args)
-    context = load_context(args)
+    if args.translation_cache is None:
+        return translator, None
+
+    cache = TranslationCache(
+        args.translation_cache,
+        max_entries=args.translation_cache_max_entries,
+        max_age_seconds=args.translation_cache_max_age_days * 86400 if args.translation_cache_max_age_days is not None else None,
+    )
+    evicted = cache.evict()
+    if evicted > 0:
+        logging.getLogger(__name__).info(f"Evicted {evicted} cached translations")
+    return CachedTranslator(translator, cache, translation_cmd.cache_namespace(args)), cache
+
+
+def _log_cache_stats(cache: Optional[TranslationCache]):
+    if cache is None:
+        return
+    logging.getLogger(__name__).info(
+        f"Translation cache: {cache.hits} hits, {cache.misses} misses ({cache.hit_rate:.0%} hit rate)"
+    )
+
+
+def _log_translation_plan(plan: Optional[TranslationPlan]):
+    logger = logging.getLogger(__name__)
+    if plan is None:
+        logger.info("Dry run: the translation provider cannot plan its requests ahead")
+        return
+    cost = f"${plan.estimated_cost:.4f}" if plan.estimated_cost is not None else "unknown"
+    logger.info(
+        f"Dry run: {plan.requests} requests, {plan.prompt_tokens} prompt tokens, "
+        f"~{plan.completion_tokens} completion tokens, estimated cost {cost}"
+    )
+
+
+def _list_videos(videos: str) -> List[str]:
+    if os.path.isdir(videos):
+        return sorted(
+            os.path.join(videos, name)
+            for name in os.listdir(videos)
+            if os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS
+        )
+
+    manifest_dir = os.path.dirname(videos)
+    with open(videos, 'r', encoding='utf8') as f:
+        return [
+            os.path.join(manifest_dir, line.strip())
+            for line in f
+            if len(line.strip()) > 0 and not line.lstrip().startswith('#')
+        ]
+
+
+def _batch_output_names(videos: List[str], extension: str) -> Dict[str, str]:
+    """Name the output of each video after it, keeping the video extension only to tell apart videos of the same name"""
+    stems: Dict[str, int] = {}
+    for video in videos:
+        stem = os.path.splitext(os.path.basename(video))[0]
+        stems[stem] = stems.get(stem, 0) + 1
+
+    names: Dict[str, str] = {}
+    videos_by_name: Dict[str, str] = {}
+    for video in videos:
+        base_name = os.path.basename(video)
+        stem = os.path.splitext(base_name)[0]
+        name = (stem if stems[stem] == 1 else base_name) + extension
+        if name in videos_by_name:
+            raise RuntimeError(f"'{video}' and '{videos_by_name[name]}' would both be written to '{name}'")
+        videos_by_name[name] = video
+        names[video] = name
+    return names
+
+
+def _stage_keys(args: Namespace, artifact_store: ArtifactStore, video: str, context: Optional[TranslationContext]) -> StageKeys:
+    context_hash = hash_context(context)
+    return artifact_store.stage_keys(
+        video,
+        audio_parameters=(AUDIO_SAMPLE_RATE,),
+        transcription_parameters=(
+            TRANSCRIPTION_COMMANDS[args.transcription_provider].cache_namespace(args),
+            args.from_language,
+            context_hash,
+        ),
+        translation_parameters=(
+            TRANSLATION_COMMANDS[args.translation_provider].cache_namespace(args),
+            args.to_language,
+            context_hash,
+        ),
+    )
+
+
+def _run_parameters(args: Namespace, video: str, context: Optional[TranslationContext]) -> Dict[str, Any]:
+    """What a .jsonl output depends on, recorded in its header so that it is only resumed by an identical run"""
+    return {
+        'video': os.path.abspath(video),
+        'from_language': args.from_language,
+        'to_language': args.to_language,
+        'transcriber': TRANSCRIPTION_COMMANDS[args.transcription_provider].cache_namespace(args),
+        'translator': TRANSLATION_COMMANDS[args.translation_provider].cache_namespace(args),
+        'context': hash_context(context),
+    }
+
+
+def _create_artifact_store(args: Namespace) -> Optional[ArtifactStore]:
+    return ArtifactStore(args.artifact_dir) if args.artifact_dir is not None else None
+
+
+def _provider_tokens() -> float:
+    return metrics.counter('provider_prompt_tokens_total') + metrics.counter('provider_completion_tokens_total')
+
+
+class _TranscriptionTimer:
+    """Time spent in a transcriber, without the time spent decoding its audio or consuming its segments"""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.audio_seconds_before = metrics.counter('transcribed_audio_seconds_total')
+
+    def _timed(self, iterable: Iterable[T], sign: float) -> Iterator[T]:
+        iterator = iter(iterable)
+        try:
+            while True:
+                started_at = time.perf_counter()
+                try:
+                    item = next(iterator)
+                finally:
+                    self.seconds += sign * (time.perf_counter() - started_at)
+                yield item
+        except StopIteration:
+            return
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+
+    def audio(self, windows: Iterable[AudioWindow]) -> Iterator[AudioWindow]:
+        """Wrap the audio given to a transcriber, whose decoding time is then taken out"""
+        return self._timed(windows, -1)
+
+    def transcriptions(self, transcriptions: Iterable[Transcription]) -> Iterator[Transcription]:
+        return self._timed(transcriptions, 1)
+
+    def call(self, transcribe: Callable[[], Tuple[Transcription, ...]]) -> Tuple[Transcription, ...]:
+        started_at = time.perf_counter()
+        try:
+            return transcribe()
+        finally:
+            self.seconds += time.perf_counter() - started_at
+
+
+def _record_transcription_rate(span: Span, transcriptions: Tuple[Transcription, ...], timer: _TranscriptionTimer):
+    audio_seconds = metrics.counter('transcribed_audio_seconds_total') - timer.audio_seconds_before
+    if audio_seconds <= 0 and len(transcriptions) > 0:
+        # The transcriber does not report the length of its audio
+        audio_seconds = transcriptions[-1].time_end.total_seconds()
+    span.attributes['segments'] = len(transcriptions)
+    span.attributes['audio_seconds'] = round(audio_seconds, 3)
+    span.attributes['transcription_seconds'] = round(timer.seconds, 3)
+    if audio_seconds > 0:
+        span.attributes['real_time_factor'] = round(timer.seconds / audio_seconds, 4)
+
+
+@contextmanager
+def _translation_stage(name: str, **attributes) -> Iterator[Span]:
+    """A stage recording the tokens used by the translation provider while it runs, and their rate"""
+    tokens_before = _provider_tokens()
+    with metrics.stage(name, **attributes) as span:
+        yield span
+        tokens = _provider_tokens() - tokens_before
+        span.attributes['tokens'] = tokens
+        if tokens > 0:
+            span.attributes['tokens_per_second'] = round(tokens / span.elapsed(), 2)
+
+
+def _transcribe_lazily(
+    *,
+    video: str,
+    transcriber: Transcriber,
+    from_language: Language,
+    context: Optional[TranslationContext],
+    audio_window_seconds: int,
+    artifact_store: Optional[ArtifactStore] = None,
+    stage_keys: Optional[StageKeys] = None,
+    timer: Optional[_TranscriptionTimer] = None,
+) -> Iterable[Transcription]:
+    logger = logging.getLogger(__name__)
+    timer = timer if timer is not None else _TranscriptionTimer()
+
+    if isinstance(transcriber, StreamingTranscriber):
+        logger.info("Transcribing audio streamed from the video file")
+        return timer.transcriptions(transcriber.iter_transcribe_stream(
+            from_language,
+            timer.audio(stream_audio_as_pcm(video, window_seconds=audio_window_seconds)),
+            context=context,
+        ))
 
     logger.info("Extracting audio from the video file")
-    audio_path = os.path.splitext(args.video)[0] + '.wav'
-    extract_audio_as_wav(args.video, audio_path)
+    with metrics.span('extract_audio', video=os.path.basename(video)):
+        if artifact_store is not None and stage_keys is not None:
+            audio_path = artifact_store.ensure_audio(stage_keys.audio, lambda path: extract_audio_as_wav(video, path))
+        else:
+            audio_path = os.path.splitext(video)[0] + '.wav'
+            extract_audio_as_wav(video, audio_path)
 
     logger.info("Transcribing audio")
-    transcriptions = transcriber.transcribe(from_language.value, audio_path, context=context)
+    return timer.call(lambda: transcriber.transcribe(from_language, audio_path, context=context))
 
-    logger.info("Translating audio")
-    translation = translate_transcriptions(
-        transcriptions=transcriptions,
-        translator=translator,
-        source_language=from_language.value,
-        target_language=to_language.value,
-        input_description='dialogue from a video',
-        context=context,
-    )
 
-    logger.info(f"Writing to file {args.output_file}")
-    with open(args.output_file, 'w', encoding='utf8') as f:
+def _subtitle_video(
+    *,
+    video: str,
+    output_file: str,
+    get_transcriber: Callable[[], Transcriber],
+    translator: Translator,
+    from_language: Language,
+    to_language: Language,
+    context: Optional[TranslationContext],
+    pipeline: bool,
+    audio_window_seconds: int,
+    dry_run: bool = False,
+    fsync_interval_seconds: float = 5.0,
+    artifact_store: Optional[ArtifactStore] = None,
+    stage_keys: Optional[StageKeys] = None,
+    run_parameters: Optional[Dict[str, Any]] = None,
+) -> Tuple[Transcription, ...]:
+    logger = logging.getLogger(__name__)
+
+    if output_file.endswith('.jsonl') and not dry_run:
+        return _subtitle_video_incrementally(
+            video=video,
+            output_file=output_file,
+            get_transcriber=get_transcriber,
+            translator=translator,
+            from_language=from_language,
+            to_language=to_language,
+            context=context,
+            pipeline=pipeline,
+            audio_window_seconds=audio_window_seconds,
+            fsync_interval_seconds=fsync_interval_seconds,
+            artifact_store=artifact_store,
+            stage_keys=stage_keys,
+            run_parameters=run_parameters if run_parameters is not None else {},
+        )
+
+    def store(stage: str, key: str, value: Tuple[Transcription, ...]):
+        if artifact_store is not None:
+            artifact_store.save_transcriptions(stage, key, value)
+
+    transcriptions: Optional[Tuple[Transcription, ...]] = None
+    translation: Optional[Tuple[Transcription, ...]] = None
+    if artifact_store is not None and stage_keys is not None:
+        transcriptions = artifact_store.load_transcriptions(TRANSCRIPTION, stage_keys.transcription)
+        translation = artifact_store.load_transcriptions(TRANSLATION, stage_keys.translation)
+
+    if transcriptions is not None:
+        logger.info("Using stored transcription")
+    else:
+        # The transcriber is only created, and its model loaded, when there is no stored transcription
+        transcriber = get_transcriber()
+        if isinstance(transcriber, StreamingTranscriber) and pipeline and not dry_run:
+            logger.info("Transcribing and translating audio streamed from the video file")
+            with _translation_stage('transcribe_and_translate', video=os.path.basename(video)) as span:
+                timer = _TranscriptionTimer()
+                transcriptions, translation = translate_transcriptions_pipelined(
+                    transcriptions=timer.transcriptions(transcriber.iter_transcribe_stream(
+                        from_language,
+                        timer.audio(stream_audio_as_pcm(video, window_seconds=audio_window_seconds)),
+                        context=context,
+                    )),
+                    translator=translator,
+                    source_language=from_language,
+                    target_language=to_language,
+                    input_description='dialogue from a video',
+                    context=context,
+                )
+                _record_transcription_rate(span, transcriptions, timer)
+            if stage_keys is not None:
+                store(TRANSLATION, stage_keys.translation, translation)
+        else:
+            with metrics.stage('transcribe', video=os.path.basename(video)) as span:
+                timer = _TranscriptionTimer()
+                transcriptions = tuple(_transcribe_lazily(
+                    video=video,
+                    transcriber=transcriber,
+                    from_language=from_language,
+                    context=context,
+                    audio_window_seconds=audio_window_seconds,
+                    artifact_store=artifact_store,
+                    stage_keys=stage_keys,
+                    timer=timer,
+                ))
+                _record_transcription_rate(span, transcriptions, timer)
+        if stage_keys is not None:
+            store(TRANSCRIPTION, stage_keys.transcription, transcriptions)
+
+    if dry_run:
+        _log_translation_plan(translator.plan_translation(
+            input=[t.text for t in transcriptions],
+            source_language=from_language,
+            target_language=to_language,
+            input_description='dialogue from a video',
+            context=context,
+        ))
+        return transcriptions
+
+    if translation is not None:
+        logger.info("Using stored translation")
+    else:
+        logger.info("Translating audio")
+        with _translation_stage('translate', video=os.path.basename(video), lines=len(transcriptions)):
+            translation = translate_transcriptions(
+                transcriptions=transcriptions,
+                translator=translator,
+                source_language=from_language,
+                target_language=to_language,
+                input_description='dialogue from a video',
+                context=context,
+            )
+        if stage_keys is not None:
+            store(TRANSLATION, stage_keys.translation, translation)
+
+    logger.info(f"Writing to file {output_file}")
+    with metrics.span('write_output', video=os.path.basename(video)), open(output_file, 'w', encoding='utf8') as f:
         json.dump(
             {
                 'transcriptions': [asdict(t) for t in transcriptions],
@@ -101,3 +489,221 @@ def generate_subtitle(args: Namespace):
             indent=4,
             ensure_ascii=False,
         )
+    return transcriptions
+
+
+def _subtitle_video_incrementally(
+    *,
+    video: str,
+    output_file: str,
+    get_transcriber: Callable[[], Transcriber],
+    translator: Translator,
+    from_language: Language,
+    to_language: Language,
+    context: Optional[TranslationContext],
+    pipeline: bool,
+    audio_window_seconds: int,
+    fsync_interval_seconds: float,
+    run_parameters: Dict[str, Any],
+    artifact_store: Optional[ArtifactStore] = None,
+    stage_keys: Optional[StageKeys] = None,
+) -> Tuple[Transcription, ...]:
+    """Subtitle a video into a JSONL file, appending each segment as soon as it is transcribed or translated
+
+    If the file holds a complete transcription from an interrupted run with the same parameters, only the lines not
+    yet translated are translated. Otherwise, the video is subtitled from the start, or from a stored transcription.
+    """
+    logger = logging.getLogger(__name__)
+
+    progress = read_progress(output_file) if os.path.exists(output_file) else None
+    # Compared as read back from JSON, where e.g. tuples become lists
+    run_parameters = json.loads(json.dumps(run_parameters))
+    same_run = progress is not None and progress.parameters == run_parameters
+    resume = progress is not None and same_run and progress.transcription_complete
+    translated: Dict[int, Transcription] = {}
+    with SubtitleJSONLWriter(output_file, append=resume, fsync_interval_seconds=fsync_interval_seconds) as writer:
+        translated_count = 0
+
+        def record_translations(batch: Tuple[Transcription, ...]):
+            nonlocal translated_count
+            for translation in batch:
+                index = indices[translated_count]
+                writer.write_segment(TRANSLATED, index, translation)
+                translated[index] = translation
+                translated_count += 1
+
+        if progress is not None and resume:
+            transcriptions = tuple(progress.transcribed)
+            translated.update(progress.translated)
+            indices = [index for index in range(len(transcriptions)) if index not in translated]
+            logger.info(f"Resuming {output_file}: {len(transcriptions) - len(indices)} of {len(transcriptions)} lines already translated")
+            source: Iterable[Transcription] = [transcriptions[index] for index in indices]
+        else:
+            if progress is not None and not same_run:
+                changed = sorted(key for key in run_parameters if (progress.parameters or {}).get(key) != run_parameters[key])
+                logger.warning(f"{output_file} was written by a run with other parameters ({', '.join(changed)}), starting over")
+            elif progress is not None:
+                logger.info(f"Transcription in {output_file} is incomplete, starting over")
+            writer.write_header(run_parameters)
+            transcribed: List[Transcription] = []
+            indices = []
+
+            def record_transcriptions(stream: Iterable[Transcription]) -> Iterator[Transcription]:
+                for transcription in stream:
+                    writer.write_segment(TRANSCRIBED, len(transcribed), transcription)
+                    indices.append(len(transcribed))
+                    transcribed.append(transcription)
+                    yield transcription
+                writer.write_transcription_complete(len(transcribed))
+                if artifact_store is not None and stage_keys is not None:
+                    artifact_store.save_transcriptions(TRANSCRIPTION, stage_keys.transcription, tuple(transcribed))
+
+            stored: Optional[Tuple[Transcription, ...]] = None
+            stored_translation: Optional[Tuple[Transcription, ...]] = None
+            if artifact_store is not None and stage_keys is not None:
+                stored = artifact_store.load_transcriptions(TRANSCRIPTION, stage_keys.transcription)
+                if stored is not None:
+                    stored_translation = artifact_store.load_transcriptions(TRANSLATION, stage_keys.translation)
+            if stored is not None:
+                logger.info("Using stored transcription")
+                source = list(record_transcriptions(stored))
+                if stored_translation is not None:
+                    logger.info("Using stored translation")
+                    record_translations(stored_translation)
+                    source = []
+            else:
+                timer = _TranscriptionTimer()
+
+                def transcribe() -> Iterator[Transcription]:
+                    return record_transcriptions(_transcribe_lazily(
+                        video=video,
+                        transcriber=get_transcriber(),
+                        from_language=from_language,
+                        context=context,
+                        audio_window_seconds=audio_window_seconds,
+                        artifact_store=artifact_store,
+                        stage_keys=stage_keys,
+                        timer=timer,
+                    ))
+
+                if pipeline:
+                    source = transcribe()
+                else:
+                    with metrics.stage('transcribe', video=os.path.basename(video)) as span:
+                        source = list(transcribe())
+                        _record_transcription_rate(span, tuple(source), timer)
+
+        logger.info("Translating audio")
+        # A source that is not a list yet is still being transcribed while it is translated
+        stage = 'translate' if isinstance(source, list) else 'transcribe_and_translate'
+        with _translation_stage(stage, video=os.path.basename(video)) as span:
+            if isinstance(source, list):
+                # Everything is transcribed already, so batches are filled up instead of sent whenever the queue runs dry
+                translate_transcriptions_in_batches(
+                    transcriptions=source,
+                    translator=translator,
+                    source_language=from_language,
+                    target_language=to_language,
+                    input_description='dialogue from a video',
+                    context=context,
+                    on_translated=record_translations,
+                )
+            else:
+                translate_transcriptions_pipelined(
+                    transcriptions=source,
+                    translator=translator,
+                    source_language=from_language,
+                    target_language=to_language,
+                    input_description='dialogue from a video',
+                    context=context,
+                    on_translated=record_translations,
+                )
+                _record_transcription_rate(span, tuple(transcribed), timer)
+    if not resume:
+        transcriptions = tuple(transcribed)
+    if artifact_store is not None and stage_keys is not None:
+        artifact_store.save_transcriptions(TRANSLATION, stage_keys.translation, tuple(translated[index] for index in range(len(transcriptions))))
+    return transcriptions
+
+
+def generate_subtitle(args: Namespace):
+    from_language = Languages[args.from_language]
+    to_language = Languages[args.to_language]
+
+    transcription_cmd = TRANSCRIPTION_COMMANDS[args.transcription_provider]
+    translator, cache = _create_translator(args)
+    context = load_context(args)
+    artifact_store = _create_artifact_store(args)
+
+    _subtitle_video(
+        video=args.video,
+        output_file=args.output_file,
+        get_transcriber=lambda: transcription_cmd.create_transcriber(args),
+        translator=translator,
+        from_language=from_language.value,
+        to_language=to_language.value,
+        context=context,
+        pipeline=args.pipeline,
+        audio_window_seconds=args.audio_window_seconds,
+        dry_run=args.dry_run,
+        fsync_interval_seconds=args.fsync_interval_seconds,
+        artifact_store=artifact_store,
+        stage_keys=_stage_keys(args, artifact_store, args.video, context) if artifact_store is not None else None,
+        run_parameters=_run_parameters(args, args.video, context),
+    )
+    _log_cache_stats(cache)
+
+
+def generate_subtitle_batch(args: Namespace):
+    logger = logging.getLogger(__name__)
+    from_language = Languages[args.from_language]
+    to_language = Languages[args.to_language]
+
+    videos = _list_videos(args.videos)
+    if len(videos) == 0:
+        raise RuntimeError(f"No video found in '{args.videos}'")
+    output_names = _batch_output_names(videos, '.jsonl' if args.jsonl else '.json')
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # Loaded once, for the first video without a stored transcription
+    get_transcriber = lru_cache(maxsize=None)(lambda: TRANSCRIPTION_COMMANDS[args.transcription_provider].create_transcriber(args))
+    translator, cache = _create_translator(args)
+    context = load_context(args)
+    artifact_store = _create_artifact_store(args)
+
+    total_elapsed = 0.0
+    total_audio_seconds = 0.0
+    for index, video in enumerate(videos):
+        logger.info(f"[{index + 1}/{len(videos)}] Subtitling {video}")
+        started_at = time.perf_counter()
+        transcriptions = _subtitle_video(
+            video=video,
+            output_file=os.path.join(args.output_dir, output_names[video]),
+            get_transcriber=get_transcriber,
+            translator=translator,
+            from_language=from_language.value,
+            to_language=to_language.value,
+            context=context,
+            pipeline=args.pipeline,
+            audio_window_seconds=args.audio_window_seconds,
+            dry_run=args.dry_run,
+            fsync_interval_seconds=args.fsync_interval_seconds,
+            artifact_store=artifact_store,
+            stage_keys=_stage_keys(args, artifact_store, video, context) if artifact_store is not None else None,
+            run_parameters=_run_parameters(args, video, context),
+        )
+        elapsed = time.perf_counter() - started_at
+        # The end of the last segment is a lower bound of the audio duration, good enough to compare runs
+        audio_seconds = transcriptions[-1].time_end.total_seconds() if len(transcriptions) > 0 else 0.0
+        total_elapsed += elapsed
+        total_audio_seconds += audio_seconds
+        logger.info(
+            f"[{index + 1}/{len(videos)}] Finished {video} in {elapsed:.1f}s "
+            f"({len(transcriptions)} segments, {audio_seconds / elapsed:.2f}x real time)"
+        )
+
+    logger.info(
+        f"Subtitled {len(videos)} videos in {total_elapsed:.1f}s "
+        f"({total_elapsed / len(videos):.1f}s per video, {total_audio_seconds / total_elapsed:.2f}x real time)"
+    )
+    _log_cache_stats(cache)
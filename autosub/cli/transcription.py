@@ -1,9 +1,9 @@
 from abc import ABC, abstractmethod, abstractproperty
 from argparse import ArgumentParser, Namespace
+import warnings
 
 from autosub.cli.gcloud import GCloudCommandMixin
 from autosub.providers.base.transcriber import Transcriber
-from autosub.providers.whisper import Whisper
 
 
 class TranscriptionCommand(ABC):
@@ -19,6 +19,10 @@ class TranscriptionCommand(ABC):
     def create_transcriber(self, args: Namespace) -> Transcriber:
         ...
 
+    def cache_namespace(self, args: Namespace) -> str:
+        """Identify the provider, model and options that change the transcription, so that stored transcriptions are kept apart"""
+        return self.provider
+
 
 class WhisperTranscriptionCommand(TranscriptionCommand):
     @property
@@ -27,11 +31,62 @@ class WhisperTranscriptionCommand(TranscriptionCommand):
 
     def configure_subparser(self, subparser: ArgumentParser):
         subparser.add_argument('whisper_model', type=str)
+        subparser.add_argument(
+            '--whisper-workers',
+            dest='whisper_workers',
+            type=int,
+            default=1,
+            help='number of processes transcribing audio chunks in parallel',
+        )
+        subparser.add_argument(
+            '--whisper-chunk-seconds',
+            dest='whisper_chunk_seconds',
+            type=float,
+            default=120,
+            help='preferred length of the chunks transcribed in parallel, cut at the nearest silence',
+        )
 
     def create_transcriber(self, args: Namespace) -> Transcriber:
+        # Whisper pulls in torch and numba, so it is only imported once selected
+        from numba.core.errors import NumbaDeprecationWarning
+        warnings.simplefilter('ignore', category=NumbaDeprecationWarning)
+        from autosub.providers.whisper import ParallelWhisper, Whisper
+
+        if args.whisper_workers > 1:
+            return ParallelWhisper(args.whisper_model, workers=args.whisper_workers, chunk_seconds=args.whisper_chunk_seconds)
         return Whisper(args.whisper_model)
 
+    def cache_namespace(self, args: Namespace) -> str:
+        if args.whisper_workers > 1:
+            # Chunks are cut at different places than the windows of a single process
+            return f"{self.provider}:{args.whisper_model}:chunks={args.whisper_chunk_seconds}"
+        # Whisper transcribes the streamed audio one window at a time, its segments depend on where windows end
+        return f"{self.provider}:{args.whisper_model}:window={args.audio_window_seconds}"
+
 
 class GCloudTranscriptionCommand(GCloudCommandMixin, TranscriptionCommand):
+    def configure_subparser(self, subparser: ArgumentParser):
+        super().configure_subparser(subparser)
+        subparser.add_argument(
+            '--gcloud-chunk-seconds',
+            dest='gcloud_chunk_seconds',
+            type=float,
+            default=None,
+            help='split the audio into chunks of about this length, recognised concurrently (default: one recognition for the whole file)',
+        )
+        subparser.add_argument(
+            '--gcloud-max-concurrent-recognitions',
+            dest='gcloud_max_concurrent_recognitions',
+            type=int,
+            default=4,
+            help='maximum number of chunks recognised at the same time',
+        )
+
     def create_transcriber(self, args: Namespace) -> Transcriber:
-        return self.create_client()
+        return self.create_client(
+            chunk_seconds=args.gcloud_chunk_seconds,
+            max_concurrent_recognitions=args.gcloud_max_concurrent_recognitions,
+        )
+
+    def cache_namespace(self, args: Namespace) -> str:
+        return f"{self.provider}:chunks={args.gcloud_chunk_seconds}"
@@ -1,14 +1,17 @@
 
 from abc import ABC, abstractmethod, abstractproperty
 from argparse import ArgumentParser, Namespace
+import os
 import textwrap
+from typing import TYPE_CHECKING
 from autosub.cli.gcloud import GCloudCommandMixin
 
 from autosub.providers.base.translator import Translator
-from autosub.providers.llama import LLAMA
-from autosub.providers.openai import OpenAI
 from autosub.utils import get_env_var
 
+if TYPE_CHECKING:
+    from autosub.providers.openai import OpenAI
+
 
 class TranslationCommand(ABC):
     @abstractproperty
@@ -23,6 +26,10 @@ class TranslationCommand(ABC):
     def create_translator(self, args: Namespace) -> Translator:
         ...
 
+    def cache_namespace(self, args: Namespace) -> str:
+        """Identify the provider and model, so that cached translations of different models are kept apart"""
+        return self.provider
+
 
 class OpenAITranslationCommand(TranslationCommand):
     ENV_VAR_API_KEY = 'AUTOSUB_OPENAI_API_KEY'
@@ -33,20 +40,65 @@ class OpenAITranslationCommand(TranslationCommand):
 
     def configure_subparser(self, subparser: ArgumentParser):
         subparser.add_argument('openai_model', help='OpenAI LLM model (e.g. gpt-3.5-turbo)')
+        subparser.add_argument('--openai-concurrency', dest='openai_concurrency', type=int, default=4, help='maximum number of requests in flight')
+        subparser.add_argument('--openai-rpm', dest='openai_rpm', type=int, default=None, help='requests per minute allowed for the API key')
+        subparser.add_argument('--openai-tpm', dest='openai_tpm', type=int, default=None, help='tokens per minute allowed for the API key')
+        subparser.add_argument('--openai-max-retries', dest='openai_max_retries', type=int, default=5, help='retries on rate limit and server errors')
+        subparser.add_argument('--openai-context-window', dest='openai_context_window', type=int, default=4096, help='context window of the model in tokens')
+        subparser.add_argument(
+            '--openai-max-lines-per-request',
+            dest='openai_max_lines_per_request',
+            type=int,
+            default=None,
+            help='cap on the lines per request, by default requests are only limited by the context window',
+        )
+        subparser.add_argument(
+            '--openai-base-url',
+            dest='openai_base_url',
+            default=None,
+            help='root of an OpenAI compatible API to use instead of OpenAI (e.g. http://localhost:8000/v1)',
+        )
+        subparser.add_argument('--openai-timeout', dest='openai_timeout', type=float, default=None, help='seconds to wait for the response to each request')
+        subparser.add_argument(
+            '--openai-connect-timeout',
+            dest='openai_connect_timeout',
+            type=float,
+            default=10.0,
+            help='seconds to wait for a connection to the API, used with --openai-timeout',
+        )
         subparser.epilog = textwrap.dedent(f"""\
             Following environment variables need to be set:
-                {self.ENV_VAR_API_KEY} - API key for OpenAI
+                {self.ENV_VAR_API_KEY} - API key for OpenAI, optional with --openai-base-url
         """)
 
-    def create_client(self, args: Namespace) -> OpenAI:
+    def create_client(self, args: Namespace) -> 'OpenAI':
+        from autosub.providers.openai import OpenAI
+
+        # Local OpenAI compatible servers usually ignore the key, but the openai library requires one
+        api_key = os.environ.get(self.ENV_VAR_API_KEY, 'none') if args.openai_base_url is not None else get_env_var(self.ENV_VAR_API_KEY)
         return OpenAI(
-            api_key=get_env_var(self.ENV_VAR_API_KEY),
-            model=args.openai_model
+            api_key=api_key,
+            model=args.openai_model,
+            max_concurrency=args.openai_concurrency,
+            requests_per_minute=args.openai_rpm,
+            tokens_per_minute=args.openai_tpm,
+            max_retries=args.openai_max_retries,
+            context_window=args.openai_context_window,
+            max_items_per_batch=args.openai_max_lines_per_request,
+            base_url=args.openai_base_url,
+            timeout_seconds=args.openai_timeout,
+            connect_timeout_seconds=args.openai_connect_timeout,
         )
 
     def create_translator(self, args: Namespace) -> Translator:
         return self.create_client(args)
 
+    def cache_namespace(self, args: Namespace) -> str:
+        if args.openai_base_url is not None:
+            # Another server may serve a different model under the same name
+            return f"{self.provider}:{args.openai_base_url}:{args.openai_model}"
+        return f"{self.provider}:{args.openai_model}"
+
 
 class GCloudTranslationCommand(GCloudCommandMixin, TranslationCommand):
     def create_translator(self, args: Namespace) -> Translator:
@@ -60,6 +112,17 @@ class LLAMATranslationCommand(TranslationCommand):
 
     def configure_subparser(self, subparser: ArgumentParser):
         subparser.add_argument('llama_model', help='Path to LLAMA model gguf file')
+        subparser.add_argument(
+            '--llama-batch',
+            dest='llama_batch_lines',
+            action='store_true',
+            help='translate numbered groups of lines per completion, falling back to one line at a time for lines that do not line up',
+        )
 
     def create_translator(self, args: Namespace) -> Translator:
-        return LLAMA(model=args.llama_model)
+        from autosub.providers.llama import LLAMA
+
+        return LLAMA(model=args.llama_model, batch_lines=args.llama_batch_lines)
+
+    def cache_namespace(self, args: Namespace) -> str:
+        return f"{self.provider}:{os.path.basename(args.llama_model)}"
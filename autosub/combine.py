@@ -0,0 +1,186 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+import heapq
+import json
+import os
+from datetime import timedelta
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple, Type
+
+from autosub.jsonl_output import read_translated
+from autosub.models.subtitle import SubtitleFile, SubtitleGroup
+from autosub.models.transcription import Transcription
+
+
+# (start ms, end ms, text)
+Cue = Tuple[int, int, str]
+# (start ms, index of group, end ms, text), ordered by time and then by group
+MergedCue = Tuple[int, int, int, str]
+
+
+def parse_time_ms(value: str) -> int:
+    """Parse a time as written by EnhancedJSONEncoder, e.g. '01:02:03.450000', into milliseconds"""
+    hours, minutes, seconds = value.split(':')
+    return round((int(hours) * 3600 + int(minutes) * 60 + float(seconds)) * 1000)
+
+
+def load_cues(json_path: str) -> List[Cue]:
+    """Load the translated lines of a subtitle JSON or JSONL, sorted by start time"""
+    if json_path.endswith('.jsonl'):
+        entries = read_translated(json_path)
+    else:
+        with open(json_path, 'r', encoding='utf8') as f:
+            entries = json.load(f)['translated']
+    cues = [
+        (parse_time_ms(entry['time_start']), parse_time_ms(entry['time_end']), entry['text'])
+        for entry in entries
+    ]
+    cues.sort(key=lambda cue: cue[0])
+    return cues
+
+
+def load_cues_in_parallel(json_paths: List[str], workers: Optional[int] = None) -> List[List[Cue]]:
+    """Parse many subtitle JSONs at once in worker processes
+
+    Args:
+        json_paths (List[str]): paths of the subtitle JSONs
+        workers (Optional[int]): number of processes, defaults to one per file up to the number of CPUs
+
+    Returns:
+        List[List[Cue]]: cues of each file, in the order of the paths
+    """
+    if workers is None:
+        workers = min(len(json_paths), os.cpu_count() or 1)
+    if workers <= 1 or len(json_paths) <= 1:
+        return [load_cues(path) for path in json_paths]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(load_cues, json_paths))
+
+
+def _tag_group(group_index: int, cues: Iterable[Cue]) -> Iterator[MergedCue]:
+    return ((start, group_index, end, text) for (start, end, text) in cues)
+
+
+def merge_cues(cues_of_groups: Iterable[Iterable[Cue]]) -> Iterable[MergedCue]:
+    """Merge cues of many groups, each sorted by start time, into one stream sorted by start time"""
+    # The index is bound by _tag_group, a generator expression here would only read it once all streams are built
+    streams = [_tag_group(group_index, cues) for (group_index, cues) in enumerate(cues_of_groups)]
+    return heapq.merge(*streams)
+
+
+class SubtitleStreamWriter(ABC):
+    """Write cues to a subtitle file one at a time, without holding the whole file in memory"""
+
+    def __init__(self, fp: IO[str], groups: List[SubtitleGroup], prefix_group_name: bool = False):
+        self._fp = fp
+        self._groups = groups
+        self._prefix_group_name = prefix_group_name
+        self._count = 0
+
+    def _text(self, group: SubtitleGroup, text: str) -> str:
+        return f"{group.name + ': ' if self._prefix_group_name else ''}{text}"
+
+    def write_header(self):
+        ...
+
+    @abstractmethod
+    def write(self, start_ms: int, end_ms: int, group: SubtitleGroup, text: str):
+        ...
+
+    def write_all(self, cues: Iterable[MergedCue]) -> int:
+        """Write merged cues
+
+        Returns:
+            int: number of cues written
+        """
+        self.write_header()
+        for (start_ms, group_index, end_ms, text) in cues:
+            self.write(start_ms, end_ms, self._groups[group_index], text)
+        return self._count
+
+
+class AssStreamWriter(SubtitleStreamWriter):
+    FORMAT = 'ass'
+    # The first field of an event, its layer in ASS
+    EVENT_PREFIX = '0'
+
+    @staticmethod
+    def _timestamp(ms: int) -> str:
+        centiseconds = round(max(ms, 0) / 10)
+        hours, centiseconds = divmod(centiseconds, 360000)
+        minutes, centiseconds = divmod(centiseconds, 6000)
+        seconds, centiseconds = divmod(centiseconds, 100)
+        return '%d:%02d:%02d.%02d' % (hours, minutes, seconds, centiseconds)
+
+    def write_header(self):
+        # Styles of the groups are defined in the same way as for a SubtitleFile
+        self._fp.write(SubtitleFile(groups=self._groups).to_string(self.FORMAT).rstrip('\n') + '\n')
+
+    def write(self, start_ms: int, end_ms: int, group: SubtitleGroup, text: str):
+        text = self._text(group, text).replace('\n', '\\N')
+        self._fp.write(f"Dialogue: {self.EVENT_PREFIX},{self._timestamp(start_ms)},{self._timestamp(end_ms)},{group.name},,0,0,0,,{text}\n")
+        self._count += 1
+
+
+class SsaStreamWriter(AssStreamWriter):
+    """SubStation Alpha v4, which has V4 styles and marks events instead of layering them"""
+    FORMAT = 'ssa'
+    EVENT_PREFIX = 'Marked=0'
+
+
+class SrtStreamWriter(SubtitleStreamWriter):
+    TIMESTAMP_FORMAT = '%02d:%02d:%02d,%03d'
+
+    def _timestamp(self, ms: int) -> str:
+        hours, ms = divmod(max(ms, 0), 3600000)
+        minutes, ms = divmod(ms, 60000)
+        seconds, ms = divmod(ms, 1000)
+        return self.TIMESTAMP_FORMAT % (hours, minutes, seconds, ms)
+
+    def write(self, start_ms: int, end_ms: int, group: SubtitleGroup, text: str):
+        self._count += 1
+        self._fp.write(f"{self._count}\n{self._timestamp(start_ms)} --> {self._timestamp(end_ms)}\n{self._text(group, text)}\n\n")
+
+
+class VttStreamWriter(SrtStreamWriter):
+    TIMESTAMP_FORMAT = '%02d:%02d:%02d.%03d'
+
+    def write_header(self):
+        self._fp.write("WEBVTT\n\n")
+
+
+STREAM_WRITERS: Dict[str, Type[SubtitleStreamWriter]] = {
+    '.ass': AssStreamWriter,
+    '.ssa': SsaStreamWriter,
+    '.srt': SrtStreamWriter,
+    '.vtt': VttStreamWriter,
+}
+
+
+def write_merged_subtitles(
+    output_path: str,
+    groups: List[SubtitleGroup],
+    cues: Iterable[MergedCue],
+    prefix_group_name: bool = False,
+) -> int:
+    """Write merged cues to a subtitle file, in the format given by its extension
+
+    .ass, .ssa, .srt and .vtt are streamed, other formats supported by pysubs2 are built in memory and saved by it.
+
+    Returns:
+        int: number of cues written
+    """
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension in STREAM_WRITERS:
+        with open(output_path, 'w', encoding='utf8') as f:
+            return STREAM_WRITERS[extension](f, groups, prefix_group_name).write_all(cues)
+
+    subtitle_file = SubtitleFile(groups=groups, prefix_group_name=prefix_group_name)
+    count = 0
+    for (start_ms, group_index, end_ms, text) in cues:
+        subtitle_file.add(
+            groups[group_index].name,
+            Transcription(speaker=None, text=text, time_start=timedelta(milliseconds=start_ms), time_end=timedelta(milliseconds=end_ms)),
+        )
+        count += 1
+    subtitle_file.save(output_path)
+    return count
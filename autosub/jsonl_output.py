@@ -0,0 +1,151 @@
+from dataclasses import dataclass, field
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from autosub.models.transcription import Transcription
+
+
+HEADER = 'header'
+TRANSCRIBED = 'transcribed'
+TRANSCRIPTION_COMPLETE = 'transcription_complete'
+TRANSLATED = 'translated'
+
+
+def format_timedelta(value: datetime.timedelta) -> str:
+    """Format a timedelta as a time of day, the way EnhancedJSONEncoder does"""
+    return (datetime.datetime.min + value).time().isoformat()
+
+
+def _truncate_incomplete_line(path: str, block_size: int = 4096):
+    """Cut off a last line left unterminated by a crash, so that appended records start on a line of their own"""
+    with open(path, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(position - block_size, 0)
+            f.seek(start)
+            block = f.read(position - start)
+            newline = block.rfind(b'\n')
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        if position < end:
+            f.truncate(position)
+
+
+class SubtitleJSONLWriter:
+    """Append transcribed and translated segments to a JSONL file as soon as they exist
+
+    A new file starts with a header recording the parameters of the run, which a resumed run must match.
+
+    Every record is flushed to the operating system when written, so a crash of the process loses nothing. The file is
+    also fsynced at most every fsync_interval_seconds, and on close, to survive a crash of the machine.
+    """
+
+    def __init__(self, path: str, *, append: bool = False, fsync_interval_seconds: float = 5.0):
+        if append:
+            _truncate_incomplete_line(path)
+        self._file = open(path, 'a' if append else 'w', encoding='utf8')
+        self._lock = threading.Lock()
+        self._fsync_interval_seconds = fsync_interval_seconds
+        self._last_fsync = time.monotonic()
+
+    def __enter__(self) -> 'SubtitleJSONLWriter':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            now = time.monotonic()
+            if now - self._last_fsync >= self._fsync_interval_seconds:
+                os.fsync(self._file.fileno())
+                self._last_fsync = now
+
+    def write_header(self, parameters: Dict[str, Any]):
+        self._write({'type': HEADER, 'parameters': parameters})
+
+    def write_segment(self, record_type: str, index: int, transcription: Transcription):
+        self._write({
+            'type': record_type,
+            'index': index,
+            'speaker': transcription.speaker,
+            'text': transcription.text,
+            'time_start': format_timedelta(transcription.time_start),
+            'time_end': format_timedelta(transcription.time_end),
+        })
+
+    def write_transcription_complete(self, count: int):
+        self._write({'type': TRANSCRIPTION_COMPLETE, 'count': count})
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+
+def iter_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream the records of a subtitle JSONL file
+
+    A last line cut short by a crash is skipped.
+
+    Args:
+        path (str): path of the file
+
+    Yields:
+        Dict[str, Any]: the records, as parsed from JSON
+    """
+    with open(path, 'r', encoding='utf8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                if line.endswith('\n'):
+                    raise
+                logging.getLogger(__name__).warning(f"Ignoring an incomplete last record in {path}")
+
+
+@dataclass
+class SubtitleProgress:
+    parameters: Optional[Dict[str, Any]] = None
+    transcribed: List[Transcription] = field(default_factory=list)
+    transcription_complete: bool = False
+    translated: Dict[int, Transcription] = field(default_factory=dict)
+
+
+def read_progress(path: str) -> SubtitleProgress:
+    """Read what an earlier, possibly interrupted, run has written"""
+    progress = SubtitleProgress()
+    for record in iter_records(path):
+        if record['type'] == HEADER:
+            progress.parameters = record['parameters']
+        elif record['type'] == TRANSCRIBED:
+            progress.transcribed.append(Transcription.from_dict(record))
+        elif record['type'] == TRANSCRIPTION_COMPLETE:
+            progress.transcription_complete = record['count'] == len(progress.transcribed)
+        elif record['type'] == TRANSLATED:
+            progress.translated[record['index']] = Transcription.from_dict(record)
+    return progress
+
+
+def read_translated(path: str) -> List[Dict[str, Any]]:
+    """Read the translated segments of a subtitle JSONL file in the order of the transcription
+
+    Returns:
+        List[Dict[str, Any]]: the records of the translated segments
+    """
+    translated = {record['index']: record for record in iter_records(path) if record['type'] == TRANSLATED}
+    return [translated[index] for index in sorted(translated)]
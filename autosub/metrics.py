@@ -0,0 +1,164 @@
+from contextlib import contextmanager
+import cProfile
+from dataclasses import dataclass, field
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+def _escape_label_value(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+@dataclass
+class Span:
+    name: str
+    started_at: float
+    seconds: float = 0.0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    _perf_started_at: float = field(default_factory=time.perf_counter, repr=False)
+
+    def elapsed(self) -> float:
+        """Seconds since the span started, for rates computed before it ends"""
+        return time.perf_counter() - self._perf_started_at
+
+
+CounterKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class Metrics:
+    """Spans and counters of one run, shared by the CLI and the providers
+
+    Stages are spans that are also profiled with cProfile when a profile directory is set. Only the thread that
+    enters a stage is profiled.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans: List[Span] = []
+        self._counters: Dict[CounterKey, float] = {}
+        self._profile_dir: Optional[str] = None
+        self._profile_count = 0
+        self._profiling = False
+
+    def reset(self):
+        with self._lock:
+            self._spans = []
+            self._counters = {}
+            self._profile_count = 0
+
+    def enable_profiling(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self._profile_dir = directory
+
+    def increment(self, name: str, value: float = 1, **labels: Any):
+        key = (name, tuple(sorted((label, str(label_value)) for (label, label_value) in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def counter(self, name: str, **labels: Any) -> float:
+        """Sum of a counter over all label values, or of the ones matching the labels given"""
+        expected = {(label, str(label_value)) for (label, label_value) in labels.items()}
+        with self._lock:
+            return sum(value for ((counter_name, counter_labels), value) in self._counters.items() if counter_name == name and expected <= set(counter_labels))
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """Time a block of work, the span can be given more attributes while it runs"""
+        span = Span(name=name, started_at=time.time(), attributes=dict(attributes))
+        try:
+            yield span
+        finally:
+            span.seconds = span.elapsed()
+            with self._lock:
+                self._spans.append(span)
+
+    @contextmanager
+    def stage(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """A span of one stage of a run, profiled if profiling is enabled and no other stage is being profiled"""
+        profiler: Optional[cProfile.Profile] = None
+        profile_path = ''
+        with self._lock:
+            if self._profile_dir is not None and not self._profiling:
+                self._profiling = True
+                self._profile_count += 1
+                file_name = re.sub(r'[^\w.-]+', '_', name)
+                profile_path = os.path.join(self._profile_dir, f"{self._profile_count:03d}-{file_name}.prof")
+                profiler = cProfile.Profile()
+        with self.span(name, stage=True, **attributes) as span:
+            if profiler is not None:
+                profiler.enable()
+            try:
+                yield span
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                    profiler.dump_stats(profile_path)
+                    span.attributes['profile'] = profile_path
+                    with self._lock:
+                        self._profiling = False
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'spans': [
+                    {'name': span.name, 'started_at': span.started_at, 'seconds': span.seconds, **span.attributes}
+                    for span in self._spans
+                ],
+                'counters': [
+                    {'name': name, 'labels': dict(labels), 'value': value}
+                    for ((name, labels), value) in sorted(self._counters.items())
+                ],
+            }
+
+    def write_json(self, path: str):
+        with open(path, 'w', encoding='utf8') as f:
+            json.dump(self.report(), f, indent=4, ensure_ascii=False, default=str)
+
+    def write_prometheus(self, path: str):
+        """Write the counters, and the total seconds of each span name, in the Prometheus textfile format"""
+        def format_labels(labels: Dict[str, Any]) -> str:
+            if len(labels) == 0:
+                return ''
+            return '{' + ','.join(f'{label}="{_escape_label_value(value)}"' for (label, value) in labels.items()) + '}'
+
+        report = self.report()
+        span_seconds: Dict[str, float] = {}
+        span_counts: Dict[str, int] = {}
+        for span in report['spans']:
+            span_seconds[span['name']] = span_seconds.get(span['name'], 0.0) + span['seconds']
+            span_counts[span['name']] = span_counts.get(span['name'], 0) + 1
+
+        lines = [
+            '# TYPE autosub_span_seconds_total counter',
+            *(f'autosub_span_seconds_total{format_labels({"span": name})} {seconds}' for (name, seconds) in sorted(span_seconds.items())),
+            '# TYPE autosub_spans_total counter',
+            *(f'autosub_spans_total{format_labels({"span": name})} {count}' for (name, count) in sorted(span_counts.items())),
+        ]
+        typed = set()
+        for counter in report['counters']:
+            metric = 'autosub_' + re.sub(r'[^a-zA-Z0-9_]', '_', counter['name'])
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f'# TYPE {metric} counter')
+            lines.append(f"{metric}{format_labels(counter['labels'])} {counter['value']}")
+
+        # Write to a temporary file first, so that the node exporter never reads a partial file
+        with open(path + '.tmp', 'w', encoding='utf8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(path + '.tmp', path)
+
+    def log_summary(self):
+        logger = logging.getLogger(__name__)
+        for span in self.report()['spans']:
+            if span.get('stage'):
+                details = ', '.join(f"{key}={value}" for (key, value) in span.items() if key not in ('name', 'started_at', 'seconds', 'stage'))
+                logger.info(f"{span['name']}: {span['seconds']:.2f}s{' (' + details + ')' if len(details) > 0 else ''}")
+
+
+# Shared by everything in the process, like the logging module's loggers
+metrics = Metrics()
@@ -0,0 +1,17 @@
+from dataclasses import dataclass
+from datetime import timedelta
+
+import numpy as np
+
+
+AUDIO_SAMPLE_RATE = 16000
+
+
+@dataclass
+class AudioWindow:
+    offset: timedelta
+    samples: np.ndarray
+
+    @property
+    def duration(self) -> timedelta:
+        return timedelta(seconds=len(self.samples) / AUDIO_SAMPLE_RATE)
@@ -1,4 +1,6 @@
 from dataclasses import dataclass
+import hashlib
+import json
 
 
 @dataclass
@@ -13,3 +15,7 @@ class PhraseLocalisation:
     @property
     def is_valid(self):
         return len(self.foreign) > 0 and len(self.local) > 0
+
+    @property
+    def fingerprint(self) -> str:
+        return hashlib.sha256(json.dumps([self.foreign, self.local], ensure_ascii=False).encode('utf8')).hexdigest()[:16]
@@ -54,3 +54,6 @@ class SubtitleFile:
 
     def save(self, file_name: str):
         self._file.save(file_name)
+
+    def to_string(self, format_: str) -> str:
+        return self._file.to_string(format_)
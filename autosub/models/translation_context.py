@@ -1,19 +1,38 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List, Optional
 from autosub.models.phrase_localisation import PhraseLocalisation
 
 
+@dataclass
+class ContextSource:
+    """A wiki page that a context was built from, as of the revision that was read"""
+    title: str
+    revision_id: Optional[int]
+    phrase_fingerprints: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return ContextSource(
+            title=data['title'],
+            revision_id=data.get('revision_id', None),
+            phrase_fingerprints=data.get('phrase_fingerprints', []),
+        )
+
+
 @dataclass
 class TranslationContext:
     synopsis: Optional[str]
     phrases: List[PhraseLocalisation]
+    # The page the synopsis came from first, then any other page phrases were extracted from
+    sources: List[ContextSource] = field(default_factory=list)
 
     @classmethod
     def from_dict(cls, data: dict):
         return TranslationContext(
             synopsis=data['synopsis'],
-            phrases=[PhraseLocalisation.from_dict(phrase_data) for phrase_data in data['phrases']]
+            phrases=[PhraseLocalisation.from_dict(phrase_data) for phrase_data in data['phrases']],
+            sources=[ContextSource.from_dict(source_data) for source_data in data.get('sources', [])],
         )
 
 
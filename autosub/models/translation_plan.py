@@ -0,0 +1,24 @@
+from dataclasses import dataclass
+from typing import List, Optional
+
+
+@dataclass
+class TranslationPlan:
+    batches: List[List[str]]
+    prompt_tokens: int
+    completion_tokens: int
+    prompt_price_per_1k_tokens: Optional[float] = None
+    completion_price_per_1k_tokens: Optional[float] = None
+
+    @property
+    def requests(self) -> int:
+        return len(self.batches)
+
+    @property
+    def estimated_cost(self) -> Optional[float]:
+        if self.prompt_price_per_1k_tokens is None or self.completion_price_per_1k_tokens is None:
+            return None
+        return (
+            self.prompt_tokens * self.prompt_price_per_1k_tokens
+            + self.completion_tokens * self.completion_price_per_1k_tokens
+        ) / 1000
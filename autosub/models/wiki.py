@@ -1,10 +1,22 @@
 from dataclasses import dataclass
-from typing import List, Optional
+import re
+from typing import List, Optional, Tuple
 
 import mwparserfromhell as mwparser
+from mwparserfromhell.nodes import Template
 from mwparserfromhell.wikicode import Wikicode
 
 
+BRACES_PATTERN = re.compile(r'\{\{|\}\}')
+# Sections where templates are not expanded, left unclosed they are plain text to the parser
+UNEXPANDED_PATTERN = re.compile(r'<!--.*?-->|<nowiki\s*>.*?</nowiki\s*>', re.DOTALL | re.IGNORECASE)
+
+
+def _blank_unexpanded(raw: str) -> str:
+    """Replace comments and nowiki sections by spaces, keeping the offsets of everything else"""
+    return UNEXPANDED_PATTERN.sub(lambda match: ' ' * len(match.group()), raw)
+
+
 @dataclass
 class WikiCode:
     raw: str
@@ -16,8 +28,48 @@ class WikiCode:
             self._wiki_code_obj = mwparser.parse(self.raw)
         return self._wiki_code_obj
 
+    def _template_spans(self, name_prefixes: Tuple[str, ...]) -> List[Tuple[int, int]]:
+        name_pattern = re.compile(r'\{\{\s*(?:' + '|'.join(re.escape(prefix) for prefix in name_prefixes) + ')', re.IGNORECASE)
+        scanned = _blank_unexpanded(self.raw)
+        spans: List[Tuple[int, int]] = []
+        for match in name_pattern.finditer(scanned):
+            depth = 0
+            for brace in BRACES_PATTERN.finditer(scanned, match.start()):
+                depth += 1 if brace.group() == '{{' else -1
+                if depth == 0:
+                    spans.append((match.start(), brace.end()))
+                    break
+        return spans
+
+    def find_templates(self, name_prefixes: Tuple[str, ...]) -> List[Template]:
+        """Find the templates whose name starts with one of the prefixes, wherever they are nested
+
+        Only the spans of the matching templates are parsed, which is much cheaper than parsing the whole page when
+        the templates are a small part of it. Templates in comments and nowiki sections are skipped, as the parser
+        does.
+
+        Args:
+            name_prefixes (Tuple[str, ...]): template name prefixes, case insensitive
+
+        Returns:
+            List[Template]: the templates, in page order
+        """
+        if self._wiki_code_obj is not None:
+            return [
+                template
+                for template in self._wiki_code_obj.filter_templates(recursive=True)
+                if str(template.name).strip().lower().startswith(tuple(prefix.lower() for prefix in name_prefixes))
+            ]
+        result: List[Template] = []
+        for start, end in self._template_spans(name_prefixes):
+            nodes = mwparser.parse(self.raw[start:end]).nodes
+            if len(nodes) == 1 and isinstance(nodes[0], Template):
+                result.append(nodes[0])
+        return result
+
 
 @dataclass
 class WikiPage:
     title: str
     wikicodes: List[WikiCode]
+    revision_id: Optional[int] = None
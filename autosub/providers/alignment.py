@@ -0,0 +1,106 @@
+from dataclasses import dataclass, field
+import re
+import threading
+from typing import Dict, List
+
+from autosub.metrics import metrics
+
+INDEXED_LINE_PATTERN = re.compile(r'^\s*(\d+)\s*[:.]\s*(.*)$')
+
+
+@dataclass
+class SalvageStats:
+    """How many lines were kept from batch responses that did not line up with their input
+
+    Recorded batches are also counted in the process metrics, labelled with the provider.
+    """
+    batches: int = 0
+    misaligned_batches: int = 0
+    salvaged_lines: int = 0
+    rerequested_lines: int = 0
+    provider: str = field(default='', compare=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @property
+    def salvage_rate(self) -> float:
+        total = self.salvaged_lines + self.rerequested_lines
+        return self.salvaged_lines / total if total > 0 else 0.0
+
+    def record(self, expected: int, aligned: int):
+        with self._lock:
+            self.batches += 1
+            if aligned < expected:
+                self.misaligned_batches += 1
+                self.salvaged_lines += aligned
+                self.rerequested_lines += expected - aligned
+        metrics.increment('translation_batches_total', provider=self.provider)
+        if aligned < expected:
+            metrics.increment('translation_misaligned_batches_total', provider=self.provider)
+            metrics.increment('translation_salvaged_lines_total', aligned, provider=self.provider)
+            metrics.increment('translation_rerequested_lines_total', expected - aligned, provider=self.provider)
+
+    def snapshot(self) -> 'SalvageStats':
+        with self._lock:
+            return SalvageStats(
+                batches=self.batches,
+                misaligned_batches=self.misaligned_batches,
+                salvaged_lines=self.salvaged_lines,
+                rerequested_lines=self.rerequested_lines,
+            )
+
+    def since(self, earlier: 'SalvageStats') -> 'SalvageStats':
+        """Stats recorded after an earlier snapshot, e.g. during one translate call"""
+        current = self.snapshot()
+        return SalvageStats(
+            batches=current.batches - earlier.batches,
+            misaligned_batches=current.misaligned_batches - earlier.misaligned_batches,
+            salvaged_lines=current.salvaged_lines - earlier.salvaged_lines,
+            rerequested_lines=current.rerequested_lines - earlier.rerequested_lines,
+        )
+
+
+def align_indexed_response(response: str, expected: int) -> Dict[int, str]:
+    """Match the lines of an index-prefixed response to the indices of the request
+
+    A response with exactly the expected number of lines is accepted positionally if its lines are unnumbered, or
+    numbered in increasing order, which covers models numbering their reply from 1. Otherwise lines are matched by their
+    index prefix, and the first valid non-empty answer for an index wins. A reply numbered up to `expected` without a
+    line 0 is taken as numbered from 1. A partial reply without line 0 could be numbered either way, so nothing of it is
+    kept.
+
+    Args:
+        response (str): raw response of the LLM
+        expected (int): number of lines in the request, indexed from 0
+
+    Returns:
+        Dict[int, str]: translation of each index that could be aligned
+    """
+    lines = [line.strip() for line in response.split('\n')]
+    lines = [line for line in lines if len(line) > 0]
+    matches = [INDEXED_LINE_PATTERN.match(line) for line in lines]
+
+    if all(match is None for match in matches):
+        return dict(enumerate(lines)) if len(lines) == expected else {}
+
+    numbered = [(int(match.group(1)), match.group(2).strip()) for match in matches if match is not None]
+    indices = [index for (index, _) in numbered]
+    if len(numbered) == expected and all(earlier < later for (earlier, later) in zip(indices, indices[1:])):
+        if all(len(text) > 0 for (_, text) in numbered):
+            return {position: text for (position, (_, text)) in enumerate(numbered)}
+
+    offset = 0
+    if 0 not in indices:
+        if expected not in indices:
+            return {}
+        offset = 1
+
+    aligned: Dict[int, str] = {}
+    for (number, text) in numbered:
+        index = number - offset
+        if 0 <= index < expected and index not in aligned and len(text) > 0:
+            aligned[index] = text
+    return aligned
+
+
+def missing_indices(aligned: Dict[int, str], expected: int) -> List[int]:
+    return [index for index in range(expected) if index not in aligned]
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import Optional, Tuple
+from typing import Iterable, Iterator, Optional, Tuple
+from autosub.models.audio import AudioWindow
 from autosub.models.language import Language
 
 from autosub.models.transcription import Transcription
@@ -20,3 +21,42 @@ class Transcriber(ABC):
             Tuple[Transcription, ...]: a tuple of transcriptions
         """
         ...
+
+
+class StreamingTranscriber(Transcriber):
+    @abstractmethod
+    def iter_transcribe_stream(
+        self,
+        target_language: Language,
+        audio_windows: Iterable[AudioWindow],
+        context: Optional[TranslationContext] = None
+    ) -> Iterator[Transcription]:
+        """Transcribe in-memory audio, consuming one window at a time and emitting segments as soon as they are ready
+
+        Args:
+            target_language (Language): target language
+            audio_windows (Iterable[AudioWindow]): consecutive windows of 16 kHz mono samples
+            context (Optional[TranslationContext], optional): context. Defaults to None.
+
+        Yields:
+            Transcription: transcriptions in chronological order, timed relative to the start of the audio
+        """
+        ...
+
+    def transcribe_stream(
+        self,
+        target_language: Language,
+        audio_windows: Iterable[AudioWindow],
+        context: Optional[TranslationContext] = None
+    ) -> Tuple[Transcription, ...]:
+        """Transcribe in-memory audio, consuming one window at a time
+
+        Args:
+            target_language (Language): target language
+            audio_windows (Iterable[AudioWindow]): consecutive windows of 16 kHz mono samples
+            context (Optional[TranslationContext], optional): context. Defaults to None.
+
+        Returns:
+            Tuple[Transcription, ...]: a tuple of transcriptions, timed relative to the start of the audio
+        """
+        return tuple(self.iter_transcribe_stream(target_language, audio_windows, context=context))
@@ -2,6 +2,7 @@ from abc import ABC, abstractmethod
 from typing import List, Optional
 from autosub.models.language import Language
 from autosub.models.translation_context import TranslationContext
+from autosub.models.translation_plan import TranslationPlan
 
 
 class Translator(ABC):
@@ -27,3 +28,36 @@ class Translator(ABC):
             List[str]: Translated text
         """
         ...
+
+    def plan_translation(
+        self,
+        input: List[str],
+        source_language: Language,
+        target_language: Language,
+        input_description: Optional[str] = None,
+        context: Optional[TranslationContext] = None,
+    ) -> Optional[TranslationPlan]:
+        """Work out the requests a translation would send, without sending any.
+
+        Args:
+            input (List[str]): the list
+            source_language (Language): language of the original text
+            target_language (Language): target language
+            input_description (Optional[str], optional): English description of the input, e.g. 'conversation'
+            context (Optional[TranslationContext], optional): context for the translation
+
+        Returns:
+            Optional[TranslationPlan]: the planned requests and tokens, or None if the translator cannot plan ahead
+        """
+        return None
+
+    def count_tokens(self, text: str) -> Optional[int]:
+        """Count the tokens of a text as the translator's model sees them.
+
+        Args:
+            text (str): the text
+
+        Returns:
+            Optional[int]: number of tokens, or None if the translator has no tokenizer
+        """
+        return None
@@ -0,0 +1,232 @@
+from dataclasses import asdict
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from autosub.metrics import metrics
+from autosub.models.language import Language
+from autosub.models.translation_context import TranslationContext
+from autosub.models.translation_plan import TranslationPlan
+from autosub.providers.base.llm import LLM
+from autosub.providers.base.translator import Translator
+
+
+def hash_context(context: Optional[TranslationContext]) -> str:
+    if context is None:
+        return ''
+    # Sources only record where the context came from, so a new revision that yields the same context keeps the cache warm
+    content = {'synopsis': context.synopsis, 'phrases': [asdict(phrase) for phrase in context.phrases]}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, ensure_ascii=False).encode('utf8')).hexdigest()
+
+
+class TranslationCache:
+    """SQLite store of translated lines, evicted by age and least recent use"""
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        max_entries: Optional[int] = None,
+        max_age_seconds: Optional[float] = None,
+    ):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                "key TEXT PRIMARY KEY, translated TEXT NOT NULL, created_at REAL NOT NULL, used_at REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS translations_used_at ON translations (used_at)")
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    @staticmethod
+    def make_key(namespace: str, source_language: Language, target_language: Language, context_hash: str, input_description: Optional[str], text: str) -> str:
+        return hashlib.sha256(
+            json.dumps([namespace, source_language.code, target_language.code, context_hash, input_description, text], ensure_ascii=False).encode('utf8')
+        ).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        unique_keys = list(set(keys))
+        now = time.time()
+        result: Dict[str, str] = {}
+        with self._lock, self._connection:
+            # Stay well below SQLite's limit on the number of bound parameters
+            for start in range(0, len(unique_keys), 500):
+                chunk = unique_keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._connection.execute(
+                    f"SELECT key, translated, created_at FROM translations WHERE key IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                for key, translated, created_at in rows:
+                    if self._max_age_seconds is None or now - created_at <= self._max_age_seconds:
+                        result[key] = translated
+                self._connection.execute(
+                    f"UPDATE translations SET used_at = ? WHERE key IN ({placeholders})",
+                    [now, *chunk],
+                )
+        return result
+
+    def put_many(self, entries: Iterable[Tuple[str, str]]):
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO translations (key, translated, created_at, used_at) VALUES (?, ?, ?, ?)",
+                [(key, translated, now, now) for (key, translated) in entries],
+            )
+
+    def evict(self) -> int:
+        """Delete expired entries, then the least recently used ones beyond the size limit
+
+        Returns:
+            int: number of entries deleted
+        """
+        deleted = 0
+        with self._lock, self._connection:
+            if self._max_age_seconds is not None:
+                deleted += self._connection.execute(
+                    "DELETE FROM translations WHERE created_at < ?",
+                    (time.time() - self._max_age_seconds,),
+                ).rowcount
+            if self._max_entries is not None:
+                deleted += self._connection.execute(
+                    "DELETE FROM translations WHERE key IN (SELECT key FROM translations ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                    (self._max_entries,),
+                ).rowcount
+        return deleted
+
+    def close(self):
+        self._connection.close()
+
+
+class CachedTranslator(Translator):
+    """Serve previously translated lines from a TranslationCache and only send the misses to the wrapped translator"""
+
+    def __init__(self, translator: Translator, cache: TranslationCache, namespace: str):
+        self._translator = translator
+        self._cache = cache
+        self._namespace = namespace
+
+    def _find_missing(
+        self,
+        input: List[str],
+        source_language: Language,
+        target_language: Language,
+        input_description: Optional[str],
+        context: Optional[TranslationContext],
+    ) -> Tuple[List[str], Dict[str, str], Dict[str, str]]:
+        context_hash = hash_context(context)
+        keys = [
+            TranslationCache.make_key(self._namespace, source_language, target_language, context_hash, input_description, text)
+            for text in input
+        ]
+        cached = self._cache.get_many(keys)
+
+        # Lines repeated within the input are only sent once
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, input):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        return keys, cached, missing
+
+    def count_tokens(self, text: str) -> Optional[int]:
+        return self._translator.count_tokens(text)
+
+    def plan_translation(
+        self,
+        input: List[str],
+        source_language: Language,
+        target_language: Language,
+        input_description: Optional[str] = None,
+        context: Optional[TranslationContext] = None,
+    ) -> Optional[TranslationPlan]:
+        _, _, missing = self._find_missing(input, source_language, target_language, input_description, context)
+        return self._translator.plan_translation(
+            input=list(missing.values()),
+            source_language=source_language,
+            target_language=target_language,
+            input_description=input_description,
+            context=context,
+        )
+
+    def translate(
+        self,
+        input: List[str],
+        source_language: Language,
+        target_language: Language,
+        input_description: Optional[str] = None,
+        context: Optional[TranslationContext] = None,
+    ) -> List[str]:
+        keys, cached, missing = self._find_missing(input, source_language, target_language, input_description, context)
+        self._cache.hits += len(input) - len(missing)
+        self._cache.misses += len(missing)
+        metrics.increment('translation_cache_hits_total', len(input) - len(missing))
+        metrics.increment('translation_cache_misses_total', len(missing))
+
+        if len(missing) > 0:
+            translated = self._translator.translate(
+                input=list(missing.values()),
+                source_language=source_language,
+                target_language=target_language,
+                input_description=input_description,
+                context=context,
+            )
+            if len(translated) != len(missing):
+                raise RuntimeError(f"Translator returned {len(translated)} lines for {len(missing)} inputs")
+            fresh = dict(zip(missing.keys(), translated))
+            self._cache.put_many(fresh.items())
+            cached.update(fresh)
+        return [cached[key] for key in keys]
+
+
+class CachedLLM(LLM):
+    """Remember the decisions of the wrapped LLM in a JSON file, keyed by the list and the criteria"""
+
+    def __init__(self, llm: LLM, path: str):
+        self._llm = llm
+        self._path = path
+        self._decisions: Dict[str, Dict[str, Optional[str]]] = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf8') as f:
+                self._decisions = json.load(f)
+
+    @staticmethod
+    def make_key(input: List[str], item_description: str, criteria_description: str, allow_none: bool) -> str:
+        # The order of the list does not change the answer
+        return hashlib.sha256(
+            json.dumps([sorted(input), item_description, criteria_description, allow_none], ensure_ascii=False).encode('utf8')
+        ).hexdigest()
+
+    def _save(self):
+        temporary_path = self._path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf8') as f:
+            json.dump(self._decisions, f, ensure_ascii=False, indent=4)
+        os.replace(temporary_path, self._path)
+
+    def select_one_from_list(
+        self,
+        input: List[str],
+        item_description: str,
+        criteria_description: str,
+        allow_none: bool
+    ) -> Optional[str]:
+        key = self.make_key(input, item_description, criteria_description, allow_none)
+        if key in self._decisions:
+            metrics.increment('llm_selections_total', source='cache')
+            return self._decisions[key]['selected']
+        selected = self._llm.select_one_from_list(input, item_description, criteria_description, allow_none)
+        self._decisions[key] = {'selected': selected}
+        self._save()
+        return selected
@@ -1,16 +1,20 @@
-import os
+from datetime import timedelta
 from typing import List, Optional, Tuple
-from uuid import uuid4
 import warnings
 from google.cloud import speech
 from google.cloud import storage  # type: ignore
 from google.cloud import translate_v3
 
+from autosub.metrics import metrics
+from autosub.models.audio import AUDIO_SAMPLE_RATE
 from autosub.models.language import Language
 from autosub.models.transcription import Transcription
 from autosub.models.translation_context import TranslationContext
 from autosub.providers.base.transcriber import Transcriber
 from autosub.providers.base.translator import Translator
+from autosub.providers.gcloud_audio import AudioUploadCache
+from autosub.providers.gcloud_glossary import GlossaryRegistry
+from autosub.providers.gcloud_speech import ChunkedRecognizer, recognition_timeout, results_to_transcriptions, wav_duration
 
 
 class GoogleCloud(Transcriber, Translator):
@@ -22,6 +26,10 @@ class GoogleCloud(Transcriber, Translator):
         location_id: str,
         glossary_bucket: str,
         audio_bucket: str,
+        glossary_max_age: timedelta = timedelta(days=30),
+        audio_max_age: timedelta = timedelta(days=7),
+        chunk_seconds: Optional[float] = None,
+        max_concurrent_recognitions: int = 4,
     ):
         self._speech_client = speech.SpeechClient.from_service_account_file(service_account_file_path)
         self._storage_client = storage.Client.from_service_account_json(service_account_file_path)
@@ -30,9 +38,31 @@ class GoogleCloud(Transcriber, Translator):
         self._location_id = location_id
         self._glossary_bucket = glossary_bucket
         self._audio_bucket = audio_bucket
+        self._audio_upload_cache = AudioUploadCache(
+            storage_client=self._storage_client,
+            bucket=audio_bucket,
+            max_age=audio_max_age,
+        )
+        self._chunked_recognizer = ChunkedRecognizer(
+            speech_client=self._speech_client,
+            audio_upload_cache=self._audio_upload_cache,
+            chunk_seconds=chunk_seconds,
+            max_concurrency=max_concurrent_recognitions,
+        ) if chunk_seconds is not None else None
+        self._glossary_registry = GlossaryRegistry(
+            storage_client=self._storage_client,
+            translation_client=self._translation_client,
+            project_id=project_id,
+            location_id=location_id,
+            bucket=glossary_bucket,
+            max_age=glossary_max_age,
+        )
 
     def transcribe(self, target_language: Language, audio_file: str, context: Optional[TranslationContext] = None) -> Tuple[Transcription, ...]:
         recognition_config = speech.RecognitionConfig(
+            encoding=speech.RecognitionConfig.AudioEncoding.FLAC,
+            sample_rate_hertz=AUDIO_SAMPLE_RATE,
+            audio_channel_count=1,
             enable_word_time_offsets=True,
             language_code=target_language.gcloud_code,
             model="latest_long",
@@ -40,28 +70,22 @@ class GoogleCloud(Transcriber, Translator):
                 phrases=[phrase.foreign for phrase in context.phrases]
             )] if context is not None else None
         )
-        audio_uploaded_name = str(uuid4()) + os.path.splitext(audio_file)[1]
-        self._storage_client.bucket(self._audio_bucket).blob(audio_uploaded_name).upload_from_filename(audio_file)
-        result = self._speech_client.long_running_recognize(
-            config=recognition_config,
-            audio=speech.RecognitionAudio(uri=f"gs://{self._audio_bucket}/{audio_uploaded_name}")
-        ).result(timeout=90)
-
-        sanitised: List[Transcription] = []
-        for transcripted_sentence in result.results:
-            alternative = transcripted_sentence.alternatives[0]
-            if len(alternative.words) == 0:
-                continue
-            sanitised.append(Transcription(
-                speaker=None,
-                text=alternative.transcript,
-                time_start=alternative.words[0].start_time,
-                time_end=alternative.words[len(alternative.words) - 1].end_time,
-            ))
+        if self._chunked_recognizer is not None:
+            sanitised = self._chunked_recognizer.recognize(recognition_config, audio_file)
+        else:
+            audio_uri = self._audio_upload_cache.ensure_uploaded(audio_file)
+            metrics.increment('provider_requests_total', provider='gcloud', operation='recognize')
+            result = self._speech_client.long_running_recognize(
+                config=recognition_config,
+                audio=speech.RecognitionAudio(uri=audio_uri)
+            ).result(timeout=recognition_timeout(wav_duration(audio_file)))
+            sanitised = results_to_transcriptions(result.results)
+        metrics.increment('transcribed_audio_seconds_total', wav_duration(audio_file).total_seconds(), provider='gcloud')
+        metrics.increment('transcribed_segments_total', len(sanitised), provider='gcloud')
         try:
-            self._storage_client.bucket(self._audio_bucket).delete_blob(audio_uploaded_name)
+            self._audio_upload_cache.collect_garbage_if_due()
         except Exception:
-            warnings.warn(f"Failed to delete audio audio (file={audio_uploaded_name})")
+            warnings.warn("Failed to garbage collect stale audio uploads")
 
         return tuple(sanitised)
 
@@ -77,21 +101,10 @@ class GoogleCloud(Transcriber, Translator):
         glossary_path: str | None = None
 
         if context is not None and len(context.phrases) > 0:
-            glossary_id = 'g' + str(uuid4())
-            glossary_path = f"{parent}/glossaries/{glossary_id}"
-            glossary_ext = ".tsv"
-            self._storage_client.bucket(self._glossary_bucket).blob(glossary_id + glossary_ext).upload_from_string(
-                "\n".join([f"{phrase.foreign}\t{phrase.local}" for phrase in context.phrases])
-            )
-            glossary = translate_v3.Glossary(
-                name=glossary_path,
-                language_pair=translate_v3.Glossary.LanguageCodePair(source_language_code=source_language.code, target_language_code=target_language.code),
-                input_config=translate_v3.GlossaryInputConfig(
-                    gcs_source=translate_v3.GcsSource(input_uri=f"gs://{self._glossary_bucket}/{glossary_id}{glossary_ext}")
-                ),
-            )
-            self._translation_client.create_glossary(parent=parent, glossary=glossary).result(timeout=90)
+            glossary_path = self._glossary_registry.ensure(context.phrases, source_language, target_language)
 
+        metrics.increment('provider_requests_total', provider='gcloud', operation='translate_text')
+        metrics.increment('translated_lines_total', len(input), provider='gcloud')
         translation_response = self._translation_client.translate_text(
             request={
                 "contents": input,
@@ -107,10 +120,8 @@ class GoogleCloud(Transcriber, Translator):
             }
         )
 
-        if context is not None and len(context.phrases) > 0:
-            try:
-                self._translation_client.delete_glossary(name=glossary_path)
-                self._storage_client.bucket(self._glossary_bucket).delete_blob(glossary_id + glossary_ext)
-            except Exception:
-                warnings.warn(f"Failed to delete glossary or its file (glossary={glossary_path}, file={glossary_id + glossary_ext})")
+        try:
+            self._glossary_registry.collect_garbage_if_due()
+        except Exception:
+            warnings.warn("Failed to garbage collect stale glossaries")
         return [translation.translated_text for translation in translation_response.translations]
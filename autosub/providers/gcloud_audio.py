@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta, timezone
+import logging
+import os
+import tempfile
+from typing import Any
+
+from autosub.providers.gcloud_storage import claim_gc_run, touch_blob
+from autosub.utils import encode_audio_as_flac, hash_file
+
+
+AUDIO_BLOB_PREFIX = 'autosub-audio/'
+GC_MARKER_BLOB = 'autosub-audio-last-gc'
+
+
+class AudioUploadCache:
+    """Upload audio as FLAC under a name derived from its content, so that re-runs find it already uploaded
+
+    Uploaded audio is kept for max_age after its last use rather than deleted after each transcription.
+    """
+
+    def __init__(
+        self,
+        *,
+        storage_client: Any,
+        bucket: str,
+        max_age: timedelta = timedelta(days=7),
+        gc_interval: timedelta = timedelta(days=1),
+    ):
+        self._storage_client = storage_client
+        self._bucket = bucket
+        self._max_age = max_age
+        self._gc_interval = gc_interval
+
+    def ensure_uploaded(self, audio_file: str) -> str:
+        """Upload the audio unless the same content is already in the bucket
+
+        Args:
+            audio_file (str): path to the audio
+
+        Returns:
+            str: gs:// URI of the FLAC encoded audio
+        """
+        logger = logging.getLogger(__name__)
+        blob_name = f"{AUDIO_BLOB_PREFIX}{hash_file(audio_file)}.flac"
+        uri = f"gs://{self._bucket}/{blob_name}"
+        now = datetime.now(timezone.utc)
+
+        if self._storage_client.bucket(self._bucket).get_blob(blob_name) is not None and touch_blob(self._storage_client, self._bucket, blob_name, now):
+            logger.info(f"Reusing uploaded audio {uri}")
+            return uri
+
+        with tempfile.TemporaryDirectory() as directory:
+            flac_path = os.path.join(directory, 'audio.flac')
+            encode_audio_as_flac(audio_file, flac_path)
+            logger.info(f"Uploading {os.path.getsize(flac_path)} bytes of FLAC audio ({os.path.getsize(audio_file)} bytes before encoding)")
+            blob = self._storage_client.bucket(self._bucket).blob(blob_name)
+            blob.custom_time = now
+            blob.upload_from_filename(flac_path, content_type='audio/flac')
+        return uri
+
+    def collect_garbage_if_due(self) -> int:
+        """Delete uploaded audio unused for longer than max_age, at most once per gc_interval
+
+        Returns:
+            int: number of blobs deleted
+        """
+        if not claim_gc_run(self._storage_client, self._bucket, GC_MARKER_BLOB, self._gc_interval):
+            return 0
+        deadline = datetime.now(timezone.utc) - self._max_age
+        deleted = 0
+        for blob in self._storage_client.list_blobs(self._bucket, prefix=AUDIO_BLOB_PREFIX):
+            used_at = blob.custom_time or blob.updated
+            if used_at is None or used_at < deadline:
+                self._storage_client.bucket(self._bucket).delete_blob(blob.name)
+                deleted += 1
+        return deleted
@@ -0,0 +1,165 @@
+from datetime import datetime, timedelta, timezone
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List
+
+from google.api_core.exceptions import AlreadyExists, NotFound
+from google.cloud import translate_v3  # type: ignore
+
+from autosub.models.language import Language
+from autosub.models.phrase_localisation import PhraseLocalisation
+from autosub.providers.gcloud_storage import claim_gc_run, last_used, touch_blob
+
+
+GLOSSARY_ID_PREFIX = 'autosub-'
+GC_MARKER_BLOB = GLOSSARY_ID_PREFIX + 'last-gc'
+
+
+class GlossaryRegistry:
+    """Share Google Cloud glossaries between runs, naming them by a hash of their content
+
+    The blob backing each glossary carries its last use as custom time. Glossaries unused for longer than max_age are
+    deleted, at most once per gc_interval, instead of right after each translation.
+
+    A registry asks the API about each glossary and about garbage collection once, later calls reuse the answer.
+    """
+
+    def __init__(
+        self,
+        *,
+        storage_client: Any,
+        translation_client: Any,
+        project_id: str,
+        location_id: str,
+        bucket: str,
+        max_age: timedelta = timedelta(days=30),
+        gc_interval: timedelta = timedelta(days=1),
+        operation_timeout: int = 90,
+    ):
+        self._storage_client = storage_client
+        self._translation_client = translation_client
+        self._parent = f"projects/{project_id}/locations/{location_id}"
+        self._bucket = bucket
+        self._max_age = max_age
+        self._gc_interval = gc_interval
+        self._operation_timeout = operation_timeout
+        self._lock = threading.Lock()
+        self._ensured: Dict[str, str] = {}
+        self._gc_checked = False
+
+    @staticmethod
+    def _serialise(phrases: List[PhraseLocalisation]) -> str:
+        return "\n".join([f"{phrase.foreign}\t{phrase.local}" for phrase in phrases])
+
+    @staticmethod
+    def glossary_id(phrases: List[PhraseLocalisation], source_language: Language, target_language: Language) -> str:
+        digest = hashlib.sha256(
+            f"{source_language.code}\t{target_language.code}\n{GlossaryRegistry._serialise(phrases)}".encode('utf8')
+        ).hexdigest()
+        return GLOSSARY_ID_PREFIX + digest[:40]
+
+    def glossary_path(self, glossary_id: str) -> str:
+        return f"{self._parent}/glossaries/{glossary_id}"
+
+    def _upload(self, blob_name: str, phrases: List[PhraseLocalisation], now: datetime):
+        blob = self._storage_client.bucket(self._bucket).blob(blob_name)
+        blob.custom_time = now
+        blob.upload_from_string(self._serialise(phrases))
+
+    def ensure(self, phrases: List[PhraseLocalisation], source_language: Language, target_language: Language) -> str:
+        """Return the glossary for the phrases and language pair, creating it only if no run has done so before
+
+        Args:
+            phrases (List[PhraseLocalisation]): the phrases
+            source_language (Language): source language
+            target_language (Language): target language
+
+        Returns:
+            str: full resource name of the glossary
+        """
+        glossary_id = self.glossary_id(phrases, source_language, target_language)
+        with self._lock:
+            if glossary_id not in self._ensured:
+                self._ensured[glossary_id] = self._ensure(glossary_id, phrases, source_language, target_language)
+            return self._ensured[glossary_id]
+
+    def _ensure(self, glossary_id: str, phrases: List[PhraseLocalisation], source_language: Language, target_language: Language) -> str:
+        logger = logging.getLogger(__name__)
+        glossary_path = self.glossary_path(glossary_id)
+        blob_name = glossary_id + ".tsv"
+        now = datetime.now(timezone.utc)
+
+        try:
+            self._translation_client.get_glossary(name=glossary_path)
+        except NotFound:
+            pass
+        else:
+            logger.info(f"Reusing glossary {glossary_id}")
+            if not touch_blob(self._storage_client, self._bucket, blob_name, now):
+                # Without its blob the glossary would look unused and be collected, so upload the blob again
+                logger.warning(f"Glossary file {blob_name} is missing, uploading it again")
+                self._upload(blob_name, phrases, now)
+            return glossary_path
+
+        logger.info(f"Creating glossary {glossary_id}")
+        self._upload(blob_name, phrases, now)
+        glossary = translate_v3.Glossary(
+            name=glossary_path,
+            language_pair=translate_v3.Glossary.LanguageCodePair(
+                source_language_code=source_language.code,
+                target_language_code=target_language.code,
+            ),
+            input_config=translate_v3.GlossaryInputConfig(
+                gcs_source=translate_v3.GcsSource(input_uri=f"gs://{self._bucket}/{blob_name}")
+            ),
+        )
+        try:
+            self._translation_client.create_glossary(parent=self._parent, glossary=glossary).result(timeout=self._operation_timeout)
+        except AlreadyExists:
+            # Another run created the same content in the meantime
+            pass
+        return glossary_path
+
+    def collect_garbage(self) -> int:
+        """Delete the glossaries created by the registry and unused for longer than max_age
+
+        Returns:
+            int: number of glossaries deleted
+        """
+        logger = logging.getLogger(__name__)
+        deadline = datetime.now(timezone.utc) - self._max_age
+        deleted = 0
+        for glossary in self._translation_client.list_glossaries(parent=self._parent):
+            glossary_id = glossary.name.rsplit('/', 1)[-1]
+            if not glossary_id.startswith(GLOSSARY_ID_PREFIX):
+                continue
+            blob_name = glossary_id + ".tsv"
+            used_at = last_used(self._storage_client, self._bucket, blob_name)
+            if used_at is not None and used_at >= deadline:
+                continue
+            try:
+                self._translation_client.delete_glossary(name=glossary.name).result(timeout=self._operation_timeout)
+                self._storage_client.bucket(self._bucket).delete_blob(blob_name)
+                deleted += 1
+            except NotFound:
+                pass
+            except Exception:
+                logger.warning(f"Failed to delete stale glossary or its file (glossary={glossary.name}, file={blob_name})")
+        return deleted
+
+    def collect_garbage_if_due(self) -> int:
+        """Run collect_garbage if it has not run for gc_interval, as recorded by a marker blob in the bucket
+
+        Only the first call of a registry checks the marker, a run is much shorter than gc_interval.
+
+        Returns:
+            int: number of glossaries deleted
+        """
+        with self._lock:
+            if self._gc_checked:
+                return 0
+            self._gc_checked = True
+        if not claim_gc_run(self._storage_client, self._bucket, GC_MARKER_BLOB, self._gc_interval):
+            return 0
+        return self.collect_garbage()
@@ -0,0 +1,124 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import timedelta
+import logging
+import os
+import tempfile
+from typing import Any, Iterable, List, Optional
+import wave
+
+import numpy as np
+from google.cloud import speech  # type: ignore
+
+from autosub.metrics import metrics
+from autosub.models.audio import AUDIO_SAMPLE_RATE
+from autosub.models.transcription import Transcription
+from autosub.providers.gcloud_audio import AudioUploadCache
+from autosub.utils import chunk_audio_at_silence, stitch_transcriptions, stream_audio_as_pcm
+
+
+MIN_RECOGNITION_TIMEOUT_SECONDS = 90
+# Long running recognition takes a fraction of the audio duration, with plenty of headroom for queueing
+RECOGNITION_TIMEOUT_PER_AUDIO_SECOND = 0.5
+
+
+def recognition_timeout(duration: timedelta) -> float:
+    return max(MIN_RECOGNITION_TIMEOUT_SECONDS, duration.total_seconds() * RECOGNITION_TIMEOUT_PER_AUDIO_SECOND)
+
+
+def wav_duration(audio_file: str) -> timedelta:
+    with wave.open(audio_file, 'rb') as f:
+        return timedelta(seconds=f.getnframes() / f.getframerate())
+
+
+def results_to_transcriptions(results: Iterable[Any], offset: timedelta = timedelta()) -> List[Transcription]:
+    sanitised: List[Transcription] = []
+    for transcripted_sentence in results:
+        alternative = transcripted_sentence.alternatives[0]
+        if len(alternative.words) == 0:
+            continue
+        sanitised.append(Transcription(
+            speaker=None,
+            text=alternative.transcript,
+            time_start=offset + alternative.words[0].start_time,
+            time_end=offset + alternative.words[len(alternative.words) - 1].end_time,
+        ))
+    return sanitised
+
+
+def _write_wav(path: str, samples: np.ndarray):
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(AUDIO_SAMPLE_RATE)
+        f.writeframes((np.clip(samples, -1, 1) * 32767).astype(np.int16).tobytes())
+
+
+class ChunkedRecognizer:
+    """Recognise long audio as overlapping chunks submitted concurrently, stitched back on the global timeline"""
+
+    def __init__(
+        self,
+        *,
+        speech_client: Any,
+        audio_upload_cache: AudioUploadCache,
+        chunk_seconds: float,
+        max_concurrency: int,
+    ):
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}")
+        self._speech_client = speech_client
+        self._audio_upload_cache = audio_upload_cache
+        self._chunk_seconds = chunk_seconds
+        self._max_concurrency = max_concurrency
+
+    def _recognize_chunk(self, config: Any, chunk_path: str, offset: timedelta, duration: timedelta) -> List[Transcription]:
+        try:
+            uri = self._audio_upload_cache.ensure_uploaded(chunk_path)
+        finally:
+            os.remove(chunk_path)
+        metrics.increment('provider_requests_total', provider='gcloud', operation='recognize')
+        result = self._speech_client.long_running_recognize(
+            config=config,
+            audio=speech.RecognitionAudio(uri=uri),
+        ).result(timeout=recognition_timeout(duration))
+        return results_to_transcriptions(result.results, offset)
+
+    def recognize(self, config: Any, audio_file: str) -> List[Transcription]:
+        """Recognise the audio file chunk by chunk
+
+        Chunks are cut and written to disk only when a worker is free for them, so that at most max_concurrency
+        chunks are held at a time however long the audio is.
+
+        Args:
+            config (Any): RecognitionConfig shared by every chunk
+            audio_file (str): path to the audio
+
+        Returns:
+            List[Transcription]: transcriptions on the timeline of the whole file
+        """
+        logger = logging.getLogger(__name__)
+        logger.info(f"Recognising chunks of about {self._chunk_seconds}s, {self._max_concurrency} at a time")
+        futures: List[Future] = []
+        chunks = chunk_audio_at_silence(stream_audio_as_pcm(audio_file), self._chunk_seconds)
+        with tempfile.TemporaryDirectory() as directory, ThreadPoolExecutor(max_workers=self._max_concurrency) as executor:
+            try:
+                for (i, chunk) in enumerate(chunks):
+                    chunk_path = os.path.join(directory, f'chunk-{i}.wav')
+                    _write_wav(chunk_path, chunk.samples)
+                    futures.append(executor.submit(self._recognize_chunk, config, chunk_path, chunk.offset, chunk.duration))
+                    running = [future for future in futures if not future.done()]
+                    if len(running) >= self._max_concurrency:
+                        wait(running, return_when=FIRST_COMPLETED)
+            finally:
+                chunks.close()
+            chunk_results = [future.result() for future in futures]
+        logger.info(f"Recognised {len(chunk_results)} chunks")
+
+        result: List[Transcription] = []
+        previous: Optional[Transcription] = None
+        for transcriptions in chunk_results:
+            stitched = stitch_transcriptions(previous, transcriptions)
+            result.extend(stitched)
+            if len(stitched) > 0:
+                previous = stitched[-1]
+        return result
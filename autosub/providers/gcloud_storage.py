@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from google.api_core.exceptions import NotFound
+
+
+def touch_blob(storage_client: Any, bucket: str, blob_name: str, now: datetime) -> bool:
+    """Record a use of the blob as its custom time, which retention then counts from
+
+    Returns:
+        bool: whether the blob exists, it may have been deleted out of band
+    """
+    blob = storage_client.bucket(bucket).blob(blob_name)
+    blob.custom_time = now
+    try:
+        blob.patch()
+    except NotFound:
+        return False
+    return True
+
+
+def last_used(storage_client: Any, bucket: str, blob_name: str) -> Optional[datetime]:
+    blob = storage_client.bucket(bucket).get_blob(blob_name)
+    if blob is None:
+        return None
+    return blob.custom_time or blob.updated
+
+
+def claim_gc_run(storage_client: Any, bucket: str, marker_blob_name: str, interval: timedelta) -> bool:
+    """Check whether a garbage collection is due, and if so record that it is running now
+
+    Args:
+        storage_client (Any): Google Cloud storage client
+        bucket (str): bucket holding the marker
+        marker_blob_name (str): blob recording the last run
+        interval (timedelta): minimum time between runs
+
+    Returns:
+        bool: whether the caller should collect garbage
+    """
+    now = datetime.now(timezone.utc)
+    last_gc = last_used(storage_client, bucket, marker_blob_name)
+    if last_gc is not None and now - last_gc < interval:
+        return False
+    blob = storage_client.bucket(bucket).blob(marker_blob_name)
+    blob.custom_time = now
+    blob.upload_from_string(now.isoformat())
+    return True
@@ -0,0 +1,177 @@
+from collections import deque
+import re
+from typing import Deque, Dict, Iterable, List, Set, Tuple
+
+from autosub.models.phrase_localisation import PhraseLocalisation
+
+
+# Phrases given to the LLM when none of the glossary occurs in its input, as many as the prompt used to carry
+FALLBACK_PHRASES = 30
+NAME_SEPARATOR_PATTERN = re.compile(r'[・･·=＝\s]+')
+MIN_NAME_PART_LENGTH = 2
+# Kana and CJK ideographs, texts in these scripts are not split into words by spaces
+CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff66-\uff9f]')
+# Words of space-delimited phrases that say nothing about the phrase on their own
+STOP_WORDS = frozenset((
+    'a', 'an', 'and', 'at', 'by', 'de', 'for', 'from', 'in', 'is', 'it', 'la', 'le', 'no', 'of', 'on', 'or', 'the', 'to', 'with',
+))
+
+# (index of the phrase, length of the key, whether the key must be a whole word of the text)
+KeyOutput = Tuple[int, int, bool]
+
+
+def _phrase_keys(foreign: str) -> Set[str]:
+    """The texts a phrase is recognised by: itself and each part of a name like ライナー・ブラウン or Reiner Braun
+
+    Transcriptions often drop a trailing long vowel mark (ライナ for ライナー), so keys are indexed without it.
+    """
+    phrase = foreign.casefold().strip()
+    if len(phrase) == 0:
+        return set()
+    keys = {phrase.rstrip('ー') or phrase}
+    for part in NAME_SEPARATOR_PATTERN.split(phrase):
+        part = part.rstrip('ー')
+        if len(part) >= MIN_NAME_PART_LENGTH and part not in STOP_WORDS:
+            keys.add(part)
+    return keys
+
+
+def _is_whole_word_key(key: str) -> bool:
+    """Keys without kana or ideographs are words of space-delimited scripts, only matched as whole words"""
+    return CJK_PATTERN.search(key) is None
+
+
+class GlossaryIndex:
+    """Aho-Corasick automaton over the foreign side of a glossary, finding every phrase of a text in one pass
+
+    A phrase is found by its whole text or by any part of it, since dialogue rarely repeats full names. Keys in
+    space-delimited scripts must be whole words of the text, so that 'on' of 'Attack on Titan' is not found in 'Go on'.
+    """
+
+    def __init__(self, phrases: Iterable[PhraseLocalisation]):
+        self._phrases: List[PhraseLocalisation] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[KeyOutput]] = [[]]
+
+        seen: Set[str] = set()
+        key_phrases: Dict[str, List[int]] = {}
+        for phrase in phrases:
+            foreign = phrase.foreign.casefold()
+            keys = _phrase_keys(foreign)
+            if len(keys) == 0 or foreign in seen:
+                continue
+            seen.add(foreign)
+            for key in keys:
+                key_phrases.setdefault(key, []).append(len(self._phrases))
+            self._phrases.append(phrase)
+        for (key, phrase_indices) in key_phrases.items():
+            self._add(key, phrase_indices)
+        self._link()
+
+    def __len__(self) -> int:
+        return len(self._phrases)
+
+    @property
+    def phrases(self) -> List[PhraseLocalisation]:
+        return list(self._phrases)
+
+    def _add(self, key: str, phrase_indices: List[int]):
+        state = 0
+        for char in key:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        whole_word = _is_whole_word_key(key)
+        self._output[state].extend((phrase_index, len(key), whole_word) for phrase_index in phrase_indices)
+
+    def _link(self):
+        queue: Deque[int] = deque(self._goto[0].values())
+        while len(queue) > 0:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback != 0 and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def _match_indices(self, text: str) -> List[int]:
+        found: List[int] = []
+        state = 0
+        text = text.casefold()
+        for (end, char) in enumerate(text):
+            while state != 0 and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for (phrase_index, length, whole_word) in self._output[state]:
+                if whole_word and not self._is_whole_word(text, end + 1 - length, end + 1):
+                    continue
+                found.append(phrase_index)
+        return found
+
+    @staticmethod
+    def _is_whole_word(text: str, start: int, end: int) -> bool:
+        def continues_word(char: str) -> bool:
+            # Japanese has no spaces, so a Latin word written next to kana still ends there
+            return char.isalnum() and CJK_PATTERN.match(char) is None
+
+        return (start == 0 or not continues_word(text[start - 1])) and (end == len(text) or not continues_word(text[end]))
+
+    def find(self, texts: Iterable[str]) -> List[PhraseLocalisation]:
+        """Find the phrases occurring in any of the texts
+
+        Args:
+            texts (Iterable[str]): the texts to scan
+
+        Returns:
+            List[PhraseLocalisation]: the phrases found, each once, in glossary order
+        """
+        found: Set[int] = set()
+        for text in texts:
+            found.update(self._match_indices(text))
+        return [self._phrases[index] for index in sorted(found)]
+
+    def fallback(self, limit: int = FALLBACK_PHRASES) -> List[PhraseLocalisation]:
+        """The first phrases of the glossary, which the context lists roughly by importance"""
+        return self._phrases[:limit]
+
+    def select(self, texts: Iterable[str], limit: int = FALLBACK_PHRASES) -> List[PhraseLocalisation]:
+        """The phrases occurring in any of the texts, or the fallback phrases if none does
+
+        Args:
+            texts (Iterable[str]): the texts to scan
+            limit (int, optional): number of fallback phrases. Defaults to FALLBACK_PHRASES.
+
+        Returns:
+            List[PhraseLocalisation]: the phrases for a prompt about the texts
+        """
+        found = self.find(texts)
+        return found if len(found) > 0 else self.fallback(limit)
+
+    def rank(self, recent_texts: Iterable[str]) -> List[PhraseLocalisation]:
+        """Order the whole glossary by how likely the phrases are to come up next
+
+        Phrases found in the recent texts come first, most frequent first, followed by the rest in glossary order.
+
+        Args:
+            recent_texts (Iterable[str]): texts just before the part about to be processed
+
+        Returns:
+            List[PhraseLocalisation]: every phrase of the glossary
+        """
+        counts: Dict[int, int] = {}
+        for text in recent_texts:
+            # A name matched by its whole text and its parts is still one mention
+            for index in set(self._match_indices(text)):
+                counts[index] = counts.get(index, 0) + 1
+        recent = sorted(counts.keys(), key=lambda index: (-counts[index], index))
+        return [self._phrases[index] for index in recent] + [
+            phrase for (index, phrase) in enumerate(self._phrases) if index not in counts
+        ]
@@ -1,10 +1,16 @@
+from dataclasses import replace
 import re
-from typing import List, cast
+from typing import Dict, List, Optional, cast
 from llama_cpp import CreateCompletionResponse, Llama
 
+from autosub.metrics import metrics
 from autosub.models.language import Language
 from autosub.models.translation_context import TranslationContext
+from autosub.models.translation_plan import TranslationPlan
+from autosub.providers.alignment import SalvageStats, align_indexed_response
 from autosub.providers.base.translator import Translator
+from autosub.providers.glossary import GlossaryIndex
+from autosub.providers.planner import TokenBudgetPlanner, TokenCounter
 
 
 MODEL_MAX_TOKEN = 4096
@@ -18,30 +24,126 @@ class LLAMA(Translator):
         self,
         *,
         model: str,
+        batch_lines: bool = False,
     ):
         self._llm = Llama(model_path=model, n_ctx=MODEL_MAX_TOKEN)
+        self._batch_lines = batch_lines
+        self._salvage_stats = SalvageStats(provider='llama')
+        self._token_counter = TokenCounter(lambda text: len(self._llm.tokenize(text.encode('utf-8'))))
+        self._planner = TokenBudgetPlanner(
+            self._token_counter,
+            context_window=MODEL_MAX_TOKEN,
+            buffer_tokens=BUFFER_TOKEN,
+            min_input_tokens=MIN_INPUT_TOKEN_REQUIRED,
+        )
+
+    @property
+    def salvage_stats(self) -> SalvageStats:
+        return self._salvage_stats
+
+    def count_tokens(self, text: str) -> Optional[int]:
+        return self._token_counter.count(text)
 
     def _count_token(self, texts: List[str]) -> int:
-        return sum((len(self._llm.tokenize(text.encode('utf-8'))) for text in texts))
-
-    def _batch_by_token_count(self, max_tokens: int, texts: List[str], max_items_per_batch: int) -> List[List[str]]:
-        batches: List[List[str]] = []
-        current_batch: List[str] = []
-        current_tokens: int = 0
-        if max_items_per_batch < 1:
-            raise Exception(f"max_items_per_batch must be at least 1, got {max_items_per_batch}")
-        for text in texts:
-            text_tokens = self._count_token([text])
-            if text_tokens > max_tokens:
-                raise RuntimeError(f"Input '{text}' ({text_tokens} tokens) longer than {max_tokens}")
-            if text_tokens + current_tokens > max_tokens or len(current_batch) + 1 > max_items_per_batch:
-                batches.append(current_batch)
-                current_tokens = 0
-                current_batch = []
-            current_batch.append(text)
-            current_tokens += text_tokens
-        batches.append(current_batch)
-        return batches
+        return self._token_counter.count_many(texts)
+
+    def _batch_by_token_count(self, max_tokens: int, texts: List[str], max_items_per_batch: Optional[int] = None) -> List[List[str]]:
+        return self._planner.batch_by_token_count(max_tokens, texts, max_items_per_batch)
+
+    def _build_pretranslated_prompt(self, target_language: Language, context: Optional[TranslationContext], input: List[str]) -> str:
+        pretranslated_prompt = ""
+        if context is not None:
+            # The glossary is narrowed to the whole input rather than per line, so that it stays a prefix shared by every line
+            phrases = GlossaryIndex(context.phrases).select(input)
+            if len(phrases):
+                pretranslated_prompt += (
+                    "Below is a list of phrases with existing translation. Follow them if mentioned. "
+                    f"If a phrase is not in the list, make up a suitable name in {target_language.name}.\n"
+                )
+                pretranslated_prompt += '\n'.join([f"{phrase.foreign}: {phrase.local}" for phrase in phrases])
+        return pretranslated_prompt
+
+    # Prompts start with a prefix shared by every line. Llama.generate keeps the KV cache of the longest prefix the
+    # next prompt has in common with the previous one, so only the line specific suffix is evaluated per line
+    def _build_shared_prefix(self, pretranslated_prompt: str, source_language: Language, target_language: Language) -> str:
+        return (
+            f"Repeat the {source_language.name} sentence in {target_language.name} and terminate immediately.\n"
+            f"{pretranslated_prompt}\n\n"
+        )
+
+    def _build_line_prompt(self, pretranslated_prompt: str, line: str, source_language: Language, target_language: Language) -> str:
+        return (
+            self._build_shared_prefix(pretranslated_prompt, source_language, target_language)
+            + f"{source_language.name}: {line}\n"
+            + f"{target_language.name}: "
+        )
+
+    def _build_batch_prefix(self, pretranslated_prompt: str, source_language: Language, target_language: Language) -> str:
+        return (
+            f"Translate each numbered {source_language.name} line to {target_language.name}. "
+            "Reply with the same number in front of each translation, one line per translation, and terminate immediately.\n"
+            f"{pretranslated_prompt}\n\n"
+        )
+
+    def _build_batch_prompt(self, pretranslated_prompt: str, batch: List[str], source_language: Language, target_language: Language) -> str:
+        return (
+            self._build_batch_prefix(pretranslated_prompt, source_language, target_language)
+            + f"{source_language.name}:\n"
+            + '\n'.join([f"{index}: {line}" for (index, line) in enumerate(batch)])
+            + f"\n\n{target_language.name}:\n"
+        )
+
+    def _plan_batches(self, pretranslated_prompt: str, input: List[str], source_language: Language, target_language: Language) -> TranslationPlan:
+        return replace(
+            self._planner.plan(self._build_batch_prompt(pretranslated_prompt, [], source_language, target_language), input),
+            prompt_price_per_1k_tokens=0.0,
+            completion_price_per_1k_tokens=0.0,
+        )
+
+    def plan_translation(
+        self,
+        input: List[str],
+        source_language: Language,
+        target_language: Language,
+        input_description: str | None = None,
+        context: TranslationContext | None = None
+    ) -> TranslationPlan:
+        pretranslated_prompt = self._build_pretranslated_prompt(target_language, context, input)
+        if self._batch_lines:
+            return self._plan_batches(pretranslated_prompt, input, source_language, target_language)
+        return TranslationPlan(
+            batches=[[line] for line in input],
+            prompt_tokens=self._count_token([
+                self._build_line_prompt(pretranslated_prompt, line, source_language, target_language) for line in input
+            ]),
+            completion_tokens=self._count_token(input),
+            prompt_price_per_1k_tokens=0.0,
+            completion_price_per_1k_tokens=0.0,
+        )
+
+    def _complete(self, prompt: str, stop: List[str]) -> CreateCompletionResponse:
+        response = cast(CreateCompletionResponse, self._llm(prompt, max_tokens=0, stop=stop))
+        usage = response.get('usage') or {}
+        metrics.increment('provider_requests_total', provider='llama', operation='completion')
+        metrics.increment('provider_prompt_tokens_total', usage.get('prompt_tokens', 0), provider='llama')
+        metrics.increment('provider_completion_tokens_total', usage.get('completion_tokens', 0), provider='llama')
+        return response
+
+    def _translate_line(self, pretranslated_prompt: str, line: str, source_language: Language, target_language: Language) -> str:
+        raw_response = self._complete(
+            self._build_line_prompt(pretranslated_prompt, line, source_language, target_language),
+            stop=[source_language.name + ":", target_language.name + ":", "\n"],
+        )
+        return raw_response['choices'][0]['text'].strip()
+
+    def _translate_batch(self, pretranslated_prompt: str, batch: List[str], source_language: Language, target_language: Language) -> Dict[int, str]:
+        raw_response = self._complete(
+            self._build_batch_prompt(pretranslated_prompt, batch, source_language, target_language),
+            stop=["\n\n", source_language.name + ":"],
+        )
+        aligned = align_indexed_response(raw_response['choices'][0]['text'], len(batch))
+        self._salvage_stats.record(len(batch), len(aligned))
+        return aligned
 
     def translate(
         self,
@@ -51,25 +153,21 @@ class LLAMA(Translator):
         input_description: str | None = None,
         context: TranslationContext | None = None
     ) -> List[str]:
-        pretranslated_prompt = ""
-        if context is not None:
-            if len(context.phrases):
-                pretranslated_prompt += (
-                    "Below is a list of phrases with existing translation. Follow them if mentioned. "
-                    f"If a phrase is not in the list, make up a suitable name in {target_language.name}.\n"
-                )
-                pretranslated_prompt += '\n'.join([f"{phrase.foreign}: {phrase.local}" for phrase in context.phrases])
-        result: List[str] = []
-        for line in input:
-            full_context = (
-                f"Repeat the {source_language.name} sentence in {target_language.name} and terminate immediately.\n"
-                f"{pretranslated_prompt}\n\n"
-                f"{source_language.name}: {line}\n"
-                f"{target_language.name}: "
-            )
-            raw_response = cast(
-                CreateCompletionResponse,
-                self._llm(full_context, max_tokens=0, stop=[source_language.name + ":", target_language.name + ":", "\n"])
-            )
-            result.append(raw_response['choices'][0]['text'].strip())
-        return result
+        metrics.increment('translated_lines_total', len(input), provider='llama')
+        pretranslated_prompt = self._build_pretranslated_prompt(target_language, context, input)
+        if not self._batch_lines:
+            return [self._translate_line(pretranslated_prompt, line, source_language, target_language) for line in input]
+
+        result: Dict[int, str] = {}
+        start = 0
+        for batch in self._plan_batches(pretranslated_prompt, input, source_language, target_language).batches:
+            aligned = self._translate_batch(pretranslated_prompt, batch, source_language, target_language)
+            result.update({start + index: text for (index, text) in aligned.items()})
+            start += len(batch)
+
+        # Lines the batches did not line up for are translated one by one at the end, so the prefix kept in the KV
+        # cache only switches once
+        for index in range(len(input)):
+            if index not in result:
+                result[index] = self._translate_line(pretranslated_prompt, input[index], source_language, target_language)
+        return [result[index] for index in range(len(input))]
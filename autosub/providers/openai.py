@@ -1,19 +1,97 @@
+from dataclasses import replace
+import logging
 import re
-from typing import List, Optional
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Union
 import openai
+import requests
+from requests.adapters import HTTPAdapter
 import tiktoken
 
+from autosub.metrics import metrics
 from autosub.models.exceptions import UnexpectedResponseException
 from autosub.models.language import Language
+from autosub.models.phrase_localisation import PhraseLocalisation
 from autosub.models.translation_context import TranslationContext
+from autosub.models.translation_plan import TranslationPlan
 from autosub.providers.base.translator import Translator
 from autosub.providers.base.llm import LLM
+from autosub.providers.glossary import GlossaryIndex
+from autosub.providers.alignment import SalvageStats, align_indexed_response, missing_indices
+from autosub.providers.planner import TokenBudgetPlanner, TokenCounter
+from autosub.providers.scheduler import RateLimiter, RequestScheduler
 
 
 MODEL_MAX_TOKEN = 4096
+CONNECT_TIMEOUT_SECONDS = 10.0
+# Retries of connections that fail before a request is sent, failed requests are retried by the scheduler
+MAX_CONNECTION_RETRIES = 2
 BUFFER_TOKEN = 20
 MIN_INPUT_TOKEN_REQUIRED = 100
 INDEX_PATTERN = re.compile(r'^\d+:\s*')
+GLOSSARY_HEADER = "Below are some phrases with preexisting translation. Please follow the given translation whenever they show up.\n"
+# USD per 1K prompt and completion tokens
+PRICE_PER_1K_TOKENS: Dict[str, Tuple[float, float]] = {
+    'gpt-3.5-turbo': (0.0015, 0.002),
+    'gpt-3.5-turbo-16k': (0.003, 0.004),
+    'gpt-4': (0.03, 0.06),
+    'gpt-4-32k': (0.06, 0.12),
+}
+
+
+def _is_retryable(e: Exception) -> bool:
+    if isinstance(e, (
+        openai.error.RateLimitError,
+        openai.error.ServiceUnavailableError,
+        openai.error.Timeout,
+        openai.error.TryAgain,
+        openai.error.APIConnectionError,
+    )):
+        return True
+    return isinstance(e, openai.error.APIError) and (e.http_status is None or e.http_status >= 500)
+
+
+class _SharedSession(requests.Session):
+    """A session used by every thread, which the openai library must not close
+
+    openai 0.27 closes and replaces the session of a thread every few minutes. Its own sessions are per thread, this one
+    outlives all of them.
+    """
+
+    def close(self):
+        pass
+
+
+_session_lock = threading.Lock()
+_session: Optional[_SharedSession] = None
+_session_pool_size = 0
+
+
+def _proxies(proxy: Union[None, str, Dict[str, str]]) -> Dict[str, str]:
+    if proxy is None:
+        return {}
+    if isinstance(proxy, str):
+        return {'http': proxy, 'https': proxy}
+    return dict(proxy)
+
+
+def _install_shared_session(pool_size: int):
+    """Make every request of the openai library go through one session, keeping up to `pool_size` connections alive per host
+
+    The library only takes a module wide session, so it is shared by every client of the process. Requests name their
+    base URL and timeout themselves, and connections are pooled by host.
+    """
+    global _session, _session_pool_size
+    with _session_lock:
+        if _session is None:
+            _session = _SharedSession()
+            _session.proxies.update(_proxies(openai.proxy))
+        if pool_size > _session_pool_size:
+            adapter = HTTPAdapter(max_retries=MAX_CONNECTION_RETRIES, pool_connections=1, pool_maxsize=pool_size)
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+            _session_pool_size = pool_size
+        openai.requestssession = _session
 
 
 class OpenAI(LLM, Translator):
@@ -22,9 +100,48 @@ class OpenAI(LLM, Translator):
         *,
         api_key: str,
         model: str,
+        max_concurrency: int = 1,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        max_retries: int = 5,
+        context_window: int = MODEL_MAX_TOKEN,
+        max_items_per_batch: Optional[int] = None,
+        base_url: Optional[str] = None,
+        timeout_seconds: Optional[float] = None,
+        connect_timeout_seconds: float = CONNECT_TIMEOUT_SECONDS,
     ):
+        """
+        Args:
+            base_url (Optional[str]): root of an OpenAI compatible API (e.g. http://localhost:8000/v1), defaults to OpenAI's
+            timeout_seconds (Optional[float]): time to wait for a response to each request, defaults to the openai library's
+            connect_timeout_seconds (float): time to wait for a connection to the API
+        """
         self._api_key = api_key
         self._model = model
+        self._base_url = base_url
+        self._request_timeout: Optional[Union[float, Tuple[float, float]]] = (
+            (connect_timeout_seconds, timeout_seconds) if timeout_seconds is not None else None
+        )
+        _install_shared_session(max(1, max_concurrency))
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding('cl100k_base')
+        self._token_counter = TokenCounter(lambda text: len(encoding.encode(text)))
+        self._planner = TokenBudgetPlanner(
+            self._token_counter,
+            context_window=context_window,
+            buffer_tokens=BUFFER_TOKEN,
+            min_input_tokens=MIN_INPUT_TOKEN_REQUIRED,
+            max_items_per_batch=max_items_per_batch,
+        )
+        self._salvage_stats = SalvageStats(provider='openai')
+        self._scheduler = RequestScheduler(
+            max_concurrency=max_concurrency,
+            rate_limiter=RateLimiter(requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute),
+            max_retries=max_retries,
+            is_retryable=_is_retryable,
+        )
 
     def _create_unexpected_response_exception(
         self,
@@ -32,32 +149,36 @@ class OpenAI(LLM, Translator):
     ) -> Exception:
         return UnexpectedResponseException(f"Unexpected response from LLM API '{response}'")
 
+    def count_tokens(self, text: str) -> Optional[int]:
+        return self._token_counter.count(text)
+
     def _count_token(self, texts: List[str]) -> int:
-        encoding = tiktoken.encoding_for_model(self._model)
-        return sum((len(encoding.encode(text)) for text in texts))
+        return self._token_counter.count_many(texts)
 
     def _count_token_in_transcriptions(self, texts: List[str]) -> int:
-        encoding = tiktoken.encoding_for_model(self._model)
-        return sum((len(encoding.encode(text)) for text in texts))
-
-    def _batch_by_token_count(self, max_tokens: int, texts: List[str], max_items_per_batch: int) -> List[List[str]]:
-        batches: List[List[str]] = []
-        current_batch: List[str] = []
-        current_tokens: int = 0
-        if max_items_per_batch < 1:
-            raise Exception(f"max_items_per_batch must be at least 1, got {max_items_per_batch}")
-        for text in texts:
-            text_tokens = self._count_token([text])
-            if text_tokens > max_tokens:
-                raise RuntimeError(f"Input '{text}' ({text_tokens} tokens) longer than {max_tokens}")
-            if text_tokens + current_tokens > max_tokens or len(current_batch) + 1 > max_items_per_batch:
-                batches.append(current_batch)
-                current_tokens = 0
-                current_batch = []
-            current_batch.append(text)
-            current_tokens += text_tokens
-        batches.append(current_batch)
-        return batches
+        return self._token_counter.count_many(texts)
+
+    def _batch_by_token_count(self, max_tokens: int, texts: List[str], max_items_per_batch: Optional[int] = None) -> List[List[str]]:
+        return self._planner.batch_by_token_count(max_tokens, texts, max_items_per_batch)
+
+    def _create_chat_completion(self, messages: List[Dict[str, str]]) -> Any:
+        prompt_tokens = self._count_token([message['content'] for message in messages])
+        # The completion is about as long as the prompt for translations, which dominate the budget
+        response = self._scheduler.call(
+            lambda: openai.ChatCompletion.create(
+                api_key=self._api_key,
+                api_base=self._base_url,
+                request_timeout=self._request_timeout,
+                model=self._model,
+                messages=messages,
+            ),
+            tokens=2 * prompt_tokens,
+        )
+        usage = response.get('usage') or {}
+        metrics.increment('provider_requests_total', provider='openai', operation='chat_completion')
+        metrics.increment('provider_prompt_tokens_total', usage.get('prompt_tokens', prompt_tokens), provider='openai')
+        metrics.increment('provider_completion_tokens_total', usage.get('completion_tokens', 0), provider='openai')
+        return response
 
     def select_one_from_list(
         self,
@@ -75,18 +196,15 @@ class OpenAI(LLM, Translator):
         if allow_none:
             prompt_context += "If none of them looks likely, you can reply 'null'"
 
-        response = openai.ChatCompletion.create(
-            api_key=self._api_key,
-            model=self._model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": prompt_context,
-                },
-                {"role": "user", "content": "\n".join([f"{index}. {item}" for (index, item) in enumerate(input)])},
-            ]
-        )
+        response = self._create_chat_completion([
+            {
+                "role": "system",
+                "content": prompt_context,
+            },
+            {"role": "user", "content": "\n".join([f"{index}. {item}" for (index, item) in enumerate(input)])},
+        ])
 
+        metrics.increment('llm_selections_total', source='llm')
         raw_response = response['choices'][0]['message']['content']
         match = re.search(r'(\d+)', raw_response)
         if not match:
@@ -96,6 +214,50 @@ class OpenAI(LLM, Translator):
             raise UnexpectedResponseException(f"LLM picked an unexpected index '{index}'")
         return input[index]
 
+    def _build_translation_prompt(
+        self,
+        target_language: Language,
+        input_description: Optional[str],
+        phrases: List[PhraseLocalisation],
+    ) -> str:
+        prompt_context = (
+            f"The user is going to provide {input_description}. "
+            f"Translate each line to {target_language.name}. "
+            "Provide all translations in 1 reply, 1 line per translation. You must translate each line seperately.\n"
+        )
+        if len(phrases):
+            prompt_context += GLOSSARY_HEADER
+            prompt_context += '\n'.join([f"{phrase.foreign}: {phrase.local}" for phrase in phrases])
+        return prompt_context
+
+    def _plan(
+        self,
+        input: List[str],
+        target_language: Language,
+        input_description: Optional[str],
+        glossary: GlossaryIndex,
+    ) -> TranslationPlan:
+        shared_prompt = self._build_translation_prompt(target_language, input_description, [])
+        if len(glossary) > 0:
+            shared_prompt += GLOSSARY_HEADER
+        return self._planner.plan(shared_prompt, input, glossary=glossary)
+
+    def plan_translation(
+        self,
+        input: List[str],
+        source_language: Language,
+        target_language: Language,
+        input_description: str | None = None,
+        context: TranslationContext | None = None
+    ) -> TranslationPlan:
+        prices = PRICE_PER_1K_TOKENS.get(self._model)
+        glossary = GlossaryIndex(context.phrases if context is not None else [])
+        return replace(
+            self._plan(input, target_language, input_description, glossary),
+            prompt_price_per_1k_tokens=prices[0] if prices is not None else None,
+            completion_price_per_1k_tokens=prices[1] if prices is not None else None,
+        )
+
     def translate(
         self,
         input: List[str],
@@ -104,49 +266,60 @@ class OpenAI(LLM, Translator):
         input_description: str | None = None,
         context: TranslationContext | None = None
     ) -> List[str]:
-        prompt_context = (
-            f"The user is going to provide {input_description}. "
-            f"Translate each line to {target_language.name}. "
-            "Provide all translations in 1 reply, 1 line per translation. You must translate each line seperately.\n"
-        )
-        if context is not None:
-            if len(context.phrases):
-                prompt_context += "Below are some phrases with preexisting translation. Please follow the given translation whenever they show up.\n"
-                prompt_context += '\n'.join([f"{phrase.foreign}: {phrase.local}" for phrase in context.phrases])
-
-        result = []
-        context_tokens = self._count_token([prompt_context])
-        remaining_tokens = MODEL_MAX_TOKEN - BUFFER_TOKEN - context_tokens
-        if remaining_tokens <= MIN_INPUT_TOKEN_REQUIRED:
-            raise RuntimeError(f"Only {remaining_tokens} remained, not enough for input")
-        for batch in self._batch_by_token_count(remaining_tokens, input, 15):
-            result.extend(self._translate_one_batch(prompt_context, batch))
+        glossary = GlossaryIndex(context.phrases if context is not None else [])
+
+        def translate_batch(batch: List[str]) -> List[str]:
+            # Only the phrases that occur in the batch are worth their prompt tokens
+            prompt_context = self._build_translation_prompt(target_language, input_description, glossary.select(batch))
+            return self._translate_one_batch(prompt_context, batch)
+
+        batches = self._plan(input, target_language, input_description, glossary).batches
+        salvage_before = self._salvage_stats.snapshot()
+        result = [
+            line
+            for batch_result in self._scheduler.map(translate_batch, batches)
+            for line in batch_result
+        ]
+        metrics.increment('translated_lines_total', len(result), provider='openai')
+        salvage = self._salvage_stats.since(salvage_before)
+        if salvage.misaligned_batches > 0:
+            logging.getLogger(__name__).info(
+                f"Salvaged {salvage.salvaged_lines} lines from {salvage.misaligned_batches} misaligned batches "
+                f"({salvage.salvage_rate:.0%} of their lines), re-requested {salvage.rerequested_lines}"
+            )
         return result
 
+    @property
+    def salvage_stats(self) -> SalvageStats:
+        return self._salvage_stats
+
     def _translate_one_batch(self, prompt_context: str, input_batch: List[str]) -> List[str]:
-        response = openai.ChatCompletion.create(
-            api_key=self._api_key,
-            model=self._model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": prompt_context,
-                }
-            ] + [
-                {"role": "user", "content": '\n'.join([f"{index}: {text}" for (index, text) in enumerate(input_batch)])}
-            ]
-        )
-        response_deserialised = [line.strip() for line in response['choices'][0]['message']['content'].split('\n')]
-        response_deserialised = [line for line in response_deserialised if len(line) > 0]
-        response_deserialised = [re.sub(INDEX_PATTERN, '', line).strip() for line in response_deserialised]
-        if len(response_deserialised) != len(input_batch):
-            if len(input_batch) > 1:
-                return self._translate_one_batch(
-                    prompt_context,
-                    input_batch[0:len(input_batch)//2]
-                ) + self._translate_one_batch(
-                    prompt_context,
-                    input_batch[len(input_batch)//2:]
-                )
-            raise UnexpectedResponseException("LLM's did not produce exactly the same number of translation as given input")
-        return response_deserialised
+        response = self._create_chat_completion([
+            {
+                "role": "system",
+                "content": prompt_context,
+            }
+        ] + [
+            {"role": "user", "content": '\n'.join([f"{index}: {text}" for (index, text) in enumerate(input_batch)])}
+        ])
+        aligned = align_indexed_response(response['choices'][0]['message']['content'], len(input_batch))
+        self._salvage_stats.record(len(input_batch), len(aligned))
+        missing = missing_indices(aligned, len(input_batch))
+        if len(missing) == 0:
+            return [aligned[index] for index in range(len(input_batch))]
+
+        if len(aligned) > 0:
+            # Keep every line that came back correctly numbered and only ask again for the rest
+            retried = self._translate_one_batch(prompt_context, [input_batch[index] for index in missing])
+            aligned.update(zip(missing, retried))
+            return [aligned[index] for index in range(len(input_batch))]
+
+        if len(input_batch) > 1:
+            return self._translate_one_batch(
+                prompt_context,
+                input_batch[0:len(input_batch)//2]
+            ) + self._translate_one_batch(
+                prompt_context,
+                input_batch[len(input_batch)//2:]
+            )
+        raise UnexpectedResponseException("LLM's did not produce exactly the same number of translation as given input")
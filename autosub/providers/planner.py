@@ -0,0 +1,168 @@
+from functools import lru_cache
+from typing import Callable, Iterable, List, Optional, Set
+
+from autosub.models.phrase_localisation import PhraseLocalisation
+from autosub.models.translation_plan import TranslationPlan
+from autosub.providers.glossary import GlossaryIndex
+
+
+class TokenCounter:
+    """Count tokens with a memo of recent strings, so that prompts and repeated lines are only tokenized once"""
+
+    def __init__(self, tokenize: Callable[[str], int], max_cached_strings: int = 65536):
+        self._count = lru_cache(maxsize=max_cached_strings)(tokenize)
+
+    def count(self, text: str) -> int:
+        return self._count(text)
+
+    def count_many(self, texts: Iterable[str]) -> int:
+        return sum(self._count(text) for text in texts)
+
+
+class TokenBudgetPlanner:
+    """Pack numbered lines into as few requests as the context window allows, keeping their order
+
+    The completion shares the context window with the prompt, so for every input token completion_ratio tokens are
+    reserved for its translation.
+    """
+
+    def __init__(
+        self,
+        counter: TokenCounter,
+        *,
+        context_window: int,
+        buffer_tokens: int,
+        min_input_tokens: int,
+        completion_ratio: float = 1.0,
+        line_overhead_tokens: int = 3,
+        max_items_per_batch: Optional[int] = None,
+    ):
+        if max_items_per_batch is not None and max_items_per_batch < 1:
+            raise ValueError(f"max_items_per_batch must be at least 1, got {max_items_per_batch}")
+        self._counter = counter
+        self._context_window = context_window
+        self._buffer_tokens = buffer_tokens
+        self._min_input_tokens = min_input_tokens
+        self._completion_ratio = completion_ratio
+        self._line_overhead_tokens = line_overhead_tokens
+        self._max_items_per_batch = max_items_per_batch
+
+    def input_budget(self, prompt_tokens: int) -> int:
+        remaining_tokens = self._context_window - self._buffer_tokens - prompt_tokens
+        budget = int(remaining_tokens / (1 + self._completion_ratio))
+        if budget <= self._min_input_tokens:
+            raise RuntimeError(f"Only {budget} tokens remained, not enough for input")
+        return budget
+
+    def line_tokens(self, text: str) -> int:
+        return self._counter.count(text) + self._line_overhead_tokens
+
+    def batch_by_token_count(self, max_tokens: int, texts: List[str], max_items_per_batch: Optional[int] = None) -> List[List[str]]:
+        """Greedily fill each batch up to max_tokens, which yields the fewest batches for a fixed order
+
+        Args:
+            max_tokens (int): token budget of a batch
+            texts (List[str]): lines to batch
+            max_items_per_batch (Optional[int], optional): cap on the lines per batch, overriding the planner's. Defaults to None.
+
+        Returns:
+            List[List[str]]: non-empty batches, in order
+        """
+        max_items = max_items_per_batch if max_items_per_batch is not None else self._max_items_per_batch
+        if max_items is not None and max_items < 1:
+            raise ValueError(f"max_items_per_batch must be at least 1, got {max_items}")
+        batches: List[List[str]] = []
+        current_batch: List[str] = []
+        current_tokens = 0
+        for text in texts:
+            text_tokens = self.line_tokens(text)
+            if text_tokens > max_tokens:
+                raise RuntimeError(f"Input '{text}' ({text_tokens} tokens) longer than {max_tokens}")
+            if len(current_batch) > 0 and (
+                text_tokens + current_tokens > max_tokens
+                or (max_items is not None and len(current_batch) + 1 > max_items)
+            ):
+                batches.append(current_batch)
+                current_tokens = 0
+                current_batch = []
+            current_batch.append(text)
+            current_tokens += text_tokens
+        if len(current_batch) > 0:
+            batches.append(current_batch)
+        return batches
+
+    def phrase_tokens(self, phrase: PhraseLocalisation) -> int:
+        return self._counter.count(f"{phrase.foreign}: {phrase.local}") + 1
+
+    def plan(self, prompt: str, texts: List[str], glossary: Optional[GlossaryIndex] = None) -> TranslationPlan:
+        """Plan the batches of a translation
+
+        Args:
+            prompt (str): the part of the prompt shared by every request
+            texts (List[str]): lines to translate
+            glossary (Optional[GlossaryIndex], optional): glossary whose phrases found in a batch, or its fallback phrases if none is found,
+                are added to its prompt. Defaults to None.
+
+        Returns:
+            TranslationPlan: the batches with their token estimates
+        """
+        if glossary is not None:
+            return self._plan_with_glossary(prompt, texts, glossary)
+        prompt_tokens = self._counter.count(prompt)
+        batches = self.batch_by_token_count(self.input_budget(prompt_tokens), texts)
+        input_tokens = sum(self.line_tokens(text) for text in texts)
+        return TranslationPlan(
+            batches=batches,
+            prompt_tokens=prompt_tokens * len(batches) + input_tokens,
+            completion_tokens=int(input_tokens * self._completion_ratio),
+        )
+
+    def _plan_with_glossary(self, prompt: str, texts: List[str], glossary: GlossaryIndex) -> TranslationPlan:
+        prompt_tokens = self._counter.count(prompt)
+        self.input_budget(prompt_tokens)
+        capacity = self._context_window - self._buffer_tokens - prompt_tokens
+
+        fallback_tokens = sum(self.phrase_tokens(phrase) for phrase in glossary.fallback())
+
+        def cost(line_tokens: int, phrase_tokens: int, has_phrases: bool) -> float:
+            # Lines need room for their translation as well, glossary entries are only part of the prompt.
+            # A batch without any phrase of its own is given the fallback phrases
+            return line_tokens * (1 + self._completion_ratio) + (phrase_tokens if has_phrases else fallback_tokens)
+
+        batches: List[List[str]] = []
+        current_batch: List[str] = []
+        current_phrases: Set[str] = set()
+        current_line_tokens = 0
+        current_phrase_tokens = 0
+        total_prompt_tokens = 0
+        input_tokens = 0
+        for text in texts:
+            text_tokens = self.line_tokens(text)
+            line_phrases = glossary.find([text])
+            if cost(text_tokens, sum(self.phrase_tokens(phrase) for phrase in line_phrases), len(line_phrases) > 0) > capacity:
+                raise RuntimeError(f"Input '{text}' ({text_tokens} tokens) and its glossary do not fit in {capacity} tokens")
+            new_phrase_tokens = sum(self.phrase_tokens(phrase) for phrase in line_phrases if phrase.foreign not in current_phrases)
+            if len(current_batch) > 0 and (
+                cost(current_line_tokens + text_tokens, current_phrase_tokens + new_phrase_tokens, len(current_phrases) + len(line_phrases) > 0) > capacity
+                or (self._max_items_per_batch is not None and len(current_batch) + 1 > self._max_items_per_batch)
+            ):
+                batches.append(current_batch)
+                total_prompt_tokens += prompt_tokens + current_line_tokens + (current_phrase_tokens if len(current_phrases) > 0 else fallback_tokens)
+                current_batch = []
+                current_phrases = set()
+                current_line_tokens = 0
+                current_phrase_tokens = 0
+                new_phrase_tokens = sum(self.phrase_tokens(phrase) for phrase in line_phrases)
+            current_batch.append(text)
+            current_phrases.update(phrase.foreign for phrase in line_phrases)
+            current_line_tokens += text_tokens
+            current_phrase_tokens += new_phrase_tokens
+            input_tokens += text_tokens
+        if len(current_batch) > 0:
+            batches.append(current_batch)
+            total_prompt_tokens += prompt_tokens + current_line_tokens + (current_phrase_tokens if len(current_phrases) > 0 else fallback_tokens)
+        return TranslationPlan(
+            batches=batches,
+            prompt_tokens=total_prompt_tokens,
+            completion_tokens=int(input_tokens * self._completion_ratio),
+        )
@@ -0,0 +1,135 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import random
+import threading
+import time
+from typing import Callable, Deque, List, Optional, Sequence, Tuple, TypeVar
+
+from autosub.metrics import metrics
+
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+class RateLimiter:
+    """Sliding one-minute window over the requests and tokens sent, shared by all threads of a scheduler"""
+
+    WINDOW_SECONDS = 60.0
+
+    def __init__(
+        self,
+        *,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self._requests_per_minute = requests_per_minute
+        self._tokens_per_minute = tokens_per_minute
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._sent: Deque[Tuple[float, int]] = deque()
+        self._tokens_in_window = 0
+
+    def _prune(self, now: float):
+        while len(self._sent) > 0 and self._sent[0][0] <= now - self.WINDOW_SECONDS:
+            _, tokens = self._sent.popleft()
+            self._tokens_in_window -= tokens
+
+    def _fits(self, tokens: int) -> bool:
+        if len(self._sent) == 0:
+            # Let an oversized request through on an empty window rather than blocking forever
+            return True
+        if self._requests_per_minute is not None and len(self._sent) + 1 > self._requests_per_minute:
+            return False
+        if self._tokens_per_minute is not None and self._tokens_in_window + tokens > self._tokens_per_minute:
+            return False
+        return True
+
+    def acquire(self, tokens: int = 0):
+        """Block until a request of the given token cost fits in both budgets, then record it
+
+        Args:
+            tokens (int, optional): estimated tokens (prompt and completion) of the request. Defaults to 0.
+        """
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._prune(now)
+                if self._fits(tokens):
+                    self._sent.append((now, tokens))
+                    self._tokens_in_window += tokens
+                    return
+                wait = self._sent[0][0] + self.WINDOW_SECONDS - now
+            self._sleep(max(wait, 0.01))
+
+
+class RequestScheduler:
+    """Run requests concurrently within a rate limit, retrying transient failures with jittered exponential backoff"""
+
+    def __init__(
+        self,
+        *,
+        max_concurrency: int = 1,
+        rate_limiter: Optional[RateLimiter] = None,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        is_retryable: Callable[[Exception], bool] = lambda e: False,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}")
+        self._max_concurrency = max_concurrency
+        self._rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self._max_retries = max_retries
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._is_retryable = is_retryable
+        self._sleep = sleep
+
+    def call(self, request: Callable[[], R], tokens: int = 0) -> R:
+        """Send one request, waiting for the rate limit before every attempt
+
+        Args:
+            request (Callable[[], R]): sends the request and returns its result
+            tokens (int, optional): estimated token cost of the request. Defaults to 0.
+
+        Returns:
+            R: result of the first successful attempt
+        """
+        logger = logging.getLogger(__name__)
+        attempt = 0
+        while True:
+            self._rate_limiter.acquire(tokens)
+            try:
+                return request()
+            except Exception as e:
+                if attempt >= self._max_retries or not self._is_retryable(e):
+                    raise
+                # Full jitter keeps concurrent workers from retrying in lockstep
+                delay = random.uniform(0, min(self._max_delay, self._base_delay * 2 ** attempt))
+                attempt += 1
+                metrics.increment('request_retries_total')
+                logger.warning(f"Request failed ({e}), retry {attempt}/{self._max_retries} in {delay:.1f}s")
+                self._sleep(delay)
+
+    def map(self, request: Callable[[T], R], items: Sequence[T]) -> List[R]:
+        """Process the items concurrently, up to the concurrency limit, returning the results in the order of the items
+
+        The requests sent while processing an item should go through `call`, so that they share the rate limit and retries.
+
+        Args:
+            request (Callable[[T], R]): processes one item
+            items (Sequence[T]): the items
+
+        Returns:
+            List[R]: results in input order
+        """
+        if self._max_concurrency == 1 or len(items) <= 1:
+            return [request(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self._max_concurrency, len(items))) as executor:
+            return list(executor.map(request, items))
@@ -1,30 +1,164 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import timedelta
-from typing import Optional, Tuple
+import os
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import numpy as np
+import torch
 import whisper
+from whisper.tokenizer import get_tokenizer
+from autosub.metrics import metrics
+from autosub.models.audio import AUDIO_SAMPLE_RATE, AudioWindow
 from autosub.models.language import Language
 from autosub.models.transcription import Transcription
 from autosub.models.translation_context import TranslationContext
-from autosub.providers.base.transcriber import Transcriber
+from autosub.providers.base.transcriber import StreamingTranscriber
+from autosub.providers.glossary import GlossaryIndex
+from autosub.utils import chunk_audio_at_silence, stitch_transcriptions
 
 
-class Whisper(Transcriber):
+# Whisper keeps only the last half of its text context, minus one token, from the prompt
+PROMPT_MAX_TOKENS = 223
+RECENT_SEGMENTS_FOR_PROMPT = 50
+
+
+class Whisper(StreamingTranscriber):
     def __init__(self, model: str):
         self._model = whisper.load_model(model, in_memory=True)
 
-    def transcribe(self, target_language: Language, audio_file: str, context: Optional[TranslationContext] = None) -> Tuple[Transcription, ...]:
-        phrases: str = ', '.join([phrase.foreign for phrase in context.phrases] if context is not None else [])
+    def _build_prompt(self, glossary: GlossaryIndex, recent_texts: Iterable[str]) -> Optional[str]:
+        """Fill the prompt with the phrases most likely to be heard next, those just heard first"""
+        tokenizer = get_tokenizer(multilingual=True)
+        selected: List[str] = []
+        prompt_tokens = 0
+        for phrase in glossary.rank(recent_texts):
+            phrase_tokens = len(tokenizer.encode(phrase.foreign)) + 1
+            if prompt_tokens + phrase_tokens > PROMPT_MAX_TOKENS:
+                continue
+            selected.append(phrase.foreign)
+            prompt_tokens += phrase_tokens
+        phrases: str = ', '.join(selected)
+        return phrases if len(phrases) > 0 else None
 
+    def _transcribe_audio(self, audio: Union[str, np.ndarray], prompt: Optional[str], offset: timedelta) -> List[Transcription]:
         raw_result = self._model.transcribe(
-            audio_file,
+            audio,
             fp16=False,
-            prompt=phrases if len(phrases) > 0 else None
+            prompt=prompt
+        )
+        return _segments_to_transcriptions(raw_result['segments'], offset)
+
+    def transcribe(self, target_language: Language, audio_file: str, context: Optional[TranslationContext] = None) -> Tuple[Transcription, ...]:
+        glossary = GlossaryIndex(context.phrases if context is not None else [])
+        # Decoded here rather than by the model, for the length of the audio
+        audio = whisper.load_audio(audio_file)
+        transcriptions = tuple(self._transcribe_audio(audio, self._build_prompt(glossary, []), timedelta()))
+        metrics.increment('transcribed_segments_total', len(transcriptions), provider='whisper')
+        metrics.increment('transcribed_audio_seconds_total', len(audio) / AUDIO_SAMPLE_RATE, provider='whisper')
+        return transcriptions
+
+    def iter_transcribe_stream(
+        self,
+        target_language: Language,
+        audio_windows: Iterable[AudioWindow],
+        context: Optional[TranslationContext] = None
+    ) -> Iterator[Transcription]:
+        glossary = GlossaryIndex(context.phrases if context is not None else [])
+        recent_texts: Deque[str] = deque(maxlen=RECENT_SEGMENTS_FOR_PROMPT)
+        for window in audio_windows:
+            for transcription in self._transcribe_audio(window.samples, self._build_prompt(glossary, recent_texts), window.offset):
+                recent_texts.append(transcription.text)
+                metrics.increment('transcribed_segments_total', provider='whisper')
+                yield transcription
+            metrics.increment('transcribed_audio_seconds_total', window.duration.total_seconds(), provider='whisper')
+
+
+class ParallelWhisper(Whisper):
+    """Transcribe chunks of audio, cut at silence, in a pool of processes that each hold their own model"""
+
+    def __init__(self, model: str, *, workers: int, chunk_seconds: float = 120):
+        if workers < 1:
+            raise ValueError(f"workers must be at least 1, got {workers}")
+        self._workers = workers
+        self._chunk_seconds = chunk_seconds
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(model, max(1, (os.cpu_count() or 1) // workers)),
         )
-        return tuple(
-            Transcription(
-                speaker=None,
-                text=segment['text'],
-                time_start=timedelta(seconds=segment['start']),
-                time_end=timedelta(seconds=segment['end']),
-            )
-            for segment in raw_result['segments']
+        # Load the models upfront, like Whisper does, rather than on the first chunk
+        for future in [self._pool.submit(_is_worker_ready) for _ in range(workers)]:
+            future.result()
+
+    def close(self):
+        self._pool.shutdown()
+
+    def transcribe(self, target_language: Language, audio_file: str, context: Optional[TranslationContext] = None) -> Tuple[Transcription, ...]:
+        audio = whisper.load_audio(audio_file)
+        return self.transcribe_stream(target_language, [AudioWindow(offset=timedelta(), samples=audio)], context=context)
+
+    def iter_transcribe_stream(
+        self,
+        target_language: Language,
+        audio_windows: Iterable[AudioWindow],
+        context: Optional[TranslationContext] = None
+    ) -> Iterator[Transcription]:
+        glossary = GlossaryIndex(context.phrases if context is not None else [])
+        recent_texts: Deque[str] = deque(maxlen=RECENT_SEGMENTS_FOR_PROMPT)
+        in_flight: Deque[Tuple[timedelta, Future]] = deque()
+        previous: Optional[Transcription] = None
+        for chunk in chunk_audio_at_silence(audio_windows, self._chunk_seconds):
+            # Keep the pool busy while holding at most a couple of chunks per worker in memory
+            if len(in_flight) >= 2 * self._workers:
+                offset, future = in_flight.popleft()
+                for transcription in stitch_transcriptions(previous, _segments_to_transcriptions(future.result(), offset)):
+                    previous = transcription
+                    recent_texts.append(transcription.text)
+                    metrics.increment('transcribed_segments_total', provider='whisper')
+                    yield transcription
+            # Chunks run ahead of the results, so the prompt is based on the latest chunk that finished
+            prompt = self._build_prompt(glossary, recent_texts)
+            metrics.increment('transcribed_audio_seconds_total', chunk.duration.total_seconds(), provider='whisper')
+            in_flight.append((chunk.offset, self._pool.submit(_transcribe_chunk, chunk.samples, prompt)))
+        while len(in_flight) > 0:
+            offset, future = in_flight.popleft()
+            for transcription in stitch_transcriptions(previous, _segments_to_transcriptions(future.result(), offset)):
+                previous = transcription
+                metrics.increment('transcribed_segments_total', provider='whisper')
+                yield transcription
+
+
+def _segments_to_transcriptions(segments: Iterable[Dict[str, Any]], offset: timedelta) -> List[Transcription]:
+    return [
+        Transcription(
+            speaker=None,
+            text=segment['text'],
+            time_start=offset + timedelta(seconds=segment['start']),
+            time_end=offset + timedelta(seconds=segment['end']),
         )
+        for segment in segments
+    ]
+
+
+_worker_model: Optional[Any] = None
+
+
+def _init_worker(model: str, threads: int):
+    global _worker_model
+    torch.set_num_threads(threads)
+    _worker_model = whisper.load_model(model, in_memory=True)
+
+
+def _is_worker_ready() -> bool:
+    return _worker_model is not None
+
+
+def _transcribe_chunk(samples: np.ndarray, prompt: Optional[str]) -> List[Dict[str, Any]]:
+    assert _worker_model is not None
+    if len(samples) < AUDIO_SAMPLE_RATE // 10:
+        return []
+    raw_result = _worker_model.transcribe(samples, fp16=False, prompt=prompt)
+    return [
+        {'text': segment['text'], 'start': segment['start'], 'end': segment['end']}
+        for segment in raw_result['segments']
+    ]
@@ -1,9 +1,17 @@
 from dataclasses import replace, asdict, is_dataclass
 import datetime
+import hashlib
+from io import BufferedIOBase
 import json
 import os
+import queue
 import subprocess
-from typing import List, Optional, Tuple
+import threading
+from typing import Callable, Generator, Iterable, Iterator, List, Optional, Sequence, Tuple, Union, cast
+
+import numpy as np
+
+from autosub.models.audio import AUDIO_SAMPLE_RATE, AudioWindow
 from autosub.models.language import Language
 
 from autosub.models.transcription import Transcription
@@ -11,6 +19,10 @@ from autosub.models.translation_context import TranslationContext
 from autosub.providers.base.translator import Translator
 
 
+# How far around a preferred cut to look for silence
+SILENCE_SEARCH_SECONDS = 10
+
+
 def extract_audio_as_wav(
     path_input: str,
     path_output: str,
@@ -21,7 +33,7 @@ def extract_audio_as_wav(
             '-i',
             path_input,
             '-ar',
-            '16000',
+            str(AUDIO_SAMPLE_RATE),
             '-ac',
             '1',
             '-c:a',
@@ -34,6 +46,201 @@ def extract_audio_as_wav(
     )
 
 
+def encode_audio_as_flac(
+    path_input: str,
+    path_output: str,
+):
+    subprocess.run(
+        [
+            'ffmpeg',
+            '-i',
+            path_input,
+            '-ar',
+            str(AUDIO_SAMPLE_RATE),
+            '-ac',
+            '1',
+            '-c:a',
+            'flac',
+            '-y',
+            path_output,
+        ],
+        capture_output=True,
+        check=True
+    )
+
+
+def _read_pcm_windows(
+    path_input: str,
+    window_seconds: int,
+) -> Generator[AudioWindow, None, None]:
+    """Decode the audio track of a media file through an ffmpeg pipe, one fixed-size window at a time"""
+    window_bytes = window_seconds * AUDIO_SAMPLE_RATE * np.dtype(np.int16).itemsize
+    process = subprocess.Popen(
+        [
+            'ffmpeg',
+            '-nostdin',
+            '-i',
+            path_input,
+            '-ar',
+            str(AUDIO_SAMPLE_RATE),
+            '-ac',
+            '1',
+            '-f',
+            's16le',
+            '-c:a',
+            'pcm_s16le',
+            '-',
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    assert process.stdout is not None
+    # Buffered by default, which reads straight into the window buffer
+    stdout = cast(BufferedIOBase, process.stdout)
+    buffer = bytearray(window_bytes)
+    view = memoryview(buffer)
+    samples_read = 0
+    try:
+        while True:
+            filled = 0
+            while filled < window_bytes:
+                count = stdout.readinto(view[filled:])
+                if not count:
+                    break
+                filled += count
+            if filled == 0:
+                break
+            pcm = np.frombuffer(buffer, dtype=np.int16, count=filled // 2)
+            samples = np.divide(pcm, 32768.0, dtype=np.float32)
+            yield AudioWindow(
+                offset=datetime.timedelta(seconds=samples_read / AUDIO_SAMPLE_RATE),
+                samples=samples,
+            )
+            samples_read += len(samples)
+            if filled < window_bytes:
+                break
+    finally:
+        stdout.close()
+        return_code = process.wait()
+    if return_code != 0:
+        raise subprocess.CalledProcessError(return_code, process.args)
+
+
+def stream_audio_as_pcm(
+    path_input: str,
+    window_seconds: int = 600,
+) -> Iterator[AudioWindow]:
+    """Decode the audio track of a media file through an ffmpeg pipe, one window of about `window_seconds` at a time.
+
+    Windows end at the quietest moment near their nominal length rather than in the middle of a word. They follow each
+    other without overlap, and memory stays bounded by about twice the window size regardless of the media length.
+
+    Args:
+        path_input (str): path to the media file
+        window_seconds (int, optional): length of each window in seconds. Defaults to 600.
+
+    Yields:
+        AudioWindow: mono 16 kHz samples normalised to [-1, 1], with the offset of the window in the media
+    """
+    if window_seconds < 1:
+        raise ValueError(f"window_seconds must be at least 1, got {window_seconds}")
+    windows = _read_pcm_windows(path_input, window_seconds)
+    try:
+        yield from chunk_audio_at_silence(
+            windows,
+            window_seconds,
+            search_seconds=min(SILENCE_SEARCH_SECONDS, window_seconds / 4),
+            overlap_seconds=0,
+        )
+    finally:
+        windows.close()
+
+
+def chunk_audio_at_silence(
+    audio_windows: Iterable[AudioWindow],
+    chunk_seconds: float,
+    search_seconds: float = SILENCE_SEARCH_SECONDS,
+    overlap_seconds: float = 1,
+    silence_threshold: float = 0.01,
+    frame_seconds: float = 0.02,
+) -> Generator[AudioWindow, None, None]:
+    """Re-cut consecutive audio windows into chunks that end at the quietest point near the requested length.
+
+    When even the quietest frame is louder than the silence threshold, the next chunk starts overlap_seconds earlier
+    so that speech cut at the boundary appears whole in at least one chunk.
+
+    Args:
+        audio_windows (Iterable[AudioWindow]): consecutive windows of 16 kHz mono samples
+        chunk_seconds (float): preferred chunk length
+        search_seconds (float, optional): how far around the preferred length to look for silence. Defaults to 10.
+        overlap_seconds (float, optional): overlap between chunks cut in the middle of sound. Defaults to 1.
+        silence_threshold (float, optional): RMS amplitude below which a frame counts as silence. Defaults to 0.01.
+        frame_seconds (float, optional): length of the frames the RMS is computed over. Defaults to 0.02.
+
+    Yields:
+        AudioWindow: chunks with their offset in the audio
+    """
+    chunk_samples = int(chunk_seconds * AUDIO_SAMPLE_RATE)
+    search_samples = int(search_seconds * AUDIO_SAMPLE_RATE)
+    overlap_samples = int(overlap_seconds * AUDIO_SAMPLE_RATE)
+    frame_samples = max(1, int(frame_seconds * AUDIO_SAMPLE_RATE))
+    if chunk_samples <= search_samples or chunk_samples <= overlap_samples:
+        raise ValueError("chunk_seconds must be longer than both search_seconds and overlap_seconds")
+
+    # Typed as any shape, slices of a 1-D array are not known to numpy's stubs to stay 1-D
+    pending: np.ndarray = np.empty(0, dtype=np.float32)
+    pending_offset = 0
+    for window in audio_windows:
+        if len(pending) == 0:
+            pending_offset = int(window.offset.total_seconds() * AUDIO_SAMPLE_RATE)
+        pending = np.concatenate((pending, window.samples))
+        while len(pending) >= chunk_samples + search_samples:
+            search_start = chunk_samples - search_samples
+            frame_count = (2 * search_samples) // frame_samples
+            frames = pending[search_start:search_start + frame_count * frame_samples].reshape(frame_count, frame_samples)
+            rms = np.sqrt(np.mean(np.square(frames), axis=1))
+            quietest = int(np.argmin(rms))
+            cut = search_start + quietest * frame_samples + frame_samples // 2
+            yield AudioWindow(
+                offset=datetime.timedelta(seconds=pending_offset / AUDIO_SAMPLE_RATE),
+                samples=pending[:cut],
+            )
+            next_start = cut if rms[quietest] <= silence_threshold else cut - overlap_samples
+            pending = pending[next_start:]
+            pending_offset += next_start
+    if len(pending) > 0:
+        yield AudioWindow(
+            offset=datetime.timedelta(seconds=pending_offset / AUDIO_SAMPLE_RATE),
+            samples=pending,
+        )
+
+
+def stitch_transcriptions(previous: Optional[Transcription], chunk: Iterable[Transcription]) -> List[Transcription]:
+    """Drop the segments of a chunk that repeat what the previous chunk already covered.
+
+    Args:
+        previous (Optional[Transcription]): the last segment kept from the previous chunk
+        chunk (Iterable[Transcription]): segments of the next chunk, already on the global timeline
+
+    Returns:
+        List[Transcription]: the segments to keep
+    """
+    if previous is None:
+        return list(chunk)
+    previous_text = previous.text.strip()
+    result: List[Transcription] = []
+    for transcription in chunk:
+        if transcription.time_end <= previous.time_end:
+            continue
+        if transcription.time_start < previous.time_end:
+            text = transcription.text.strip()
+            midpoint = transcription.time_start + (transcription.time_end - transcription.time_start) / 2
+            if len(text) == 0 or text in previous_text or midpoint <= previous.time_end:
+                continue
+        result.append(transcription)
+    return result
+
+
 def prefix_transcriptions(transcriptions: List[Transcription], prefix: str) -> List[Transcription]:
     return [
         replace(transcription, text=prefix + transcription.text)
@@ -62,6 +269,180 @@ def translate_transcriptions(
     )
 
 
+def translate_transcriptions_in_batches(
+    *,
+    transcriptions: Sequence[Transcription],
+    translator: Translator,
+    source_language: Language,
+    target_language: Language,
+    input_description: str,
+    context: Optional[TranslationContext],
+    batch_characters: int = 2000,
+    on_translated: Optional[Callable[[Tuple[Transcription, ...]], None]] = None,
+) -> Tuple[Transcription, ...]:
+    """Translate transcriptions that are all available already, in batches of about `batch_characters` of text
+
+    Args:
+        transcriptions (Sequence[Transcription]): transcriptions
+        translator (Translator): translator
+        source_language (Language): language of the transcriptions
+        target_language (Language): target language
+        input_description (str): English description of the input
+        context (Optional[TranslationContext]): context for the translation
+        batch_characters (int, optional): text length at which a batch is sent. Defaults to 2000.
+        on_translated (Optional[Callable[[Tuple[Transcription, ...]], None]], optional): called with each translated batch,
+            in order, as soon as it is ready. Defaults to None.
+
+    Returns:
+        Tuple[Transcription, ...]: the translations
+    """
+    translated: List[Transcription] = []
+    start = 0
+    while start < len(transcriptions):
+        end = start
+        batch_length = 0
+        while end < len(transcriptions) and (end == start or batch_length < batch_characters):
+            batch_length += len(transcriptions[end].text)
+            end += 1
+        batch_translated = translate_transcriptions(
+            transcriptions=tuple(transcriptions[start:end]),
+            translator=translator,
+            source_language=source_language,
+            target_language=target_language,
+            input_description=input_description,
+            context=context,
+        )
+        translated.extend(batch_translated)
+        if on_translated is not None:
+            on_translated(batch_translated)
+        start = end
+    return tuple(translated)
+
+
+class _EndOfStream:
+    ...
+
+
+def _produce_into_queue(
+    source: Iterable[Transcription],
+    target: 'queue.Queue[Union[Transcription, _EndOfStream, BaseException]]',
+    stop: threading.Event,
+):
+    item: Union[Transcription, _EndOfStream, BaseException]
+    try:
+        try:
+            for item in source:
+                while not stop.is_set():
+                    try:
+                        target.put(item, timeout=1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            item = _EndOfStream()
+        except BaseException as e:
+            item = e
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+    finally:
+        # Closing a generator source runs its cleanup now, e.g. stops the ffmpeg process of stream_audio_as_pcm,
+        # instead of leaving it running when the consumer gave up early
+        close = getattr(source, 'close', None)
+        if close is not None:
+            close()
+
+
+def translate_transcriptions_pipelined(
+    *,
+    transcriptions: Iterable[Transcription],
+    translator: Translator,
+    source_language: Language,
+    target_language: Language,
+    input_description: str,
+    context: Optional[TranslationContext],
+    batch_tokens: int = 1000,
+    batch_characters: int = 2000,
+    queue_size: int = 256,
+    on_translated: Optional[Callable[[Tuple[Transcription, ...]], None]] = None,
+) -> Tuple[Tuple[Transcription, ...], Tuple[Transcription, ...]]:
+    """Translate transcriptions while they are still being produced.
+
+    The transcriptions are drained by a background thread into a bounded queue. Pending segments are sent to the
+    translator as one batch as soon as they reach batch_tokens, as counted by the translator, or batch_characters of
+    text. Only the last batch, at the end of the input, is sent smaller. If translation fails, the producer is stopped
+    and its source closed before the error is raised.
+
+    Args:
+        transcriptions (Iterable[Transcription]): lazily produced transcriptions, e.g. from a StreamingTranscriber
+        translator (Translator): translator
+        source_language (Language): language of the transcriptions
+        target_language (Language): target language
+        input_description (str): English description of the input
+        context (Optional[TranslationContext]): context for the translation
+        batch_tokens (int, optional): tokens at which a batch is sent, for translators that count tokens. Defaults to 1000.
+        batch_characters (int, optional): text length at which a batch is sent. Defaults to 2000.
+        queue_size (int, optional): maximum number of transcribed segments waiting for translation. Defaults to 256.
+        on_translated (Optional[Callable[[Tuple[Transcription, ...]], None]], optional): called with each translated batch,
+            in order, as soon as it is ready. Defaults to None.
+
+    Returns:
+        Tuple[Tuple[Transcription, ...], Tuple[Transcription, ...]]: the transcriptions and their translations
+    """
+    pending: 'queue.Queue[Union[Transcription, _EndOfStream, BaseException]]' = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    producer = threading.Thread(target=_produce_into_queue, args=(transcriptions, pending, stop), daemon=True)
+    producer.start()
+
+    transcribed: List[Transcription] = []
+    translated: List[Transcription] = []
+    batch: List[Transcription] = []
+    batch_length = 0
+    batch_token_count = 0
+
+    def flush():
+        nonlocal batch, batch_length, batch_token_count
+        if len(batch) > 0:
+            batch_translated = translate_transcriptions(
+                transcriptions=tuple(batch),
+                translator=translator,
+                source_language=source_language,
+                target_language=target_language,
+                input_description=input_description,
+                context=context,
+            )
+            translated.extend(batch_translated)
+            if on_translated is not None:
+                on_translated(batch_translated)
+        batch = []
+        batch_length = 0
+        batch_token_count = 0
+
+    try:
+        while True:
+            item = pending.get()
+            if isinstance(item, _EndOfStream):
+                break
+            if isinstance(item, BaseException):
+                raise item
+            transcribed.append(item)
+            batch.append(item)
+            batch_length += len(item.text)
+            batch_token_count += translator.count_tokens(item.text) or 0
+            if batch_length >= batch_characters or batch_token_count >= batch_tokens:
+                flush()
+        flush()
+    finally:
+        # Also when translation failed, so that the producer does not go on transcribing for nobody
+        stop.set()
+        producer.join()
+    return tuple(transcribed), tuple(translated)
+
+
 class EnhancedJSONEncoder(json.JSONEncoder):
     def default(self, o):
         if is_dataclass(o):
@@ -71,6 +452,14 @@ class EnhancedJSONEncoder(json.JSONEncoder):
         return super().default(o)
 
 
+def hash_file(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
 def get_env_var(
     key: str,
     error_message_template: str = "Environment variable {key} is not defined"
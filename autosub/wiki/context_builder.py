@@ -0,0 +1,105 @@
+import logging
+from typing import Callable, Dict, List, Optional, Set
+
+from autosub.metrics import metrics
+from autosub.models.phrase_localisation import PhraseLocalisation
+from autosub.models.translation_context import ContextSource, TranslationContext
+from autosub.models.wiki import WikiPage
+from autosub.wiki.context_transformer.wikipage_transformer import WikipageTransformer
+from autosub.wiki.transport import WikiTransport
+
+
+class IncrementalContextBuilder:
+    """Build a translation context from wiki pages, redoing only the work whose source page has a new revision"""
+
+    def __init__(
+        self,
+        *,
+        wiki_transport: WikiTransport,
+        create_transformer: Callable[[WikiPage], WikipageTransformer],
+    ):
+        self._wiki_transport = wiki_transport
+        self._create_transformer = create_transformer
+        self._logger = logging.getLogger(__name__)
+
+    def _changed_titles(self, sources: List[ContextSource]) -> Set[str]:
+        latest = self._wiki_transport.retrieve_revision_ids([source.title for source in sources])
+        return {
+            source.title for source in sources
+            if source.revision_id is None or latest.get(source.title) != source.revision_id
+        }
+
+    def build(self, title: str, previous: Optional[TranslationContext] = None) -> Optional[TranslationContext]:
+        """Build the context of a creative work
+
+        Args:
+            title (str): title of the wiki page of the creative work
+            previous (Optional[TranslationContext]): context from an earlier build, to be updated
+
+        Returns:
+            Optional[TranslationContext]: the context, or None if none of the previous source pages have changed
+        """
+        sources = previous.sources if previous is not None else []
+        if len(sources) == 0 or sources[0].title != title:
+            # Contexts from older versions or of another page have to be built from scratch
+            previous = None
+            sources = []
+            changed = {title}
+        else:
+            with metrics.span('check_revisions', pages=len(sources)):
+                changed = self._changed_titles(sources)
+            if len(changed) == 0:
+                return None
+            self._logger.info(f"Pages changed since the last build: {', '.join(sorted(changed))}")
+
+        previous_sources: Dict[str, ContextSource] = {source.title: source for source in sources}
+        if previous is None or title in changed:
+            transformer = self._create_transformer(self._wiki_transport.retrieve_wikipage(title))
+            with metrics.span('prepare_synopsis'):
+                synopsis = transformer.prepare_synopsis()
+            phrase_page = transformer.find_phrase_page()
+        else:
+            # Only a page that phrases came from has changed, so the synopsis and the choice of that page still stand
+            phrase_title = next(source.title for source in sources[1:] if source.title in changed)
+            pages = self._wiki_transport.retrieve_wikipages([title, phrase_title])
+            transformer = self._create_transformer(pages[title])
+            synopsis = previous.synopsis
+            phrase_page = pages[phrase_title] if phrase_title in pages else transformer.find_phrase_page()
+
+        phrase_source = previous_sources.get(phrase_page.title)
+        kept_fingerprints: Set[str] = set()
+        fresh_phrases: List[PhraseLocalisation] = []
+        if phrase_source is not None and phrase_source.title not in changed and phrase_source.revision_id == phrase_page.revision_id:
+            kept_fingerprints = set(phrase_source.phrase_fingerprints)
+            self._logger.info(f"Reusing phrases extracted from '{phrase_page.title}'")
+        else:
+            with metrics.span('extract_phrases', page=phrase_page.title) as span:
+                fresh_phrases = transformer.extract_phrases(phrase_page)
+                span.attributes['phrases'] = len(fresh_phrases)
+
+        # Phrases that no source accounts for were added by hand and survive rebuilds
+        extracted_fingerprints = {fingerprint for source in sources for fingerprint in source.phrase_fingerprints}
+        fresh_fingerprints = {phrase.fingerprint for phrase in fresh_phrases}
+        phrases: Dict[str, PhraseLocalisation] = {}
+        for phrase in (previous.phrases if previous is not None else []) + fresh_phrases:
+            fingerprint = phrase.fingerprint
+            if fingerprint in kept_fingerprints or fingerprint in fresh_fingerprints or fingerprint not in extracted_fingerprints:
+                phrases.setdefault(fingerprint, phrase)
+        phrase_fingerprints = [
+            fingerprint for fingerprint in phrases
+            if fingerprint in kept_fingerprints or fingerprint in fresh_fingerprints
+        ]
+
+        main_page = transformer.wikipage
+        new_sources = [ContextSource(
+            title=title,
+            revision_id=main_page.revision_id,
+            phrase_fingerprints=phrase_fingerprints if phrase_page.title == title else [],
+        )]
+        if phrase_page.title != title:
+            new_sources.append(ContextSource(
+                title=phrase_page.title,
+                revision_id=phrase_page.revision_id,
+                phrase_fingerprints=phrase_fingerprints,
+            ))
+        return TranslationContext(synopsis=synopsis, phrases=list(phrases.values()), sources=new_sources)
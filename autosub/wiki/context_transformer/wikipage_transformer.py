@@ -1,7 +1,8 @@
-from abc import ABC
-from typing import Dict, Optional, MutableSet
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, MutableSet
 from mwparserfromhell.nodes import Template, Heading
 from mwparserfromhell.wikicode import Wikicode as WikicodeRaw
+from autosub.models.phrase_localisation import PhraseLocalisation
 from autosub.models.translation_context import AbstractTranslationContextTransformer
 from autosub.models.wiki import WikiPage
 from autosub.wiki.transport import WikiTransport
@@ -20,6 +21,10 @@ class WikipageTransformer(AbstractTranslationContextTransformer, ABC):
         self._wikipage = wikipage
         self._wiki_transport = wiki_transport
 
+    @property
+    def wikipage(self) -> WikiPage:
+        return self._wikipage
+
     def _extract_template_params_as_text_safe(self, node: Template, index: int) -> Optional[str]:
         if index >= len(node.params):
             return None
@@ -53,7 +58,7 @@ class WikipageTransformer(AbstractTranslationContextTransformer, ABC):
             return None
 
         selected_title = self._llm_transport.select_one_from_list(
-            list(related_titles),
+            sorted(related_titles),
             "entries",
             page_criteria_description,
             allow_none=True,
@@ -80,3 +85,18 @@ class WikipageTransformer(AbstractTranslationContextTransformer, ABC):
         if section_heading_overview is None:
             return None
         return heading_to_section[section_heading_overview].strip_code()
+
+    def find_phrase_page(self) -> WikiPage:
+        """Find the page that phrases should be extracted from
+
+        Returns:
+            WikiPage: by default, the page of the creative work itself
+        """
+        return self._wikipage
+
+    @abstractmethod
+    def extract_phrases(self, wikipage: WikiPage) -> List[PhraseLocalisation]:
+        ...
+
+    def prepare_phrases(self) -> List[PhraseLocalisation]:
+        return self.extract_phrases(self.find_phrase_page())
@@ -0,0 +1,134 @@
+import logging
+import re
+import unicodedata
+from typing import Dict, List, Optional, Set, Tuple
+
+from autosub.metrics import metrics
+from autosub.providers.base.llm import LLM
+
+
+# Keywords of the criteria used when building context, in the languages wikis are commonly read in
+CRITERIA_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    'synopsis/overview': (
+        'synopsis', 'overview', 'plot', 'plot summary', 'summary', 'story', 'premise',
+        'あらすじ', '概要', 'ストーリー', '物語',
+        '剧情', '劇情', '简介', '簡介', '故事',
+        '줄거리', '개요',
+        'résumé', 'intrigue', 'handlung', 'inhalt', 'zusammenfassung', 'sinopsis', 'argumento', 'trama',
+    ),
+    'character list': (
+        'characters', 'character', 'list of characters', 'cast', 'cast and characters',
+        '登場人物', '登場キャラクター', 'キャラクター', '人物',
+        '角色', '登场人物', '登場角色', '出场人物',
+        '등장인물', '캐릭터',
+        'personnages', 'figuren', 'charaktere', 'personajes', 'personaggi',
+    ),
+}
+
+MIN_CONFIDENT_SCORE = 0.75
+MIN_CONFIDENT_MARGIN = 0.2
+# Words that do not change what a heading is about, e.g. "List of characters" and "Characters"
+FILLER_WORDS = frozenset(('a', 'and', 'of', 'the', 'list', 'de', 'des', 'du', 'et', 'la', 'le', 'les', 'y', 'e', 'der', 'die', 'und'))
+
+
+def _normalise(text: str) -> str:
+    return ' '.join(re.sub(r'[^\w]+', ' ', unicodedata.normalize('NFKC', text).casefold()).split())
+
+
+def _is_wide(text: str) -> bool:
+    return any(unicodedata.east_asian_width(char) in ('W', 'F') for char in text)
+
+
+def _criteria_keywords(criteria_description: str) -> List[str]:
+    keywords = CRITERIA_KEYWORDS.get(criteria_description.strip().lower())
+    if keywords is None:
+        # Unknown criteria are matched on their own words
+        keywords = tuple(re.split(r'[/,]', criteria_description))
+    return [normalised for normalised in (_normalise(keyword) for keyword in keywords) if len(normalised) > 0]
+
+
+def _wide_coverage(text: str, keywords: List[str]) -> float:
+    """Share of the characters of CJK text that are part of a keyword, since it is not separated into words"""
+    text = text.replace(' ', '')
+    covered: Set[int] = set()
+    for keyword in keywords:
+        keyword = keyword.replace(' ', '')
+        start = text.find(keyword)
+        while start >= 0:
+            covered.update(range(start, start + len(keyword)))
+            start = text.find(keyword, start + 1)
+    return len(covered) / len(text)
+
+
+def _word_coverage(text: str, keywords: List[str]) -> float:
+    """Share of the meaningful words of a text that belong to the keywords, if it contains a whole keyword at all"""
+    if not any(re.search(rf'(?<!\w){re.escape(keyword)}(?!\w)', text) is not None for keyword in keywords):
+        return 0.0
+    keyword_words = {word for keyword in keywords for word in keyword.split()}
+    words = [word for word in text.split() if word not in FILLER_WORDS]
+    if len(words) == 0:
+        return 0.0
+    return sum(1 for word in words if word in keyword_words) / len(words)
+
+
+def score_item(item: str, keywords: List[str]) -> float:
+    """Score how well an item matches any of the keywords
+
+    Only an item made up of keywords scores above MIN_CONFIDENT_SCORE. An item that merely contains a keyword, like
+    "Cast and crew" or "Character design", scores lower, and near spellings like "History" for "story" do not score.
+
+    Args:
+        item (str): e.g. a section heading or page title
+        keywords (List[str]): normalised keywords
+
+    Returns:
+        float: 1.0 for an exact match, 0.9 for an item made up of keywords, less for an item partly made up of them
+    """
+    normalised = _normalise(item)
+    if len(normalised) == 0:
+        return 0.0
+    if normalised in keywords:
+        return 1.0
+    if _is_wide(normalised):
+        coverage = _wide_coverage(normalised, [keyword for keyword in keywords if _is_wide(keyword)])
+    else:
+        coverage = _word_coverage(normalised, [keyword for keyword in keywords if not _is_wide(keyword)])
+    return 0.9 if coverage == 1.0 else 0.5 * coverage
+
+
+class HeuristicLLM(LLM):
+    """Pick obvious matches locally and only ask the wrapped LLM when the choice is ambiguous"""
+
+    def __init__(self, llm: LLM):
+        self._llm = llm
+        self._logger = logging.getLogger(__name__)
+
+    def select_locally(self, input: List[str], criteria_description: str) -> Optional[str]:
+        """Select the best scoring item if it is a confident match and clearly ahead of the rest
+
+        Returns:
+            Optional[str]: the item, or None when the LLM should decide
+        """
+        keywords = _criteria_keywords(criteria_description)
+        if len(input) == 0 or len(keywords) == 0:
+            return None
+        scored = sorted(((score_item(item, keywords), item) for item in input), key=lambda pair: pair[0], reverse=True)
+        best_score, best_item = scored[0]
+        runner_up_score = scored[1][0] if len(scored) > 1 else 0.0
+        if best_score >= MIN_CONFIDENT_SCORE and best_score - runner_up_score >= MIN_CONFIDENT_MARGIN:
+            return best_item
+        return None
+
+    def select_one_from_list(
+        self,
+        input: List[str],
+        item_description: str,
+        criteria_description: str,
+        allow_none: bool
+    ) -> Optional[str]:
+        selected = self.select_locally(input, criteria_description)
+        if selected is not None:
+            metrics.increment('llm_selections_total', source='heuristic')
+            self._logger.info(f"Selected '{selected}' as {criteria_description} without the LLM")
+            return selected
+        return self._llm.select_one_from_list(input, item_description, criteria_description, allow_none)
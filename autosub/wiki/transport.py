@@ -1,19 +1,45 @@
+import hashlib
+import json
+import os
 from urllib.parse import urljoin
-from typing import Dict, Optional
-from requests import Request, Response, Session
+from typing import Any, Dict, List, Optional
+from requests import Response, Session
+from requests.adapters import HTTPAdapter
 
+from autosub.metrics import metrics
 from autosub.models.wiki import WikiCode, WikiPage
 
 
+# The MediaWiki API accepts up to 50 titles per query for regular clients
+MAX_TITLES_PER_QUERY = 50
+
+
 class WikiTransport:
     def __init__(
         self,
         *,
         base_url: str,
         user_agent: str,
+        cache_dir: Optional[str] = None,
+        pool_size: int = 4,
     ):
         self._base_url = base_url
         self._user_agent = user_agent
+        self._cache_dir = cache_dir
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+        # One session for the lifetime of the transport, so that connections are kept alive between queries
+        self._session = Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._session.headers.update({
+            'User-Agent': self._user_agent,
+            'Accept-Encoding': 'gzip',
+        })
+
+    def close(self):
+        self._session.close()
 
     def _check_status(self, response: Response):
         if response.status_code >= 200 and response.status_code < 300:
@@ -27,56 +53,163 @@ class WikiTransport:
         endpoint: str,
         params: Optional[Dict[str, str]] = None
     ) -> Response:
-        session = Session()
-        request = Request(
-            method=method,
-            url=urljoin(self._base_url, endpoint),
-            params=params,
-            headers={
-                'user_agent': self._user_agent,
-                'Accept-Encoding': 'gzip'
-            }
-        )
-        return session.send(request.prepare())
+        with metrics.span('wiki_request', endpoint=endpoint):
+            response = self._session.request(
+                method=method,
+                url=urljoin(self._base_url, endpoint),
+                params=params,
+            )
+        metrics.increment('wiki_requests_total')
+        metrics.increment('wiki_response_bytes_total', len(response.content))
+        return response
 
-    def retrieve_wikipage(self, title: str) -> WikiPage:
-        result = []
+    def _query_revisions(self, titles: List[str], with_content: bool) -> Dict[str, Dict[str, Any]]:
+        """Query the latest revision of each title, following normalisation and redirects
 
-        response = self._send_request(
-            method='GET',
-            endpoint='/w/api.php',
-            params={
-                'action': 'query',
-                'prop': 'revisions',
-                'rvprop': 'content',
-                'format': 'json',
-                'rvslots': 'main',
-                'formatversion': '2',
-                'redirects': '1',
-                'titles': title,
-            }
-        )
-        self._check_status(response)
-        response_content = response.json()
-        pages = [
-            page
-            for page
-            in response_content.get('query', {}).get('pages', [])
-            if not page.get('missing', False)
-        ]
-
-        if len(pages) == 0:
-            raise Exception(f"Wikipedia page not found for '{title}'")
+        Returns:
+            Dict[str, Dict[str, Any]]: the page of each requested title that exists
+        """
+        result: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(titles), MAX_TITLES_PER_QUERY):
+            chunk = titles[start:start + MAX_TITLES_PER_QUERY]
+            renames: Dict[str, str] = {}
+            pages: Dict[str, Dict[str, Any]] = {}
+            continuation: Dict[str, str] = {}
+            while True:
+                response = self._send_request(
+                    method='GET',
+                    endpoint='/w/api.php',
+                    params={
+                        'action': 'query',
+                        'prop': 'revisions',
+                        'rvprop': 'ids|content' if with_content else 'ids',
+                        'format': 'json',
+                        'rvslots': 'main',
+                        'formatversion': '2',
+                        'redirects': '1',
+                        'titles': '|'.join(chunk),
+                        **continuation,
+                    }
+                )
+                self._check_status(response)
+                data = response.json()
+                query = data.get('query', {})
+                renames.update({
+                    rename['from']: rename['to']
+                    for rename in query.get('normalized', []) + query.get('redirects', [])
+                })
+                for page in query.get('pages', []):
+                    if page.get('missing', False) or 'title' not in page:
+                        continue
+                    # Pages whose content did not fit in the response come without revisions until a later continuation
+                    if 'revisions' in page or page['title'] not in pages:
+                        pages[page['title']] = page
+                continuation = data.get('continue', {})
+                if len(continuation) == 0:
+                    break
+            for title in chunk:
+                resolved = title
+                # Normalisation comes before redirects, and redirects do not chain in the API response
+                for _ in range(3):
+                    if resolved not in renames:
+                        break
+                    resolved = renames[resolved]
+                if resolved in pages:
+                    result[title] = pages[resolved]
+        return result
+
+    @staticmethod
+    def _revision_id(page: Dict[str, Any]) -> Optional[int]:
+        revisions = page.get('revisions', [])
+        return revisions[0].get('revid') if len(revisions) > 0 else None
 
-        for page in pages:
-            revisions = page.get('revisions', [])
-            if len(revisions) == 0:
-                continue
-            wikitext = revisions[0].get('slots', {}).get('main', {}).get('content', None)
+    @staticmethod
+    def _to_wikipage(title: str, page: Dict[str, Any]) -> WikiPage:
+        result = []
+        for revision in page.get('revisions', [])[:1]:
+            wikitext = revision.get('slots', {}).get('main', {}).get('content', None)
             if wikitext is not None:
                 result.append(WikiCode(raw=wikitext))
-
         return WikiPage(
             title=title,
-            wikicodes=result
+            wikicodes=result,
+            revision_id=WikiTransport._revision_id(page),
         )
+
+    def _cache_path(self, title: str) -> str:
+        assert self._cache_dir is not None
+        return os.path.join(self._cache_dir, hashlib.sha256(title.encode('utf8')).hexdigest() + '.json')
+
+    def _read_cache(self, title: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._cache_path(title), 'r', encoding='utf8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_cache(self, title: str, page: WikiPage):
+        path = self._cache_path(title)
+        with open(path + '.tmp', 'w', encoding='utf8') as f:
+            json.dump(
+                {'title': title, 'revision_id': page.revision_id, 'wikicodes': [wikicode.raw for wikicode in page.wikicodes]},
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(path + '.tmp', path)
+
+    def retrieve_revision_ids(self, titles: List[str]) -> Dict[str, Optional[int]]:
+        """Look up the latest revision of each title without downloading any content
+
+        Args:
+            titles (List[str]): page titles
+
+        Returns:
+            Dict[str, Optional[int]]: revision id of each title that exists
+        """
+        return {title: self._revision_id(page) for (title, page) in self._query_revisions(titles, with_content=False).items()}
+
+    def retrieve_wikipages(self, titles: List[str]) -> Dict[str, WikiPage]:
+        """Retrieve many pages in as few round-trips as possible
+
+        With a cache directory, only the revision ids are queried first and pages whose cached revision is still the
+        latest are not downloaded again.
+
+        Args:
+            titles (List[str]): page titles
+
+        Returns:
+            Dict[str, WikiPage]: the page of each title that exists
+        """
+        unique_titles = list(dict.fromkeys(titles))
+        result: Dict[str, WikiPage] = {}
+        to_fetch = unique_titles
+
+        if self._cache_dir is not None:
+            revision_ids = self.retrieve_revision_ids(unique_titles)
+            to_fetch = []
+            for title, revision_id in revision_ids.items():
+                cached = self._read_cache(title)
+                if cached is not None and revision_id is not None and cached.get('revision_id') == revision_id:
+                    metrics.increment('wiki_page_cache_hits_total')
+                    result[title] = WikiPage(
+                        title=title,
+                        wikicodes=[WikiCode(raw=raw) for raw in cached['wikicodes']],
+                        revision_id=revision_id,
+                    )
+                else:
+                    to_fetch.append(title)
+
+        if len(to_fetch) == 0:
+            return result
+        for title, page in self._query_revisions(to_fetch, with_content=True).items():
+            result[title] = self._to_wikipage(title, page)
+            # A page without content would otherwise be reused as empty for as long as its revision is the latest
+            if self._cache_dir is not None and len(result[title].wikicodes) > 0:
+                self._write_cache(title, result[title])
+        return result
+
+    def retrieve_wikipage(self, title: str) -> WikiPage:
+        pages = self.retrieve_wikipages([title])
+        if title not in pages:
+            raise Exception(f"Wikipedia page not found for '{title}'")
+        return pages[title]
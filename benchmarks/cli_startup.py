@@ -0,0 +1,53 @@
+"""Measure the startup time of each subcommand, and which heavy backends it imports before doing any work.
+
+Usage: python -m benchmarks.cli_startup [--repeat 5]
+"""
+from argparse import ArgumentParser
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+
+SUBCOMMANDS = ('subtitle', 'subtitle-batch', 'context', 'combine')
+HEAVY_MODULES = ('torch', 'whisper', 'numba', 'google.cloud.speech', 'google.cloud.translate_v3', 'llama_cpp', 'openai', 'tiktoken')
+
+# Build the parser and parse a help request, as a run of the subcommand would before dispatching
+PROBE = """
+import json, sys
+import autosub.__main__ as main
+try:
+    main._create_parser().parse_args([sys.argv[1], '--help'])
+except SystemExit:
+    pass
+print(json.dumps([name for name in json.loads(sys.argv[2]) if name in sys.modules]))
+"""
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for subcommand in SUBCOMMANDS:
+        timings = []
+        imported = []
+        for _ in range(args.repeat):
+            started_at = time.perf_counter()
+            completed = subprocess.run(
+                [sys.executable, '-c', PROBE, subcommand, json.dumps(HEAVY_MODULES)],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            timings.append(time.perf_counter() - started_at)
+            imported = json.loads(completed.stdout.strip().splitlines()[-1])
+        print(
+            f"{subcommand}: median {statistics.median(timings) * 1000:.0f}ms, "
+            f"heavy modules imported: {', '.join(imported) if len(imported) > 0 else 'none'}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Compare combining many long subtitle groups the old way (one SSAFile, group after group) with the streaming merge.
+
+Usage: python -m benchmarks.combine_subtitles [--groups 16] [--lines 5000] [--workers 1 4] [--format srt]
+"""
+from argparse import ArgumentParser
+from dataclasses import asdict
+from datetime import timedelta
+import json
+import os
+import random
+import tempfile
+import time
+
+from autosub.combine import load_cues_in_parallel, merge_cues, write_merged_subtitles
+from autosub.models.subtitle import SubtitleFile, SubtitleGroup
+from autosub.models.transcription import Transcription
+from autosub.utils import EnhancedJSONEncoder
+
+
+def _write_group(path: str, lines: int, seed: int):
+    rng = random.Random(seed)
+    transcriptions = []
+    start = 0.0
+    # Times are written as times of day, so keep every group within 20 hours
+    step = min(20 * 3600 / lines, 4.0)
+    for index in range(lines):
+        start += rng.uniform(0.5, 1.5) * step
+        transcriptions.append(Transcription(
+            speaker=None,
+            text=f"line {index} " + 'x' * rng.randint(10, 60),
+            time_start=timedelta(seconds=start),
+            time_end=timedelta(seconds=start + rng.uniform(0.5, 1.5) * step),
+        ))
+    with open(path, 'w', encoding='utf8') as f:
+        json.dump({'transcribed': [asdict(t) for t in transcriptions], 'translated': [asdict(t) for t in transcriptions]}, f, cls=EnhancedJSONEncoder)
+
+
+def _combine_with_ssafile(groups, output_path: str):
+    combined_subtitle_file = SubtitleFile(groups=groups, prefix_group_name=True)
+    for group in groups:
+        with open(group.json_path, 'r', encoding='utf8') as f:
+            subtitle_dict = json.load(f)
+            combined_subtitle_file.add_all(group.name, [Transcription.from_dict(transcription_dict) for transcription_dict in subtitle_dict['translated']])
+    combined_subtitle_file.save(output_path)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--groups', type=int, default=16)
+    parser.add_argument('--lines', type=int, default=5000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--format', default='srt', choices=['ass', 'srt', 'vtt'])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        groups = []
+        for index in range(args.groups):
+            path = os.path.join(directory, f"group{index}.json")
+            _write_group(path, args.lines, seed=index)
+            groups.append(SubtitleGroup(name=f"group{index}", color_hex='#ffffff', margin_bottom=index * 10, json_path=path))
+        output_path = os.path.join(directory, f"combined.{args.format}")
+        print(f"{args.groups} groups of {args.lines} lines")
+
+        started_at = time.perf_counter()
+        _combine_with_ssafile(groups, output_path)
+        baseline_seconds = time.perf_counter() - started_at
+        print(f"SSAFile: {baseline_seconds:.2f}s")
+
+        for workers in args.workers:
+            started_at = time.perf_counter()
+            cues_of_groups = load_cues_in_parallel([group.json_path for group in groups], workers=workers)
+            count = write_merged_subtitles(output_path, groups, merge_cues(cues_of_groups), prefix_group_name=True)
+            elapsed = time.perf_counter() - started_at
+            print(f"streaming merge, {workers} workers: {elapsed:.2f}s, {count} lines, {baseline_seconds / elapsed:.1f}x faster")
+
+
+if __name__ == '__main__':
+    main()
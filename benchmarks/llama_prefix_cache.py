@@ -0,0 +1,64 @@
+"""Report the prompt tokens of each line against the tokens llama.cpp actually evaluates for it.
+
+Llama.generate reuses the KV cache of the prefix a prompt shares with the previous one, so with the shared instruction
+and glossary prefix only the line specific suffix should be evaluated.
+
+Usage: python -m benchmarks.llama_prefix_cache <gguf model> <context json> [--lines 20]
+"""
+from argparse import ArgumentParser
+import json
+import time
+from typing import List
+
+from autosub.models.language import Languages
+from autosub.models.translation_context import TranslationContext
+from autosub.providers.llama import LLAMA
+
+
+SAMPLE_LINES = [
+    'エレン、早く来い！',
+    '壁の外には何があるんだ？',
+    '調査兵団が戻ってきたぞ。',
+    'ミカサ、アルミンを頼む。',
+    'もう誰も失いたくない。',
+]
+
+
+def _count_evaluated_tokens(translator: LLAMA) -> List[int]:
+    evaluated: List[int] = []
+    llm = translator._llm
+    original_eval = llm.eval
+
+    def counting_eval(tokens):
+        evaluated.append(len(tokens))
+        return original_eval(tokens)
+
+    llm.eval = counting_eval  # type: ignore
+    return evaluated
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('llama_model')
+    parser.add_argument('context')
+    parser.add_argument('--lines', type=int, default=20)
+    args = parser.parse_args()
+
+    with open(args.context, 'r', encoding='utf8') as f:
+        context = TranslationContext.from_dict(json.load(f))
+    lines = [SAMPLE_LINES[index % len(SAMPLE_LINES)] for index in range(args.lines)]
+
+    translator = LLAMA(model=args.llama_model)
+    evaluated = _count_evaluated_tokens(translator)
+    prompt_tokens = translator.plan_translation(lines, Languages.JA.value, Languages.EN.value, context=context).prompt_tokens
+    started_at = time.perf_counter()
+    translator.translate(lines, Languages.JA.value, Languages.EN.value, context=context)
+    elapsed = time.perf_counter() - started_at
+    print(
+        f"{prompt_tokens / len(lines):.1f} prompt tokens per line, {sum(evaluated) / len(lines):.1f} evaluated per line, "
+        f"{elapsed / len(lines):.2f}s per line"
+    )
+
+
+if __name__ == '__main__':
+    main()
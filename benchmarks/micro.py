@@ -0,0 +1,249 @@
+"""Offline micro-benchmarks of autosub's hot paths, compared against stored baselines.
+
+Every case runs on synthetic fixtures. Providers are built by their own constructors, with their model and tokenizer
+replaced by stubs, so that no model is loaded and no request is sent.
+
+    python -m benchmarks.micro --save-baseline benchmarks/micro_baseline.json
+    python -m benchmarks.micro --baseline benchmarks/micro_baseline.json --max-slowdown 1.3
+
+Baselines depend on the machine, so they should be saved and compared on the same one. The committed
+micro_baseline.json is a reference point taken on a single core, save a local one before comparing. The exit status is
+1 if any case is slower than its baseline by more than --max-slowdown.
+"""
+from argparse import ArgumentParser
+from dataclasses import asdict
+from datetime import timedelta
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+from unittest import mock
+
+from autosub.models.transcription import Transcription
+from autosub.utils import EnhancedJSONEncoder
+
+
+# A case prepares its fixture and returns the operation to be timed
+Case = Callable[[], Callable[[], Any]]
+CASES: Dict[str, Case] = {}
+
+
+def case(name: str) -> Callable[[Case], Case]:
+    def register(setup: Case) -> Case:
+        CASES[name] = setup
+        return setup
+    return register
+
+
+def _stub_tokenize(text: bytes) -> range:
+    # Close enough to BPE for Japanese and English dialogue, and independent of any vocabulary file
+    return range(len(text) // 3 + 1)
+
+
+class _StubEncoding:
+    """Stands in for a tiktoken encoding"""
+
+    def encode(self, text: str) -> range:
+        return _stub_tokenize(text.encode('utf8'))
+
+
+class _StubLlama:
+    """Stands in for llama_cpp.Llama, without a model to load"""
+
+    def __init__(self, model_path: str, n_ctx: int):
+        ...
+
+    def tokenize(self, text: bytes) -> range:
+        return _stub_tokenize(text)
+
+
+def _dialogue(count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    syllables = ['か', 'き', 'く', 'さ', 'し', 'た', 'な', 'の', 'は', 'ま', 'よ', 'ら', 'を', 'ん']
+    return [''.join(rng.choice(syllables) for _ in range(rng.randint(4, 40))) for _ in range(count)]
+
+
+def _transcriptions(count: int) -> List[Transcription]:
+    return [
+        Transcription(speaker=None, text=text, time_start=timedelta(seconds=index * 2.5), time_end=timedelta(seconds=index * 2.5 + 2))
+        for (index, text) in enumerate(_dialogue(count))
+    ]
+
+
+def _offline_openai():
+    from autosub.providers import openai as openai_provider
+
+    with mock.patch.object(openai_provider.tiktoken, 'encoding_for_model', lambda model: _StubEncoding()):
+        return openai_provider.OpenAI(api_key='benchmark', model='gpt-3.5-turbo')
+
+
+def _offline_llama():
+    from autosub.providers import llama as llama_provider
+
+    with mock.patch.object(llama_provider, 'Llama', _StubLlama):
+        return llama_provider.LLAMA(model='benchmark.gguf')
+
+
+@case('openai_batch_by_token_count')
+def _openai_batch_by_token_count():
+    texts = _dialogue(5000)
+    # A fresh provider each time, so that token counts are not served from the memo of an earlier run
+    return lambda: _offline_openai()._batch_by_token_count(1500, texts)
+
+
+@case('llama_batch_by_token_count')
+def _llama_batch_by_token_count():
+    texts = _dialogue(5000, seed=1)
+    return lambda: _offline_llama()._batch_by_token_count(1500, texts)
+
+
+@case('transcription_from_dict')
+def _transcription_from_dict():
+    data = json.loads(json.dumps([asdict(t) for t in _transcriptions(5000)], cls=EnhancedJSONEncoder))
+    return lambda: [Transcription.from_dict(entry) for entry in data]
+
+
+@case('enhanced_json_encoder')
+def _enhanced_json_encoder():
+    transcriptions = _transcriptions(5000)
+    return lambda: json.dumps(
+        {'transcriptions': [asdict(t) for t in transcriptions], 'translated': [asdict(t) for t in transcriptions]},
+        cls=EnhancedJSONEncoder,
+        indent=4,
+        ensure_ascii=False,
+    )
+
+
+@case('subtitle_file_add_all_save')
+def _subtitle_file_add_all_save():
+    from autosub.models.subtitle import SubtitleFile, SubtitleGroup
+
+    groups = [SubtitleGroup(name=f"group{index}", color_hex='#ffcc00', margin_bottom=index * 20, json_path='') for index in range(2)]
+    transcriptions = _transcriptions(5000)
+    output_path = os.path.join(tempfile.mkdtemp(), 'micro.ass')
+
+    def run():
+        subtitle_file = SubtitleFile(groups=groups, prefix_group_name=True)
+        for group in groups:
+            subtitle_file.add_all(group.name, transcriptions)
+        subtitle_file.save(output_path)
+    return run
+
+
+@case('jp_phrase_extraction')
+def _jp_phrase_extraction():
+    from autosub.models.wiki import WikiCode, WikiPage
+    from autosub.wiki.context_transformer.jp_creative_work_wikipage_transformer import JPCreativeWorkWikipageTransformer
+
+    names = _dialogue(300, seed=2)
+    raw = '\n'.join(
+        f"== Character {index} ==\n"
+        f"{{{{Nihongo|Character {index}|{name}|Romaji {index}}}}} is voiced by [[Actor {index}]].{{{{sfn|Book|{index}}}}} "
+        + "''Lorem ipsum'' dolor sit amet. " * 10
+        + f"\n{{| class=\"wikitable\"\n|-\n| {{{{nihongo|Item {index}|{name}}}}} || {index}\n|}}\n"
+        for (index, name) in enumerate(names)
+    )
+
+    def run():
+        # A fresh page each time, so that nothing parsed by an earlier run is reused
+        wikipage = WikiPage(title='Synthetic', wikicodes=[WikiCode(raw=raw)])
+        transformer = JPCreativeWorkWikipageTransformer(wiki_transport=None, llm_transport=None, wikipage=wikipage)  # type: ignore[arg-type]
+        return transformer.extract_phrases(wikipage)
+    return run
+
+
+@case('openai_translate_one_batch')
+def _openai_translate_one_batch():
+    from autosub.providers import openai as openai_provider
+
+    rng = random.Random(3)
+
+    def respond(lines: List[str]) -> str:
+        # Mostly well formed, with the odd dropped line that has to be re-requested
+        return '\n'.join(f"{index}: EN {line}" for (index, line) in enumerate(lines) if len(lines) < 4 or rng.random() > 0.02)
+
+    def create(messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        lines = [line.split(': ', 1)[1] for line in messages[-1]['content'].split('\n')]
+        return {'choices': [{'message': {'content': respond(lines)}}]}
+
+    provider = _offline_openai()
+    batch = _dialogue(120, seed=4)
+
+    def run():
+        # The request goes through the provider's scheduler up to the openai library, which answers without sending it
+        with mock.patch.object(openai_provider.openai.ChatCompletion, 'create', create):
+            return provider._translate_one_batch('Translate each line to English.', batch)
+    return run
+
+
+def measure(setup: Case, repeat: int, min_seconds: float) -> float:
+    """Best time of one call, over repeat rounds of enough calls to last min_seconds"""
+    operation = setup()
+    operation()
+    calls = 1
+    while True:
+        started_at = time.perf_counter()
+        for _ in range(calls):
+            operation()
+        elapsed = time.perf_counter() - started_at
+        if elapsed >= min_seconds:
+            break
+        calls *= 2
+    best = elapsed / calls
+    for _ in range(repeat - 1):
+        started_at = time.perf_counter()
+        for _ in range(calls):
+            operation()
+        best = min(best, (time.perf_counter() - started_at) / calls)
+    return best
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('cases', nargs='*', help=f"cases to run, all by default: {', '.join(CASES)}")
+    parser.add_argument('--baseline', default=None, help='JSON of baseline seconds per case to compare against')
+    parser.add_argument('--save-baseline', dest='save_baseline', default=None, help='write the results as a baseline JSON')
+    parser.add_argument('--max-slowdown', dest='max_slowdown', type=float, default=1.25, help='fail if a case takes longer than this times its baseline')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-seconds', dest='min_seconds', type=float, default=0.2, help='minimum duration of each round')
+    args = parser.parse_args()
+
+    unknown = [name for name in args.cases if name not in CASES]
+    if len(unknown) > 0:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+    baseline: Dict[str, float] = {}
+    if args.baseline is not None:
+        with open(args.baseline, 'r', encoding='utf8') as f:
+            baseline = json.load(f)
+
+    results: Dict[str, float] = {}
+    regressions: List[str] = []
+    for name in args.cases or list(CASES):
+        try:
+            seconds = measure(CASES[name], args.repeat, args.min_seconds)
+        except ImportError as e:
+            print(f"{name}: skipped, {e}")
+            continue
+        results[name] = seconds
+        line = f"{name}: {seconds * 1000:.3f}ms"
+        if name in baseline:
+            ratio = seconds / baseline[name]
+            line += f" ({ratio:.2f}x baseline)"
+            if ratio > args.max_slowdown:
+                line += " REGRESSION"
+                regressions.append(name)
+        print(line)
+
+    if args.save_baseline is not None:
+        with open(args.save_baseline, 'w', encoding='utf8') as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+    if len(regressions) > 0:
+        print(f"Slower than {args.max_slowdown}x baseline: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""Measure the speedup of ParallelWhisper against the number of worker processes.
+
+Usage: python -m benchmarks.whisper_parallel <video or audio> <whisper model> [--workers 1 2 4 8]
+"""
+from argparse import ArgumentParser
+import time
+
+from autosub.models.language import Languages
+from autosub.providers.whisper import ParallelWhisper, Whisper
+from autosub.utils import stream_audio_as_pcm
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('media')
+    parser.add_argument('whisper_model')
+    parser.add_argument('--language', default=Languages.JA.name, choices=[language.name for language in Languages])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--chunk-seconds', type=float, default=120)
+    args = parser.parse_args()
+    language = Languages[args.language].value
+
+    baseline = Whisper(args.whisper_model)
+    started_at = time.perf_counter()
+    segments = baseline.transcribe_stream(language, stream_audio_as_pcm(args.media))
+    baseline_seconds = time.perf_counter() - started_at
+    print(f"sequential: {baseline_seconds:.1f}s, {len(segments)} segments")
+
+    for workers in args.workers:
+        transcriber = ParallelWhisper(args.whisper_model, workers=workers, chunk_seconds=args.chunk_seconds)
+        started_at = time.perf_counter()
+        segments = transcriber.transcribe_stream(language, stream_audio_as_pcm(args.media))
+        elapsed = time.perf_counter() - started_at
+        transcriber.close()
+        print(f"{workers} workers: {elapsed:.1f}s, {len(segments)} segments, {baseline_seconds / elapsed:.2f}x speedup")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Compare phrase extraction from full mwparserfromhell parsing against the template pre-scan.
+
+Character list pages make good fixtures. Save their wikitext with --fetch, then benchmark the saved files:
+
+    python -m benchmarks.wiki_prescan --fetch "List of Attack on Titan characters" --fixture-dir benchmarks/fixtures
+    python -m benchmarks.wiki_prescan benchmarks/fixtures/*.wiki
+"""
+from argparse import ArgumentParser
+import os
+import time
+from typing import Callable, List, Set, Tuple
+
+import mwparserfromhell as mwparser
+from mwparserfromhell.nodes import Template
+
+from autosub.models.wiki import WikiCode
+from autosub.wiki.context_transformer.jp_creative_work_wikipage_transformer import PHRASE_TEMPLATE_PREFIXES
+from autosub.wiki.transport import WikiTransport
+
+
+def _template_phrase(template: Template) -> Tuple[str, str]:
+    return (str(template.params[0].value).strip(), str(template.params[1].value).strip())
+
+
+def extract_top_level(raw: str) -> Set[Tuple[str, str]]:
+    """Extraction as it was before the pre-scan: top-level templates of the fully parsed page"""
+    return {
+        _template_phrase(node)
+        for node in mwparser.parse(raw).nodes
+        if isinstance(node, Template) and node.name.lower().startswith(PHRASE_TEMPLATE_PREFIXES) and len(node.params) > 1
+    }
+
+
+def extract_prescan(raw: str) -> Set[Tuple[str, str]]:
+    return {
+        _template_phrase(node)
+        for node in WikiCode(raw=raw).find_templates(PHRASE_TEMPLATE_PREFIXES)
+        if len(node.params) > 1
+    }
+
+
+def _time(extract: Callable[[str], Set[Tuple[str, str]]], raw: str, repeat: int) -> Tuple[float, Set[Tuple[str, str]]]:
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        phrases = extract(raw)
+    return (time.perf_counter() - started_at) / repeat, phrases
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('fixtures', nargs='*', help='files of raw wikitext')
+    parser.add_argument('--fetch', nargs='*', default=[], help='titles to download as fixtures instead of benchmarking')
+    parser.add_argument('--fixture-dir', default='benchmarks/fixtures')
+    parser.add_argument('--wiki-domain', default='https://en.wikipedia.org')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if len(args.fetch) > 0:
+        os.makedirs(args.fixture_dir, exist_ok=True)
+        transport = WikiTransport(base_url=args.wiki_domain, user_agent='autosub-benchmark')
+        for title, page in transport.retrieve_wikipages(args.fetch).items():
+            path = os.path.join(args.fixture_dir, title.replace('/', '_') + '.wiki')
+            with open(path, 'w', encoding='utf8') as f:
+                f.write('\n'.join(wikicode.raw for wikicode in page.wikicodes))
+            print(f"Saved {path}")
+        return
+
+    fixtures: List[str] = args.fixtures
+    for fixture in fixtures:
+        with open(fixture, 'r', encoding='utf8') as f:
+            raw = f.read()
+        full_seconds, full_phrases = _time(extract_top_level, raw, args.repeat)
+        prescan_seconds, prescan_phrases = _time(extract_prescan, raw, args.repeat)
+        found = full_phrases | prescan_phrases
+        print(
+            f"{os.path.basename(fixture)}: {len(raw)} chars\n"
+            f"  full parse: {full_seconds * 1000:.1f}ms, recall {len(full_phrases)}/{len(found)}\n"
+            f"  pre-scan:   {prescan_seconds * 1000:.1f}ms, recall {len(prescan_phrases)}/{len(found)}, "
+            f"{full_seconds / prescan_seconds:.1f}x faster"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List
+
+
+def _echo(request: Dict[str, Any]) -> Dict[str, Any]:
+    return request
+
+
+class FakeEndpoint:
+    """HTTP server on localhost answering POSTs with scripted status codes, then 200
+
+    It records the JSON bodies it received and the most requests it was serving at the same time.
+    """
+
+    def __init__(
+        self,
+        statuses: Iterable[int] = (),
+        reply: Callable[[Dict[str, Any]], Dict[str, Any]] = _echo,
+        delay_seconds: float = 0.0,
+    ):
+        self.requests: List[Dict[str, Any]] = []
+        self.max_in_flight = 0
+        self._statuses = list(statuses)
+        self._reply = reply
+        self._delay_seconds = delay_seconds
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with endpoint._lock:
+                    endpoint.requests.append(body)
+                    status = endpoint._statuses.pop(0) if len(endpoint._statuses) > 0 else 200
+                    endpoint._in_flight += 1
+                    endpoint.max_in_flight = max(endpoint.max_in_flight, endpoint._in_flight)
+                try:
+                    time.sleep(endpoint._delay_seconds)
+                    reply = endpoint._reply(body) if status == 200 else {'error': {'message': f"status {status}"}}
+                    content = json.dumps(reply).encode('utf8')
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(content)))
+                    self.end_headers()
+                    self.wfile.write(content)
+                finally:
+                    with endpoint._lock:
+                        endpoint._in_flight -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def __enter__(self) -> 'FakeEndpoint':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,107 @@
+"""Stand-ins for optional client libraries, put in sys.modules only when the real library is not installed
+
+Only the names the providers import are defined. Tests inject fake clients or patch the calls they make.
+"""
+import importlib.util
+import sys
+from types import ModuleType
+from typing import Any
+
+
+class _Message:
+    """Keeps the fields it is built with, like the proto messages of the Google Cloud clients"""
+
+    def __init__(self, **fields: Any):
+        self.__dict__.update(fields)
+
+
+class _GoogleAPIError(Exception):
+    ...
+
+
+def _module(name: str, **attributes: Any) -> ModuleType:
+    module = ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
+
+
+def _is_installed(name: str) -> bool:
+    if name in sys.modules:
+        # Imported already, or stubbed by an earlier test module
+        return True
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ModuleNotFoundError:
+        return False
+
+
+def install_google_cloud():
+    if _is_installed('google.cloud.speech') and _is_installed('google.api_core.exceptions'):
+        return
+    google = _module('google', __path__=[])
+    api_core = _module('google.api_core', __path__=[])
+    api_core.exceptions = _module(  # type: ignore
+        'google.api_core.exceptions',
+        NotFound=type('NotFound', (_GoogleAPIError,), {}),
+        AlreadyExists=type('AlreadyExists', (_GoogleAPIError,), {}),
+    )
+    glossary = type('Glossary', (_Message,), {'LanguageCodePair': type('LanguageCodePair', (_Message,), {})})
+    cloud = _module('google.cloud', __path__=[])
+    cloud.speech = _module('google.cloud.speech', RecognitionAudio=type('RecognitionAudio', (_Message,), {}))  # type: ignore
+    cloud.translate_v3 = _module(  # type: ignore
+        'google.cloud.translate_v3',
+        Glossary=glossary,
+        GlossaryInputConfig=type('GlossaryInputConfig', (_Message,), {}),
+        GcsSource=type('GcsSource', (_Message,), {}),
+    )
+    google.api_core = api_core  # type: ignore
+    google.cloud = cloud  # type: ignore
+
+
+def install_llama_cpp():
+    if _is_installed('llama_cpp'):
+        return
+    _module('llama_cpp', Llama=type('Llama', (), {}), CreateCompletionResponse=dict)
+
+
+class _OpenAIError(Exception):
+    """Keeps the fields openai 0.27 gives its errors"""
+
+    def __init__(self, message=None, http_body=None, http_status=None, json_body=None, headers=None, code=None):
+        super().__init__(message)
+        self.http_body = http_body
+        self.http_status = http_status
+        self.json_body = json_body
+        self.headers = headers or {}
+        self.code = code
+
+
+def _not_stubbed(*args, **kwargs):
+    raise NotImplementedError('stubbed openai library, patch the call under test')
+
+
+def install_openai():
+    if not _is_installed('openai'):
+        errors = {
+            name: type(name, (_OpenAIError,), {})
+            for name in [
+                'APIError', 'TryAgain', 'Timeout', 'APIConnectionError', 'InvalidRequestError',
+                'AuthenticationError', 'PermissionError', 'RateLimitError', 'ServiceUnavailableError',
+            ]
+        }
+        error = _module('openai.error', OpenAIError=_OpenAIError, **errors)
+        _module(
+            'openai',
+            __path__=[],
+            error=error,
+            proxy=None,
+            requestssession=None,
+            ChatCompletion=type('ChatCompletion', (), {'create': staticmethod(_not_stubbed)}),
+        )
+    if not _is_installed('tiktoken'):
+        def encoding_for_model(model: str):
+            raise KeyError(model)
+
+        encoding = type('Encoding', (), {'encode': staticmethod(lambda text: text.split())})()
+        _module('tiktoken', encoding_for_model=encoding_for_model, get_encoding=lambda name: encoding)
@@ -0,0 +1,61 @@
+import unittest
+
+from autosub.metrics import metrics
+from autosub.providers.alignment import SalvageStats, align_indexed_response, missing_indices
+
+
+class AlignIndexedResponseTest(unittest.TestCase):
+    def test_zero_based_reply(self):
+        self.assertEqual(align_indexed_response("0: a\n1: b\n2: c", 3), {0: 'a', 1: 'b', 2: 'c'})
+
+    def test_one_based_reply(self):
+        self.assertEqual(align_indexed_response("1: a\n2: b\n3: c", 3), {0: 'a', 1: 'b', 2: 'c'})
+
+    def test_one_based_reply_with_dots(self):
+        self.assertEqual(align_indexed_response("1. a\n2. b", 2), {0: 'a', 1: 'b'})
+
+    def test_partial_one_based_reply(self):
+        aligned = align_indexed_response("1: a\n3: c", 3)
+        self.assertEqual(aligned, {0: 'a', 2: 'c'})
+        self.assertEqual(missing_indices(aligned, 3), [1])
+
+    def test_partial_zero_based_reply(self):
+        aligned = align_indexed_response("0: a\n2: c", 3)
+        self.assertEqual(aligned, {0: 'a', 2: 'c'})
+
+    def test_ambiguous_partial_reply_is_dropped(self):
+        self.assertEqual(align_indexed_response("1: a\n2: b", 4), {})
+
+    def test_unnumbered_reply_of_matching_length(self):
+        self.assertEqual(align_indexed_response("a\nb", 2), {0: 'a', 1: 'b'})
+
+    def test_unnumbered_reply_of_other_length(self):
+        self.assertEqual(align_indexed_response("a\nb\nc", 2), {})
+
+    def test_duplicate_index_keeps_first_answer(self):
+        self.assertEqual(align_indexed_response("0: a\n0: x\n1: b", 3), {0: 'a', 1: 'b'})
+
+
+class SalvageStatsTest(unittest.TestCase):
+    def test_since_counts_only_later_batches(self):
+        stats = SalvageStats()
+        stats.record(4, 2)
+        before = stats.snapshot()
+        stats.record(3, 3)
+        stats.record(5, 4)
+
+        recent = stats.since(before)
+        self.assertEqual(recent.batches, 2)
+        self.assertEqual(recent.misaligned_batches, 1)
+        self.assertEqual(recent.salvaged_lines, 4)
+        self.assertEqual(recent.rerequested_lines, 1)
+
+    def test_recorded_batches_are_counted_in_the_metrics(self):
+        metrics.reset()
+        stats = SalvageStats(provider='openai')
+        stats.record(4, 2)
+        stats.record(3, 3)
+        self.assertEqual(metrics.counter('translation_batches_total', provider='openai'), 2)
+        self.assertEqual(metrics.counter('translation_misaligned_batches_total', provider='openai'), 1)
+        self.assertEqual(metrics.counter('translation_salvaged_lines_total', provider='openai'), 2)
+        self.assertEqual(metrics.counter('translation_rerequested_lines_total', provider='openai'), 2)
@@ -0,0 +1,145 @@
+import os
+import tempfile
+from typing import List, Optional
+import unittest
+from unittest import mock
+
+from autosub.metrics import metrics
+from autosub.models.language import Language, Languages
+from autosub.models.phrase_localisation import PhraseLocalisation
+from autosub.models.translation_context import ContextSource, TranslationContext
+from autosub.providers.base.translator import Translator
+from autosub.providers.cache import CachedTranslator, TranslationCache, hash_context
+
+
+class RecordingTranslator(Translator):
+    """Upper-cases lines, recording what it was asked to translate"""
+
+    def __init__(self, drop_last_line: bool = False):
+        self.inputs: List[List[str]] = []
+        self._drop_last_line = drop_last_line
+
+    def translate(
+        self,
+        input: List[str],
+        source_language: Language,
+        target_language: Language,
+        input_description: Optional[str] = None,
+        context: Optional[TranslationContext] = None,
+    ) -> List[str]:
+        self.inputs.append(input)
+        translated = [text.upper() for text in input]
+        return translated[:-1] if self._drop_last_line else translated
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.sqlite')
+        self.time = FakeTime()
+        patch = mock.patch('autosub.providers.cache.time.time', self.time)
+        patch.start()
+        self.addCleanup(patch.stop)
+        metrics.reset()
+
+    def _cache(self, **kwargs) -> TranslationCache:
+        cache = TranslationCache(self.path, **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def _translate(self, translator: Translator, input: List[str], context: Optional[TranslationContext] = None) -> List[str]:
+        return translator.translate(input, Languages.JA.value, Languages.EN.value, 'dialogue', context)
+
+
+class CachedTranslatorTest(CacheTest):
+    def test_only_misses_are_sent_to_the_translator(self):
+        translator = RecordingTranslator()
+        cached = CachedTranslator(translator, self._cache(), 'openai:gpt')
+        self.assertEqual(self._translate(cached, ['a', 'b']), ['A', 'B'])
+        self.assertEqual(self._translate(cached, ['b', 'c', 'a']), ['B', 'C', 'A'])
+        self.assertEqual(translator.inputs, [['a', 'b'], ['c']])
+        self.assertEqual(metrics.counter('translation_cache_hits_total'), 2)
+        self.assertEqual(metrics.counter('translation_cache_misses_total'), 3)
+
+    def test_cache_is_kept_between_runs(self):
+        self._translate(CachedTranslator(RecordingTranslator(), self._cache(), 'openai:gpt'), ['a'])
+        translator = RecordingTranslator()
+        cache = self._cache()
+        self.assertEqual(self._translate(CachedTranslator(translator, cache, 'openai:gpt'), ['a']), ['A'])
+        self.assertEqual(translator.inputs, [])
+        self.assertEqual(cache.hit_rate, 1.0)
+
+    def test_lines_repeated_in_the_input_are_translated_once(self):
+        translator = RecordingTranslator()
+        cache = self._cache()
+        result = self._translate(CachedTranslator(translator, cache, 'openai:gpt'), ['a', 'b', 'a', 'a'])
+        self.assertEqual(result, ['A', 'B', 'A', 'A'])
+        self.assertEqual(translator.inputs, [['a', 'b']])
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+    def test_other_namespace_or_context_misses(self):
+        translator = RecordingTranslator()
+        cache = self._cache()
+        context = TranslationContext(synopsis='A story', phrases=[PhraseLocalisation(foreign='東京', local='Tokyo')])
+        self._translate(CachedTranslator(translator, cache, 'openai:gpt'), ['a'])
+        self._translate(CachedTranslator(translator, cache, 'gcloud'), ['a'])
+        self._translate(CachedTranslator(translator, cache, 'openai:gpt'), ['a'], context)
+        self.assertEqual(translator.inputs, [['a'], ['a'], ['a']])
+
+    def test_context_from_another_revision_with_the_same_content_hits(self):
+        phrases = [PhraseLocalisation(foreign='東京', local='Tokyo')]
+        old = TranslationContext(synopsis='A story', phrases=phrases, sources=[ContextSource(title='Page', revision_id=1)])
+        new = TranslationContext(synopsis='A story', phrases=phrases, sources=[ContextSource(title='Page', revision_id=2)])
+        self.assertEqual(hash_context(old), hash_context(new))
+
+    def test_translator_returning_the_wrong_number_of_lines_raises_and_caches_nothing(self):
+        cache = self._cache()
+        with self.assertRaisesRegex(RuntimeError, 'returned 1 lines for 2 inputs'):
+            self._translate(CachedTranslator(RecordingTranslator(drop_last_line=True), cache, 'openai:gpt'), ['a', 'b'])
+        translator = RecordingTranslator()
+        self._translate(CachedTranslator(translator, cache, 'openai:gpt'), ['a', 'b'])
+        self.assertEqual(translator.inputs, [['a', 'b']])
+
+
+class TranslationCacheTest(CacheTest):
+    def test_entries_older_than_max_age_miss_and_are_evicted(self):
+        cache = self._cache(max_age_seconds=60)
+        cache.put_many([('old', 'OLD')])
+        self.time.now += 30
+        cache.put_many([('new', 'NEW')])
+        self.time.now += 31
+        self.assertEqual(cache.get_many(['old', 'new']), {'new': 'NEW'})
+        self.assertEqual(cache.evict(), 1)
+        self.time.now -= 61
+        self.assertEqual(cache.get_many(['old', 'new']), {'new': 'NEW'})
+
+    def test_least_recently_used_entries_beyond_max_entries_are_evicted(self):
+        cache = self._cache(max_entries=2)
+        for key in ['a', 'b', 'c']:
+            self.time.now += 1
+            cache.put_many([(key, key.upper())])
+        self.time.now += 1
+        cache.get_many(['a'])
+        self.assertEqual(cache.evict(), 1)
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 'A', 'c': 'C'})
+
+    def test_nothing_is_evicted_without_limits(self):
+        cache = self._cache()
+        cache.put_many([(str(index), str(index)) for index in range(10)])
+        self.time.now += 10 ** 9
+        self.assertEqual(cache.evict(), 0)
+        self.assertEqual(len(cache.get_many([str(index) for index in range(10)])), 10)
+
+    def test_lookups_of_more_keys_than_sqlite_binds_at_once(self):
+        cache = self._cache()
+        cache.put_many([(str(index), str(index)) for index in range(1200)])
+        self.assertEqual(len(cache.get_many([str(index) for index in range(1200)])), 1200)
@@ -0,0 +1,63 @@
+import os
+import tempfile
+from typing import List
+import unittest
+
+import pysubs2
+
+from autosub.combine import Cue, merge_cues, write_merged_subtitles
+from autosub.models.subtitle import SubtitleGroup
+
+
+GROUPS = [
+    SubtitleGroup(name='Japanese', color_hex='#ffffff', margin_bottom=0, json_path=''),
+    SubtitleGroup(name='English', color_hex='#ffff00', margin_bottom=20, json_path=''),
+    SubtitleGroup(name='W+L/C', color_hex='#00ffff', margin_bottom=40, json_path=''),
+]
+CUES_OF_GROUPS: List[List[Cue]] = [
+    [(0, 1000, 'おはよう'), (5000, 6000, 'またね')],
+    [(0, 1000, 'Good morning'), (2000, 3000, 'See you')],
+    [(500, 1500, 'Commentary')],
+]
+
+
+class MergeCuesTest(unittest.TestCase):
+    def test_cues_keep_the_index_of_their_group(self):
+        self.assertEqual(
+            list(merge_cues([[(0, 1, 'a')], [(0, 1, 'b')], [(5, 6, 'c')]])),
+            [(0, 0, 1, 'a'), (0, 1, 1, 'b'), (5, 2, 6, 'c')],
+        )
+
+    def test_cues_are_ordered_by_start_then_group(self):
+        merged = list(merge_cues(CUES_OF_GROUPS))
+        self.assertEqual([(start, group_index) for (start, group_index, _, _) in merged], [(0, 0), (0, 1), (500, 2), (2000, 1), (5000, 0)])
+
+
+class WriteMergedSubtitlesTest(unittest.TestCase):
+    def _write(self, extension: str) -> pysubs2.SSAFile:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'combined' + extension)
+            count = write_merged_subtitles(path, GROUPS, merge_cues(CUES_OF_GROUPS), prefix_group_name=True)
+            self.assertEqual(count, 5)
+            return pysubs2.load(path)
+
+    def _expected_texts(self) -> List[str]:
+        return [f"{GROUPS[group_index].name}: {text}" for (_, group_index, _, text) in merge_cues(CUES_OF_GROUPS)]
+
+    def test_each_ass_event_has_the_style_and_prefix_of_its_group(self):
+        for extension in ('.ass', '.ssa'):
+            with self.subTest(extension=extension):
+                subtitles = self._write(extension)
+                self.assertEqual([event.style for event in subtitles], ['Japanese', 'English', 'W+L/C', 'English', 'Japanese'])
+                self.assertEqual([event.text for event in subtitles], self._expected_texts())
+                self.assertEqual(subtitles.styles['English'].marginv, subtitles.styles['Japanese'].marginv + 20)
+
+    def test_srt_events_are_prefixed_with_their_group(self):
+        subtitles = self._write('.srt')
+        self.assertEqual([event.text for event in subtitles], self._expected_texts())
+        self.assertEqual([(event.start, event.end) for event in subtitles][:3], [(0, 1000), (0, 1000), (500, 1500)])
+
+    def test_other_formats_are_saved_by_pysubs2(self):
+        subtitles = self._write('.json')
+        self.assertEqual([event.style for event in subtitles], ['Japanese', 'English', 'W+L/C', 'English', 'Japanese'])
+        self.assertEqual([event.text for event in subtitles], self._expected_texts())
@@ -0,0 +1,156 @@
+from typing import Dict, List, Optional
+import unittest
+
+from autosub.models.phrase_localisation import PhraseLocalisation
+from autosub.models.translation_context import TranslationContext
+from autosub.models.wiki import WikiPage
+from autosub.wiki.context_builder import IncrementalContextBuilder
+from autosub.wiki.context_transformer.wikipage_transformer import WikipageTransformer
+
+
+EREN = PhraseLocalisation(foreign='エレン', local='Eren')
+MIKASA = PhraseLocalisation(foreign='ミカサ', local='Mikasa')
+LEVI = PhraseLocalisation(foreign='リヴァイ', local='Levi')
+
+
+class FakeWiki:
+    """Pages with a revision id and the phrases an extraction finds in them, recording what was downloaded"""
+
+    def __init__(self, revisions: Dict[str, int], phrases: Dict[str, List[PhraseLocalisation]], phrase_page: Optional[str] = None):
+        self.revisions = revisions
+        self.phrases = phrases
+        self.phrase_page = phrase_page
+        self.downloaded: List[str] = []
+        self.synopses: List[str] = []
+        self.extracted: List[str] = []
+
+    def _page(self, title: str) -> WikiPage:
+        self.downloaded.append(title)
+        return WikiPage(title=title, wikicodes=[], revision_id=self.revisions[title])
+
+    def retrieve_revision_ids(self, titles: List[str]) -> Dict[str, Optional[int]]:
+        return {title: self.revisions[title] for title in titles if title in self.revisions}
+
+    def retrieve_wikipage(self, title: str) -> WikiPage:
+        return self._page(title)
+
+    def retrieve_wikipages(self, titles: List[str]) -> Dict[str, WikiPage]:
+        return {title: self._page(title) for title in titles if title in self.revisions}
+
+
+class FakeTransformer(WikipageTransformer):
+    def __init__(self, wiki: FakeWiki, wikipage: WikiPage):
+        super().__init__(wiki_transport=wiki, llm_transport=None, wikipage=wikipage)  # type: ignore[arg-type]
+        self._wiki = wiki
+
+    def prepare_synopsis(self) -> Optional[str]:
+        self._wiki.synopses.append(self.wikipage.title)
+        return f"{self.wikipage.title} r{self.wikipage.revision_id}"
+
+    def find_phrase_page(self) -> WikiPage:
+        if self._wiki.phrase_page is None:
+            return self.wikipage
+        return self._wiki.retrieve_wikipage(self._wiki.phrase_page)
+
+    def extract_phrases(self, wikipage: WikiPage) -> List[PhraseLocalisation]:
+        self._wiki.extracted.append(wikipage.title)
+        return list(self._wiki.phrases[wikipage.title])
+
+
+class IncrementalContextBuilderTest(unittest.TestCase):
+    def _builder(self, wiki: FakeWiki) -> IncrementalContextBuilder:
+        return IncrementalContextBuilder(
+            wiki_transport=wiki,  # type: ignore[arg-type]
+            create_transformer=lambda wikipage: FakeTransformer(wiki, wikipage),
+        )
+
+    def _wiki(self) -> FakeWiki:
+        return FakeWiki(
+            revisions={'Attack on Titan': 1, 'Characters': 10},
+            phrases={'Attack on Titan': [], 'Characters': [EREN, MIKASA]},
+            phrase_page='Characters',
+        )
+
+    def _build(self, wiki: FakeWiki, previous: Optional[TranslationContext] = None, title: str = 'Attack on Titan') -> Optional[TranslationContext]:
+        return self._builder(wiki).build(title, previous)
+
+    def test_first_build_records_the_revision_and_phrases_of_each_source(self):
+        context = self._build(self._wiki())
+        assert context is not None
+        self.assertEqual(context.synopsis, 'Attack on Titan r1')
+        self.assertEqual(context.phrases, [EREN, MIKASA])
+        self.assertEqual([(source.title, source.revision_id) for source in context.sources], [('Attack on Titan', 1), ('Characters', 10)])
+        self.assertEqual(context.sources[0].phrase_fingerprints, [])
+        self.assertEqual(context.sources[1].phrase_fingerprints, [EREN.fingerprint, MIKASA.fingerprint])
+
+    def test_nothing_is_rebuilt_when_no_source_changed(self):
+        wiki = self._wiki()
+        previous = self._build(wiki)
+        wiki.downloaded.clear()
+        self.assertIsNone(self._build(wiki, previous))
+        self.assertEqual(wiki.downloaded, [])
+
+    def test_changed_phrase_page_is_extracted_again_and_the_synopsis_kept(self):
+        wiki = self._wiki()
+        previous = self._build(wiki)
+        wiki.revisions['Characters'] = 11
+        wiki.phrases['Characters'] = [EREN, LEVI]
+
+        context = self._build(wiki, previous)
+        assert context is not None
+        self.assertEqual(wiki.synopses, ['Attack on Titan'])
+        self.assertEqual(wiki.extracted, ['Characters', 'Characters'])
+        self.assertEqual(context.synopsis, 'Attack on Titan r1')
+        self.assertEqual(context.phrases, [EREN, LEVI])
+        self.assertEqual([(source.title, source.revision_id) for source in context.sources], [('Attack on Titan', 1), ('Characters', 11)])
+
+    def test_changed_main_page_keeps_the_phrases_of_an_unchanged_phrase_page(self):
+        wiki = self._wiki()
+        previous = self._build(wiki)
+        wiki.revisions['Attack on Titan'] = 2
+
+        context = self._build(wiki, previous)
+        assert context is not None
+        self.assertEqual(wiki.synopses, ['Attack on Titan', 'Attack on Titan'])
+        self.assertEqual(wiki.extracted, ['Characters'])
+        self.assertEqual(context.synopsis, 'Attack on Titan r2')
+        self.assertEqual(context.phrases, [EREN, MIKASA])
+        self.assertEqual(context.sources[1].phrase_fingerprints, [EREN.fingerprint, MIKASA.fingerprint])
+
+    def test_phrases_added_by_hand_survive_a_rebuild(self):
+        wiki = self._wiki()
+        previous = self._build(wiki)
+        assert previous is not None
+        previous.phrases.append(LEVI)
+        wiki.revisions['Characters'] = 11
+        wiki.phrases['Characters'] = [MIKASA]
+
+        context = self._build(wiki, previous)
+        assert context is not None
+        self.assertEqual(context.phrases, [MIKASA, LEVI])
+        self.assertEqual(context.sources[1].phrase_fingerprints, [MIKASA.fingerprint])
+
+    def test_phrases_of_the_main_page_are_recorded_on_it(self):
+        wiki = FakeWiki(revisions={'Frieren': 5}, phrases={'Frieren': [EREN]})
+        context = self._build(wiki, title='Frieren')
+        assert context is not None
+        self.assertEqual([(source.title, source.phrase_fingerprints) for source in context.sources], [('Frieren', [EREN.fingerprint])])
+
+        wiki.revisions['Frieren'] = 6
+        wiki.phrases['Frieren'] = [MIKASA]
+        context = self._build(wiki, context, title='Frieren')
+        assert context is not None
+        self.assertEqual(context.phrases, [MIKASA])
+
+    def test_context_of_another_work_is_built_from_scratch(self):
+        wiki = self._wiki()
+        wiki.revisions['Frieren'] = 5
+        wiki.phrases['Frieren'] = [LEVI]
+        previous = self._build(wiki)
+        wiki.phrase_page = None
+
+        context = self._build(wiki, previous, title='Frieren')
+        assert context is not None
+        self.assertEqual(context.synopsis, 'Frieren r5')
+        self.assertEqual(context.phrases, [LEVI])
+        self.assertEqual([source.title for source in context.sources], ['Frieren'])
@@ -0,0 +1,176 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+import unittest
+from unittest import mock
+
+from tests.stubs import install_google_cloud
+install_google_cloud()
+
+from google.api_core.exceptions import NotFound  # noqa: E402
+
+from autosub.models.language import Languages  # noqa: E402
+from autosub.models.phrase_localisation import PhraseLocalisation  # noqa: E402
+from autosub.providers.gcloud_glossary import GC_MARKER_BLOB, GlossaryRegistry  # noqa: E402
+
+
+PHRASES = [PhraseLocalisation(foreign='東京', local='Tokyo'), PhraseLocalisation(foreign='大阪', local='Osaka')]
+
+
+class FakeBlob:
+    def __init__(self, storage: 'FakeStorageClient', name: str):
+        self._storage = storage
+        self.name = name
+        self.custom_time: Optional[datetime] = None
+        self.updated: Optional[datetime] = None
+
+    def upload_from_string(self, content: str):
+        self._storage.contents[self.name] = content
+        self._storage.blobs[self.name] = self
+        self.updated = datetime.now(timezone.utc)
+
+    def patch(self):
+        stored = self._storage.blobs.get(self.name)
+        if stored is None:
+            raise NotFound(self.name)
+        stored.custom_time = self.custom_time
+
+
+class FakeStorageClient:
+    """One bucket kept in memory, with the subset of the storage API the registry uses"""
+
+    def __init__(self):
+        self.blobs: Dict[str, FakeBlob] = {}
+        self.contents: Dict[str, str] = {}
+
+    def bucket(self, name: str) -> 'FakeStorageClient':
+        return self
+
+    def blob(self, name: str) -> FakeBlob:
+        return FakeBlob(self, name)
+
+    def get_blob(self, name: str) -> Optional[FakeBlob]:
+        return self.blobs.get(name)
+
+    def delete_blob(self, name: str):
+        del self.blobs[name]
+        del self.contents[name]
+
+
+class FakeTranslationClient:
+    def __init__(self):
+        self.glossaries: Dict[str, object] = {}
+        self.calls: List[str] = []
+
+    def get_glossary(self, name: str):
+        self.calls.append('get_glossary')
+        if name not in self.glossaries:
+            raise NotFound(name)
+        return self.glossaries[name]
+
+    def create_glossary(self, parent: str, glossary):
+        self.calls.append('create_glossary')
+        self.glossaries[glossary.name] = glossary
+        return mock.Mock(result=lambda timeout: glossary)
+
+    def list_glossaries(self, parent: str):
+        return [SimpleNamespace(name=name) for name in list(self.glossaries)]
+
+    def delete_glossary(self, name: str):
+        del self.glossaries[name]
+        return mock.Mock(result=lambda timeout: None)
+
+
+class GlossaryRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.storage = FakeStorageClient()
+        self.translation = FakeTranslationClient()
+
+    def _registry(self, **kwargs) -> GlossaryRegistry:
+        return GlossaryRegistry(
+            storage_client=self.storage,
+            translation_client=self.translation,
+            project_id='project',
+            location_id='location',
+            bucket='bucket',
+            **kwargs,
+        )
+
+    def _ensure(self, registry: GlossaryRegistry, phrases: List[PhraseLocalisation] = PHRASES) -> str:
+        return registry.ensure(phrases, Languages.JA.value, Languages.EN.value)
+
+    def _blob_name(self) -> str:
+        return GlossaryRegistry.glossary_id(PHRASES, Languages.JA.value, Languages.EN.value) + '.tsv'
+
+    def test_missing_glossary_is_created_from_an_uploaded_file(self):
+        path = self._ensure(self._registry())
+        self.assertEqual(list(self.translation.glossaries), [path])
+        glossary = self.translation.glossaries[path]
+        self.assertEqual(glossary.language_pair.source_language_code, Languages.JA.value.code)
+        self.assertEqual(glossary.input_config.gcs_source.input_uri, f"gs://bucket/{self._blob_name()}")
+        self.assertEqual(self.storage.contents[self._blob_name()], "東京\tTokyo\n大阪\tOsaka")
+
+    def test_glossary_of_an_earlier_run_is_reused_and_marked_used(self):
+        path = self._ensure(self._registry())
+        self.storage.blobs[self._blob_name()].custom_time = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        self.translation.calls.clear()
+
+        self.assertEqual(self._ensure(self._registry()), path)
+        self.assertEqual(self.translation.calls, ['get_glossary'])
+        self.assertGreater(self.storage.blobs[self._blob_name()].custom_time, datetime.now(timezone.utc) - timedelta(minutes=1))
+
+    def test_other_phrases_or_languages_get_their_own_glossary(self):
+        registry = self._registry()
+        paths = {
+            self._ensure(registry),
+            self._ensure(registry, PHRASES[:1]),
+            registry.ensure(PHRASES, Languages.JA.value, Languages.ZH_TW.value),
+        }
+        self.assertEqual(len(paths), 3)
+        self.assertEqual(len(self.translation.glossaries), 3)
+
+    def test_ensured_glossary_is_not_asked_about_again(self):
+        registry = self._registry()
+        path = self._ensure(registry)
+        self.assertEqual(self._ensure(registry), path)
+        self.assertEqual(self.translation.calls, ['get_glossary', 'create_glossary'])
+
+    def test_file_deleted_out_of_band_is_uploaded_again(self):
+        path = self._ensure(self._registry())
+        self.storage.delete_blob(self._blob_name())
+
+        self.assertEqual(self._ensure(self._registry()), path)
+        self.assertEqual(self.translation.calls.count('create_glossary'), 1)
+        self.assertEqual(self.storage.contents[self._blob_name()], "東京\tTokyo\n大阪\tOsaka")
+
+    def test_glossaries_unused_for_max_age_are_collected(self):
+        registry = self._registry(max_age=timedelta(days=30))
+        stale = self._ensure(registry, PHRASES[:1])
+        fresh = self._ensure(registry)
+        stale_blob = stale.rsplit('/', 1)[1] + '.tsv'
+        self.storage.blobs[stale_blob].custom_time = datetime.now(timezone.utc) - timedelta(days=31)
+        self.translation.glossaries['projects/project/locations/location/glossaries/other'] = object()
+
+        self.assertEqual(registry.collect_garbage(), 1)
+        self.assertNotIn(stale, self.translation.glossaries)
+        self.assertNotIn(stale_blob, self.storage.blobs)
+        self.assertIn(fresh, self.translation.glossaries)
+        self.assertIn('projects/project/locations/location/glossaries/other', self.translation.glossaries)
+
+    def test_garbage_is_collected_once_per_interval_and_checked_once_per_registry(self):
+        registry = self._registry(gc_interval=timedelta(days=1))
+        with mock.patch.object(GlossaryRegistry, 'collect_garbage', return_value=0) as collect_garbage:
+            registry.collect_garbage_if_due()
+            marker = self.storage.blobs[GC_MARKER_BLOB]
+            marker.custom_time = datetime.now(timezone.utc) - timedelta(days=2)
+            # Due again, but this registry has already checked
+            registry.collect_garbage_if_due()
+            self.assertEqual(collect_garbage.call_count, 1)
+
+            marker.custom_time = datetime.now(timezone.utc) - timedelta(hours=1)
+            self._registry(gc_interval=timedelta(days=1)).collect_garbage_if_due()
+            self.assertEqual(collect_garbage.call_count, 1)
+
+            marker.custom_time = datetime.now(timezone.utc) - timedelta(days=2)
+            self._registry(gc_interval=timedelta(days=1)).collect_garbage_if_due()
+            self.assertEqual(collect_garbage.call_count, 2)
@@ -0,0 +1,138 @@
+from datetime import timedelta
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+import unittest
+from unittest import mock
+import wave
+
+import numpy as np
+
+from tests.stubs import install_google_cloud
+install_google_cloud()
+
+from autosub.models.audio import AUDIO_SAMPLE_RATE, AudioWindow  # noqa: E402
+import autosub.providers.gcloud_speech as gcloud_speech  # noqa: E402
+from autosub.providers.gcloud_speech import ChunkedRecognizer  # noqa: E402
+
+
+AUDIO_SECONDS = 100
+SILENCES = [(28, 29), (55, 56), (83, 84)]
+
+
+def _audio() -> np.ndarray:
+    samples = np.full(AUDIO_SECONDS * AUDIO_SAMPLE_RATE, 0.5, dtype=np.float32)
+    for (start, end) in SILENCES:
+        samples[start * AUDIO_SAMPLE_RATE:end * AUDIO_SAMPLE_RATE] = 0
+    return samples
+
+
+class FakeUploadCache:
+    """Records each chunk file as it is uploaded, and how many chunk files were on disk at the time"""
+
+    def __init__(self):
+        self.durations: Dict[str, float] = {}
+        self.files_on_disk: List[int] = []
+        self._lock = threading.Lock()
+
+    def ensure_uploaded(self, audio_file: str) -> str:
+        with wave.open(audio_file, 'rb') as f:
+            duration = f.getnframes() / f.getframerate()
+        with self._lock:
+            self.files_on_disk.append(len(os.listdir(os.path.dirname(audio_file))))
+            uri = f"gs://bucket/{len(self.durations)}"
+            self.durations[uri] = duration
+        return uri
+
+
+class _Word:
+    def __init__(self, start_time: timedelta, end_time: timedelta):
+        self.start_time = start_time
+        self.end_time = end_time
+
+
+class _Alternative:
+    def __init__(self, transcript: str, duration: float):
+        self.transcript = transcript
+        self.words = [_Word(timedelta(), timedelta(seconds=duration))]
+
+
+class _Result:
+    def __init__(self, transcript: str, duration: float):
+        self.alternatives = [_Alternative(transcript, duration)]
+
+
+class StubSpeechClient:
+    """Recognises each chunk as one sentence naming its upload, the first upload being the slowest to finish"""
+
+    def __init__(self, upload_cache: FakeUploadCache, release: Optional[threading.Event] = None):
+        self._upload_cache = upload_cache
+        self._release = release
+        self.requests: List[str] = []
+
+    def long_running_recognize(self, config, audio):
+        self.requests.append(audio.uri)
+        return mock.Mock(result=lambda timeout: self._recognise(audio.uri))
+
+    def _recognise(self, uri: str):
+        if self._release is not None:
+            self._release.wait(timeout=10)
+        if uri.endswith('/0'):
+            time.sleep(0.05)
+        return mock.Mock(results=[_Result(f"chunk {uri.rsplit('/', 1)[1]}", self._upload_cache.durations[uri])])
+
+
+def _stream(samples: np.ndarray, window_seconds: int = 10) -> Iterator[AudioWindow]:
+    window = window_seconds * AUDIO_SAMPLE_RATE
+    for start in range(0, len(samples), window):
+        yield AudioWindow(samples=samples[start:start + window], offset=timedelta(seconds=start / AUDIO_SAMPLE_RATE))
+
+
+class ChunkedRecognizerTest(unittest.TestCase):
+    def _recognize(self, client_release: Optional[threading.Event] = None, max_concurrency: int = 3):
+        upload_cache = FakeUploadCache()
+        client = StubSpeechClient(upload_cache, client_release)
+        recognizer = ChunkedRecognizer(speech_client=client, audio_upload_cache=upload_cache, chunk_seconds=30, max_concurrency=max_concurrency)
+        with mock.patch.object(gcloud_speech, 'stream_audio_as_pcm', lambda audio_file: _stream(_audio())):
+            return recognizer.recognize(config=None, audio_file='audio.wav'), upload_cache
+
+    def test_chunks_are_cut_in_silences(self):
+        transcriptions, _ = self._recognize()
+        starts = [transcription.time_start.total_seconds() for transcription in transcriptions]
+        self.assertEqual(len(starts), len(SILENCES) + 1)
+        self.assertEqual(starts[0], 0)
+        for (start, (silence_start, silence_end)) in zip(starts[1:], SILENCES):
+            self.assertTrue(silence_start <= start <= silence_end, f"cut at {start}s")
+        self.assertAlmostEqual(transcriptions[-1].time_end.total_seconds(), AUDIO_SECONDS, places=3)
+
+    def test_results_follow_the_timeline_whatever_order_chunks_finish_in(self):
+        transcriptions, _ = self._recognize()
+        self.assertEqual([transcription.text for transcription in transcriptions], ['chunk 0', 'chunk 1', 'chunk 2', 'chunk 3'])
+        for (previous, transcription) in zip(transcriptions, transcriptions[1:]):
+            self.assertEqual(previous.time_end, transcription.time_start)
+
+    def test_chunks_are_cut_and_written_only_when_a_worker_is_free(self):
+        cut: List[float] = []
+        chunk_audio_at_silence = gcloud_speech.chunk_audio_at_silence
+
+        def counted(*args, **kwargs) -> Iterator[AudioWindow]:
+            for chunk in chunk_audio_at_silence(*args, **kwargs):
+                cut.append(chunk.offset.total_seconds())
+                yield chunk
+
+        release = threading.Event()
+        result: List[Tuple] = []
+        with mock.patch.object(gcloud_speech, 'chunk_audio_at_silence', counted):
+            thread = threading.Thread(target=lambda: result.append(self._recognize(release, max_concurrency=2)))
+            thread.start()
+            time.sleep(0.2)
+            # Both workers wait for the client, so no third chunk is cut yet
+            self.assertEqual(len(cut), 2)
+            release.set()
+            thread.join(timeout=10)
+
+        transcriptions, upload_cache = result[0]
+        self.assertEqual(len(cut), 4)
+        self.assertEqual(len(transcriptions), 4)
+        self.assertLessEqual(max(upload_cache.files_on_disk), 2)
@@ -0,0 +1,53 @@
+import unittest
+
+from autosub.models.phrase_localisation import PhraseLocalisation
+from autosub.providers.glossary import FALLBACK_PHRASES, GlossaryIndex
+
+
+PHRASES = [
+    PhraseLocalisation(foreign='ライナー・ブラウン', local='Reiner Braun'),
+    PhraseLocalisation(foreign='エレン・クルーガー', local='Eren Kruger'),
+    PhraseLocalisation(foreign='ファルコ・グライス', local='Falco Grice'),
+    PhraseLocalisation(foreign='調査兵団', local='Survey Corps'),
+]
+ENGLISH_PHRASES = [
+    PhraseLocalisation(foreign='Attack on Titan', local='進撃の巨人'),
+    PhraseLocalisation(foreign='The Rumbling', local='地鳴らし'),
+    PhraseLocalisation(foreign='Reiner Braun', local='ライナー・ブラウン'),
+    PhraseLocalisation(foreign='Eren', local='エレン'),
+]
+
+
+class GlossaryIndexTest(unittest.TestCase):
+    def test_finds_whole_phrases(self):
+        self.assertEqual(GlossaryIndex(PHRASES).find(['調査兵団が戻ってきた']), [PHRASES[3]])
+
+    def test_finds_names_by_their_parts(self):
+        self.assertEqual(GlossaryIndex(PHRASES).find(['いや ファルコ']), [PHRASES[2]])
+
+    def test_finds_names_without_trailing_long_vowel_mark(self):
+        found = GlossaryIndex(PHRASES).find(['座れよ ライナ', 'あれ クルーガさん'])
+        self.assertEqual(found, [PHRASES[0], PHRASES[1]])
+
+    def test_select_falls_back_to_leading_phrases(self):
+        phrases = [PhraseLocalisation(foreign=f'名前{index}', local=f'Name {index}') for index in range(FALLBACK_PHRASES + 5)]
+        glossary = GlossaryIndex(phrases)
+        self.assertEqual(glossary.select(['はい']), phrases[:FALLBACK_PHRASES])
+        self.assertEqual(glossary.select(['名前7です']), [phrases[7]])
+
+    def test_rank_counts_a_name_once_per_text(self):
+        ranked = GlossaryIndex(PHRASES).rank(['ファルコ', 'ライナー・ブラウン', 'ライナ'])
+        self.assertEqual(ranked, [PHRASES[0], PHRASES[2], PHRASES[1], PHRASES[3]])
+
+    def test_english_phrases_are_not_found_by_stop_words(self):
+        self.assertEqual(GlossaryIndex(ENGLISH_PHRASES).find(['Go on, there is nothing here']), [])
+
+    def test_english_phrases_are_found_by_whole_words_only(self):
+        glossary = GlossaryIndex(ENGLISH_PHRASES)
+        self.assertEqual(glossary.find(['Where is Reiner?']), [ENGLISH_PHRASES[2]])
+        self.assertEqual(glossary.find(['the rumbling has begun']), [ENGLISH_PHRASES[1]])
+        self.assertEqual(glossary.find(['Keep the Titans back', 'Sirens everywhere']), [])
+        self.assertEqual(glossary.find(['Eren, attack!']), [ENGLISH_PHRASES[0], ENGLISH_PHRASES[3]])
+
+    def test_english_names_are_found_next_to_japanese(self):
+        self.assertEqual(GlossaryIndex(ENGLISH_PHRASES).find(['これはErenの']), [ENGLISH_PHRASES[3]])
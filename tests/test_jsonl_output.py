@@ -0,0 +1,133 @@
+from datetime import timedelta
+import os
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import unittest
+
+from autosub.cli.subtitle import _subtitle_video_incrementally
+from autosub.jsonl_output import TRANSCRIBED, TRANSLATED, SubtitleJSONLWriter, read_progress, read_translated
+from autosub.models.audio import AudioWindow
+from autosub.models.language import Language, Languages
+from autosub.models.transcription import Transcription
+from autosub.models.translation_context import TranslationContext
+from autosub.providers.base.transcriber import StreamingTranscriber
+from autosub.providers.base.translator import Translator
+
+
+PARAMETERS = {'video': '/videos/a.mp4', 'from_language': 'JA', 'to_language': 'EN', 'transcriber': 'whisper:small', 'translator': 'openai:gpt', 'context': ''}
+SEGMENTS = [
+    Transcription(speaker=None, text=text, time_start=timedelta(seconds=index), time_end=timedelta(seconds=index, milliseconds=500))
+    for (index, text) in enumerate(['おはよう', 'またね', 'どうした'])
+]
+
+
+class FakeTranscriber(StreamingTranscriber):
+    def __init__(self):
+        self.calls = 0
+
+    def transcribe(self, target_language: Language, audio_file: str, context: Optional[TranslationContext] = None) -> Tuple[Transcription, ...]:
+        raise AssertionError('only streaming is expected')
+
+    def iter_transcribe_stream(
+        self,
+        target_language: Language,
+        audio_windows: Iterable[AudioWindow],
+        context: Optional[TranslationContext] = None
+    ) -> Iterator[Transcription]:
+        # The audio is never read, so no ffmpeg process is started
+        self.calls += 1
+        yield from SEGMENTS
+
+
+class FakeTranslator(Translator):
+    def __init__(self):
+        self.inputs: List[List[str]] = []
+
+    def translate(
+        self,
+        input: List[str],
+        source_language: Language,
+        target_language: Language,
+        input_description: Optional[str] = None,
+        context: Optional[TranslationContext] = None,
+    ) -> List[str]:
+        self.inputs.append(input)
+        return [f"{target_language.code}:{text}" for text in input]
+
+
+class SubtitleJSONLTest(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._directory.name, 'a.jsonl')
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _write_interrupted_run(self, parameters: Optional[Dict[str, Any]]):
+        with SubtitleJSONLWriter(self.path) as writer:
+            if parameters is not None:
+                writer.write_header(parameters)
+            for (index, segment) in enumerate(SEGMENTS):
+                writer.write_segment(TRANSCRIBED, index, segment)
+            writer.write_transcription_complete(len(SEGMENTS))
+            writer.write_segment(TRANSLATED, 0, Transcription(speaker=None, text='en:おはよう', time_start=SEGMENTS[0].time_start, time_end=SEGMENTS[0].time_end))
+        # A crash in the middle of writing the next record
+        with open(self.path, 'a', encoding='utf8') as f:
+            f.write('{"type": "translated", "index": 1, "te')
+
+    def _subtitle(self, transcriber: FakeTranscriber, translator: FakeTranslator, parameters: Dict[str, Any], to_language: Language = Languages.EN.value):
+        return _subtitle_video_incrementally(
+            video='/videos/a.mp4',
+            output_file=self.path,
+            get_transcriber=lambda: transcriber,
+            translator=translator,
+            from_language=Languages.JA.value,
+            to_language=to_language,
+            context=None,
+            pipeline=False,
+            audio_window_seconds=600,
+            fsync_interval_seconds=5.0,
+            run_parameters=parameters,
+        )
+
+    def test_records_are_read_back_without_an_incomplete_last_line(self):
+        self._write_interrupted_run(PARAMETERS)
+        progress = read_progress(self.path)
+        self.assertEqual(progress.parameters, PARAMETERS)
+        self.assertEqual(progress.transcribed, SEGMENTS)
+        self.assertTrue(progress.transcription_complete)
+        self.assertEqual(list(progress.translated.keys()), [0])
+        self.assertEqual([record['text'] for record in read_translated(self.path)], ['en:おはよう'])
+
+    def test_appending_drops_the_incomplete_last_line(self):
+        self._write_interrupted_run(PARAMETERS)
+        with SubtitleJSONLWriter(self.path, append=True) as writer:
+            writer.write_segment(TRANSLATED, 1, SEGMENTS[1])
+        with open(self.path, 'r', encoding='utf8') as f:
+            self.assertTrue(all(line.endswith('}\n') for line in f))
+        self.assertEqual(sorted(read_progress(self.path).translated.keys()), [0, 1])
+
+    def test_run_with_the_same_parameters_translates_only_the_missing_lines(self):
+        self._write_interrupted_run(PARAMETERS)
+        transcriber, translator = FakeTranscriber(), FakeTranslator()
+        transcriptions = self._subtitle(transcriber, translator, dict(PARAMETERS))
+        self.assertEqual(transcriptions, tuple(SEGMENTS))
+        self.assertEqual(transcriber.calls, 0)
+        self.assertEqual(translator.inputs, [['またね', 'どうした']])
+        self.assertEqual([record['text'] for record in read_translated(self.path)], ['en:おはよう', 'en:またね', 'en:どうした'])
+
+    def test_run_with_other_parameters_starts_over(self):
+        self._write_interrupted_run(PARAMETERS)
+        transcriber, translator = FakeTranscriber(), FakeTranslator()
+        self._subtitle(transcriber, translator, {**PARAMETERS, 'to_language': 'ZH_TW'}, to_language=Languages.ZH_TW.value)
+        self.assertEqual(transcriber.calls, 1)
+        self.assertEqual(translator.inputs, [['おはよう', 'またね', 'どうした']])
+        self.assertEqual(read_progress(self.path).parameters, {**PARAMETERS, 'to_language': 'ZH_TW'})
+        self.assertEqual([record['text'] for record in read_translated(self.path)], ['zh-TW:おはよう', 'zh-TW:またね', 'zh-TW:どうした'])
+
+    def test_file_without_header_is_not_resumed(self):
+        self._write_interrupted_run(None)
+        transcriber, translator = FakeTranscriber(), FakeTranslator()
+        self._subtitle(transcriber, translator, dict(PARAMETERS))
+        self.assertEqual(transcriber.calls, 1)
+        self.assertEqual(len(read_translated(self.path)), 3)
@@ -0,0 +1,39 @@
+from typing import List
+import unittest
+from unittest import mock
+
+from tests.stubs import install_llama_cpp
+install_llama_cpp()
+
+from autosub.models.language import Languages  # noqa: E402
+from autosub.providers.llama import LLAMA  # noqa: E402
+
+
+class FakeLlama:
+    """Stands in for llama_cpp.Llama, replying to every batch prompt with a reply numbered from 1"""
+
+    def __init__(self, model_path: str, n_ctx: int):
+        self.prompts: List[str] = []
+
+    def tokenize(self, text: bytes) -> List[int]:
+        return list(text)
+
+    def __call__(self, prompt: str, max_tokens: int, stop: List[str]):
+        self.prompts.append(prompt)
+        source_lines = prompt.split(':\n', 1)[1].split('\n\n', 1)[0].split('\n')
+        reply = '\n'.join(f"{number}: {line.split(': ', 1)[1].upper()}" for (number, line) in enumerate(source_lines, start=1))
+        return {'choices': [{'text': reply}], 'usage': {'prompt_tokens': len(prompt), 'completion_tokens': len(reply)}}
+
+
+class LLAMABatchTranslationTest(unittest.TestCase):
+    def _create_llama(self):
+        with mock.patch('autosub.providers.llama.Llama', FakeLlama):
+            return LLAMA(model='model.gguf', batch_lines=True)
+
+    def test_one_based_reply_lines_up_with_input(self):
+        llama = self._create_llama()
+        result = llama.translate(['a', 'b', 'c'], Languages.JA.value, Languages.EN.value)
+
+        self.assertEqual(result, ['A', 'B', 'C'])
+        self.assertEqual(len(llama._llm.prompts), 1)
+        self.assertEqual(llama.salvage_stats.misaligned_batches, 0)
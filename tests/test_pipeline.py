@@ -0,0 +1,104 @@
+from datetime import timedelta
+import time
+from typing import Iterator, List, Optional
+import unittest
+
+from autosub.models.language import Language, Languages
+from autosub.models.transcription import Transcription
+from autosub.models.translation_context import TranslationContext
+from autosub.providers.base.translator import Translator
+from autosub.utils import translate_transcriptions_pipelined
+
+
+class FakeTranslator(Translator):
+    """Upper-cases lines, counting one token per character when tokens are counted"""
+
+    def __init__(self, counts_tokens: bool = False, fail_on_call: Optional[int] = None):
+        self.batches: List[List[str]] = []
+        self._counts_tokens = counts_tokens
+        self._fail_on_call = fail_on_call
+
+    def translate(
+        self,
+        input: List[str],
+        source_language: Language,
+        target_language: Language,
+        input_description: Optional[str] = None,
+        context: Optional[TranslationContext] = None,
+    ) -> List[str]:
+        self.batches.append(input)
+        if self._fail_on_call == len(self.batches):
+            raise RuntimeError('translation failed')
+        return [text.upper() for text in input]
+
+    def count_tokens(self, text: str) -> Optional[int]:
+        return len(text) if self._counts_tokens else None
+
+
+class SlowSource:
+    """Transcriptions produced one at a time with a pause before each, recording how far it got and whether it was closed"""
+
+    def __init__(self, texts: List[str], pause_seconds: float = 0.01):
+        self.texts = texts
+        self.pause_seconds = pause_seconds
+        self.produced = 0
+        self.closed = False
+
+    def __iter__(self) -> Iterator[Transcription]:
+        try:
+            for (index, text) in enumerate(self.texts):
+                time.sleep(self.pause_seconds)
+                self.produced += 1
+                yield Transcription(speaker=None, text=text, time_start=timedelta(seconds=index), time_end=timedelta(seconds=index + 1))
+        finally:
+            self.closed = True
+
+
+def _translate(source: Iterator[Transcription], translator: Translator, **kwargs):
+    return translate_transcriptions_pipelined(
+        transcriptions=source,
+        translator=translator,
+        source_language=Languages.JA.value,
+        target_language=Languages.EN.value,
+        input_description='dialogue',
+        context=None,
+        **kwargs,
+    )
+
+
+class PipelinedTranslationTest(unittest.TestCase):
+    def test_batches_are_filled_even_when_the_producer_is_slow(self):
+        translator = FakeTranslator()
+        texts = [f"line {index:02d}" for index in range(10)]
+        transcribed, translated = _translate(iter(SlowSource(texts)), translator, batch_characters=30)
+        # 7 characters a line, so a batch is sent with the fifth line, and the rest at the end of input
+        self.assertEqual([len(batch) for batch in translator.batches], [5, 5])
+        self.assertEqual([t.text for t in transcribed], texts)
+        self.assertEqual([t.text for t in translated], [text.upper() for text in texts])
+
+    def test_batches_are_sized_by_tokens_when_the_translator_counts_them(self):
+        translator = FakeTranslator(counts_tokens=True)
+        texts = ['ab'] * 9
+        on_translated: List[int] = []
+        _translate(iter(SlowSource(texts, 0)), translator, batch_tokens=6, batch_characters=100, on_translated=lambda batch: on_translated.append(len(batch)))
+        self.assertEqual([len(batch) for batch in translator.batches], [3, 3, 3])
+        self.assertEqual(on_translated, [3, 3, 3])
+
+    def test_failed_translation_stops_and_closes_the_producer(self):
+        source = SlowSource([f"line {index}" for index in range(200)])
+        generator = iter(source)
+        with self.assertRaisesRegex(RuntimeError, 'translation failed'):
+            _translate(generator, FakeTranslator(fail_on_call=1), batch_characters=10)
+        self.assertTrue(source.closed)
+        produced = source.produced
+        time.sleep(0.05)
+        self.assertEqual(source.produced, produced)
+        self.assertLess(produced, 200)
+
+    def test_errors_of_the_producer_are_raised(self):
+        def failing() -> Iterator[Transcription]:
+            yield Transcription(speaker=None, text='a', time_start=timedelta(), time_end=timedelta(seconds=1))
+            raise ValueError('transcription failed')
+
+        with self.assertRaisesRegex(ValueError, 'transcription failed'):
+            _translate(failing(), FakeTranslator())
@@ -0,0 +1,118 @@
+from typing import List
+import unittest
+
+from autosub.models.phrase_localisation import PhraseLocalisation
+from autosub.models.translation_plan import TranslationPlan
+from autosub.providers.glossary import GlossaryIndex
+from autosub.providers.planner import TokenBudgetPlanner, TokenCounter
+
+
+TOKYO = PhraseLocalisation(foreign='東京', local='Tokyo')
+OSAKA = PhraseLocalisation(foreign='大阪', local='Osaka')
+
+
+class CountingTokenizer:
+    """One token per character, recording the strings it was asked about"""
+
+    def __init__(self):
+        self.calls: List[str] = []
+
+    def __call__(self, text: str) -> int:
+        self.calls.append(text)
+        return len(text)
+
+
+def _planner(context_window: int = 100, **kwargs) -> TokenBudgetPlanner:
+    # 10 tokens are kept as buffer, the default completion ratio halves what remains after the prompt
+    return TokenBudgetPlanner(TokenCounter(CountingTokenizer()), context_window=context_window, buffer_tokens=10, min_input_tokens=10, **kwargs)
+
+
+class TokenCounterTest(unittest.TestCase):
+    def test_each_string_is_tokenized_once(self):
+        tokenizer = CountingTokenizer()
+        counter = TokenCounter(tokenizer)
+        self.assertEqual(counter.count_many(['ab', 'abc', 'ab']), 7)
+        self.assertEqual(counter.count('abc'), 3)
+        self.assertEqual(tokenizer.calls, ['ab', 'abc'])
+
+    def test_memo_is_bounded(self):
+        tokenizer = CountingTokenizer()
+        counter = TokenCounter(tokenizer, max_cached_strings=2)
+        for text in ['a', 'b', 'c', 'a']:
+            counter.count(text)
+        self.assertEqual(tokenizer.calls, ['a', 'b', 'c', 'a'])
+
+
+class TokenBudgetPlannerTest(unittest.TestCase):
+    def test_input_budget_leaves_room_for_the_completion(self):
+        self.assertEqual(_planner().input_budget(20), 35)
+        self.assertEqual(_planner(completion_ratio=0.5).input_budget(20), 46)
+
+    def test_prompt_leaving_too_little_input_raises(self):
+        with self.assertRaisesRegex(RuntimeError, 'not enough for input'):
+            _planner().input_budget(70)
+
+    def test_batches_are_filled_greedily_in_order(self):
+        # 7 characters and 3 tokens of numbering per line
+        texts = [f"line {index:02d}" for index in range(7)]
+        self.assertEqual([len(batch) for batch in _planner().batch_by_token_count(35, texts)], [3, 3, 1])
+        self.assertEqual(sum(_planner().batch_by_token_count(35, texts), []), texts)
+
+    def test_batches_are_capped_by_max_items(self):
+        texts = ['a'] * 5
+        self.assertEqual([len(batch) for batch in _planner(max_items_per_batch=2).batch_by_token_count(100, texts)], [2, 2, 1])
+        self.assertEqual([len(batch) for batch in _planner(max_items_per_batch=2).batch_by_token_count(100, texts, max_items_per_batch=4)], [4, 1])
+        with self.assertRaises(ValueError):
+            _planner(max_items_per_batch=0)
+
+    def test_line_longer_than_a_batch_raises(self):
+        with self.assertRaisesRegex(RuntimeError, 'longer than 10'):
+            _planner().batch_by_token_count(10, ['a' * 8])
+
+    def test_plan_counts_the_prompt_once_per_batch(self):
+        texts = [f"line {index:02d}" for index in range(7)]
+        plan = _planner().plan('p' * 20, texts)
+        self.assertEqual([len(batch) for batch in plan.batches], [3, 3, 1])
+        self.assertEqual(plan.requests, 3)
+        self.assertEqual(plan.prompt_tokens, 20 * 3 + 70)
+        self.assertEqual(plan.completion_tokens, 70)
+
+    def test_phrases_of_a_batch_are_counted_once_in_its_prompt(self):
+        planner = _planner(context_window=200)
+        texts = ['東京へ', '東京から', 'あした']
+        plan = planner.plan('p' * 20, texts, glossary=GlossaryIndex([TOKYO, OSAKA]))
+        self.assertEqual(plan.batches, [texts])
+        lines = sum(planner.line_tokens(text) for text in texts)
+        self.assertEqual(plan.prompt_tokens, 20 + lines + planner.phrase_tokens(TOKYO))
+        self.assertEqual(plan.completion_tokens, lines)
+
+    def test_batch_without_phrases_is_given_the_fallback_phrases(self):
+        planner = _planner(context_window=200)
+        plan = planner.plan('p' * 20, ['あした'], glossary=GlossaryIndex([TOKYO, OSAKA]))
+        self.assertEqual(plan.prompt_tokens, 20 + planner.line_tokens('あした') + planner.phrase_tokens(TOKYO) + planner.phrase_tokens(OSAKA))
+
+    def test_glossary_entries_count_against_the_context_window(self):
+        planner = _planner(context_window=100)
+        texts = ['東京へ行く' + 'a' * 7, '大阪へ行く' + 'a' * 7]
+        # 15 tokens a line, which fit twice in one batch, but not with the 10 tokens of each glossary entry
+        self.assertEqual(len(planner.plan('p' * 20, texts).batches), 1)
+        self.assertEqual(planner.plan('p' * 20, texts, glossary=GlossaryIndex([TOKYO, OSAKA])).batches, [[texts[0]], [texts[1]]])
+
+    def test_line_that_does_not_fit_with_its_glossary_raises(self):
+        with self.assertRaisesRegex(RuntimeError, 'do not fit'):
+            _planner(context_window=100).plan('p' * 20, ['東京' + 'a' * 30], glossary=GlossaryIndex([TOKYO]))
+
+
+class TranslationPlanTest(unittest.TestCase):
+    def test_cost_is_estimated_from_the_prices_per_1k_tokens(self):
+        plan = TranslationPlan(
+            batches=[['a']],
+            prompt_tokens=3000,
+            completion_tokens=1000,
+            prompt_price_per_1k_tokens=0.01,
+            completion_price_per_1k_tokens=0.03,
+        )
+        self.assertAlmostEqual(plan.estimated_cost, 0.06)
+
+    def test_cost_is_unknown_without_prices(self):
+        self.assertIsNone(TranslationPlan(batches=[], prompt_tokens=10, completion_tokens=10).estimated_cost)
@@ -0,0 +1,181 @@
+from typing import Any, Dict, List
+import unittest
+from unittest import mock
+
+import requests
+
+from tests.stubs import install_openai
+install_openai()
+
+import openai  # noqa: E402
+
+from autosub.models.language import Languages  # noqa: E402
+from autosub.providers.openai import OpenAI, _is_retryable  # noqa: E402
+from autosub.providers.scheduler import RateLimiter, RequestScheduler  # noqa: E402
+from tests.fake_http import FakeEndpoint  # noqa: E402
+
+
+class FakeClock:
+    """Time that only moves when something sleeps"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps: List[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _is_retryable_status(e: Exception) -> bool:
+    # The policy of the providers: rate limits and server errors are transient, other client errors are not
+    return isinstance(e, requests.HTTPError) and (e.response.status_code == 429 or e.response.status_code >= 500)
+
+
+def _post(url: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    response = requests.post(url, json=body, timeout=5)
+    response.raise_for_status()
+    return response.json()
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_requests_beyond_the_limit_wait_for_the_window_to_move(self):
+        clock = FakeClock()
+        limiter = RateLimiter(requests_per_minute=2, clock=clock, sleep=clock.sleep)
+        for _ in range(3):
+            limiter.acquire()
+        self.assertEqual(clock.sleeps, [60.0])
+
+    def test_tokens_beyond_the_limit_wait_for_the_window_to_move(self):
+        clock = FakeClock()
+        limiter = RateLimiter(tokens_per_minute=1000, clock=clock, sleep=clock.sleep)
+        limiter.acquire(600)
+        clock.now = 10.0
+        limiter.acquire(300)
+        limiter.acquire(300)
+        # Waits until the first request leaves the window, 60s after it was sent
+        self.assertEqual(clock.sleeps, [50.0])
+
+    def test_oversized_request_is_let_through_on_an_empty_window(self):
+        clock = FakeClock()
+        limiter = RateLimiter(tokens_per_minute=100, clock=clock, sleep=clock.sleep)
+        limiter.acquire(500)
+        self.assertEqual(clock.sleeps, [])
+
+
+class RequestSchedulerTest(unittest.TestCase):
+    def _scheduler(self, **kwargs) -> RequestScheduler:
+        return RequestScheduler(is_retryable=_is_retryable_status, sleep=lambda seconds: None, **kwargs)
+
+    def test_rate_limited_and_server_errors_are_retried(self):
+        with FakeEndpoint(statuses=[429, 500, 503]) as endpoint:
+            result = self._scheduler(max_retries=5).call(lambda: _post(endpoint.url, {'n': 1}))
+        self.assertEqual(result, {'n': 1})
+        self.assertEqual(len(endpoint.requests), 4)
+
+    def test_client_errors_are_not_retried(self):
+        with FakeEndpoint(statuses=[400]) as endpoint:
+            with self.assertRaises(requests.HTTPError) as raised:
+                self._scheduler(max_retries=5).call(lambda: _post(endpoint.url, {}))
+        self.assertEqual(raised.exception.response.status_code, 400)
+        self.assertEqual(len(endpoint.requests), 1)
+
+    def test_retries_stop_after_max_retries(self):
+        with FakeEndpoint(statuses=[500] * 10) as endpoint:
+            with self.assertRaises(requests.HTTPError):
+                self._scheduler(max_retries=2).call(lambda: _post(endpoint.url, {}))
+        self.assertEqual(len(endpoint.requests), 3)
+
+    def test_backoff_grows_exponentially_up_to_max_delay(self):
+        delays: List[float] = []
+        scheduler = RequestScheduler(is_retryable=_is_retryable_status, sleep=delays.append, base_delay=1.0, max_delay=3.0, max_retries=4)
+        with FakeEndpoint(statuses=[500] * 4) as endpoint, mock.patch('autosub.providers.scheduler.random.uniform', lambda low, high: high):
+            scheduler.call(lambda: _post(endpoint.url, {}))
+        self.assertEqual(delays, [1.0, 2.0, 3.0, 3.0])
+
+    def test_no_more_requests_than_max_concurrency_are_in_flight(self):
+        with FakeEndpoint(delay_seconds=0.05) as endpoint:
+            scheduler = self._scheduler(max_concurrency=3)
+            results = scheduler.map(lambda n: scheduler.call(lambda: _post(endpoint.url, {'n': n})), list(range(12)))
+        self.assertEqual(results, [{'n': n} for n in range(12)])
+        self.assertEqual(endpoint.max_in_flight, 3)
+
+    def test_requests_of_all_workers_share_the_rate_limit(self):
+        clock = FakeClock()
+        limiter = RateLimiter(requests_per_minute=4, clock=clock, sleep=clock.sleep)
+        with FakeEndpoint() as endpoint:
+            scheduler = self._scheduler(max_concurrency=4, rate_limiter=limiter)
+            scheduler.map(lambda n: scheduler.call(lambda: _post(endpoint.url, {'n': n})), list(range(8)))
+        self.assertEqual(len(endpoint.requests), 8)
+        # The last four requests each waited for a slot of the first minute to free up
+        self.assertGreaterEqual(clock.now, 60.0)
+
+
+# How openai 0.27 turns the status of a failed response into an error
+_OPENAI_ERRORS = {
+    400: 'InvalidRequestError',
+    401: 'AuthenticationError',
+    403: 'PermissionError',
+    404: 'InvalidRequestError',
+    409: 'TryAgain',
+    429: 'RateLimitError',
+    503: 'ServiceUnavailableError',
+}
+
+
+def _create_chat_completion(api_key: str, api_base: str, request_timeout, model: str, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+    """Sends the request like openai 0.27 does, through the session the library was given"""
+    response = openai.requestssession.post(f"{api_base}/chat/completions", json={'model': model, 'messages': messages}, timeout=request_timeout)
+    if response.status_code != 200:
+        error = getattr(openai.error, _OPENAI_ERRORS.get(response.status_code, 'APIError'))
+        raise error(response.text, http_body=response.text, http_status=response.status_code)
+    return response.json()
+
+
+def _upper_case_reply(request: Dict[str, Any]) -> Dict[str, Any]:
+    lines = request['messages'][-1]['content'].split('\n')
+    return {'choices': [{'message': {'content': '\n'.join(line.upper() for line in lines)}}]}
+
+
+class OpenAIRetryTest(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(openai.ChatCompletion, 'create', _create_chat_completion),
+            # No backoff, the retry schedule is tested above
+            mock.patch('autosub.providers.scheduler.random.uniform', lambda low, high: 0),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def _translate(self, endpoint: FakeEndpoint, input: List[str], **kwargs) -> List[str]:
+        translator = OpenAI(api_key='key', model='gpt-3.5-turbo', base_url=endpoint.url, timeout_seconds=5, **kwargs)
+        return translator.translate(input, Languages.JA.value, Languages.EN.value, 'dialogue')
+
+    def test_rate_limited_and_server_errors_are_retried(self):
+        with FakeEndpoint(statuses=[429, 503, 500, 502], reply=_upper_case_reply) as endpoint:
+            self.assertEqual(self._translate(endpoint, ['a', 'b']), ['A', 'B'])
+        self.assertEqual(len(endpoint.requests), 5)
+
+    def test_client_errors_are_not_retried(self):
+        for (status, error) in [(400, 'InvalidRequestError'), (401, 'AuthenticationError'), (403, 'PermissionError')]:
+            with self.subTest(status=status), FakeEndpoint(statuses=[status], reply=_upper_case_reply) as endpoint:
+                with self.assertRaises(getattr(openai.error, error)):
+                    self._translate(endpoint, ['a'])
+                self.assertEqual(len(endpoint.requests), 1)
+
+    def test_batches_are_sent_at_most_max_concurrency_at_a_time(self):
+        with FakeEndpoint(reply=_upper_case_reply, delay_seconds=0.05) as endpoint:
+            result = self._translate(endpoint, [f"line {index}" for index in range(8)], max_concurrency=2, max_items_per_batch=1)
+        self.assertEqual(result, [f"LINE {index}" for index in range(8)])
+        self.assertEqual(len(endpoint.requests), 8)
+        self.assertEqual(endpoint.max_in_flight, 2)
+
+    def test_errors_without_a_status_are_retried(self):
+        self.assertTrue(_is_retryable(openai.error.APIConnectionError('connection reset')))
+        self.assertTrue(_is_retryable(openai.error.Timeout('timed out')))
+        self.assertTrue(_is_retryable(openai.error.APIError('stream broken')))
+        self.assertFalse(_is_retryable(ValueError('bad input')))
@@ -0,0 +1,44 @@
+from typing import List, Optional
+import unittest
+
+from autosub.providers.base.llm import LLM
+from autosub.wiki.selection import HeuristicLLM
+
+
+class RecordingLLM(LLM):
+    def __init__(self):
+        self.calls: List[List[str]] = []
+
+    def select_one_from_list(self, input: List[str], item_description: str, criteria_description: str, allow_none: bool) -> Optional[str]:
+        self.calls.append(input)
+        return input[-1]
+
+
+class HeuristicLLMTest(unittest.TestCase):
+    def _select(self, input: List[str], criteria_description: str) -> Optional[str]:
+        return HeuristicLLM(RecordingLLM()).select_locally(input, criteria_description)
+
+    def test_exact_keyword_is_selected_locally(self):
+        self.assertEqual(self._select(['Production', 'Plot', 'Reception'], 'synopsis/overview'), 'Plot')
+        self.assertEqual(self._select(['制作', '登場人物', '評価'], 'character list'), '登場人物')
+
+    def test_heading_made_of_keywords_is_selected_locally(self):
+        self.assertEqual(self._select(['Production', 'Plot synopsis', 'Reception'], 'synopsis/overview'), 'Plot synopsis')
+        self.assertEqual(self._select(['Media', 'Characters list'], 'character list'), 'Characters list')
+
+    def test_near_spelling_is_left_to_the_llm(self):
+        self.assertIsNone(self._select(['History', 'Production', 'Reception', 'Media'], 'synopsis/overview'))
+
+    def test_heading_containing_a_keyword_is_left_to_the_llm(self):
+        self.assertIsNone(self._select(['Character design', 'Soundtrack', 'Episodes'], 'character list'))
+        self.assertIsNone(self._select(['Cast and crew', 'Soundtrack', 'Episodes'], 'character list'))
+        self.assertIsNone(self._select(['主な登場人物', '制作'], 'character list'))
+
+    def test_ambiguous_choice_is_left_to_the_llm(self):
+        self.assertIsNone(self._select(['Plot', 'Synopsis'], 'synopsis/overview'))
+
+    def test_llm_decides_when_nothing_is_obvious(self):
+        llm = RecordingLLM()
+        selected = HeuristicLLM(llm).select_one_from_list(['History', 'Media'], 'section headings', 'synopsis/overview', True)
+        self.assertEqual(selected, 'Media')
+        self.assertEqual(llm.calls, [['History', 'Media']])
@@ -0,0 +1,118 @@
+import tempfile
+from typing import Any, Callable, Dict, List
+import unittest
+from unittest import mock
+
+from autosub.models.wiki import WikiCode
+from autosub.wiki.transport import WikiTransport
+
+
+PREFIXES = ('Nihongo',)
+
+
+class FindTemplatesTest(unittest.TestCase):
+    def _names(self, raw: str) -> List[str]:
+        return [str(template.params[0].value).strip() for template in WikiCode(raw=raw).find_templates(PREFIXES)]
+
+    def _parsed_names(self, raw: str) -> List[str]:
+        code = WikiCode(raw=raw)
+        code.wiki_code_obj
+        return [str(template.params[0].value).strip() for template in code.find_templates(PREFIXES)]
+
+    def test_nested_templates_are_found(self):
+        raw = "* {{Nihongo|Eren|エレン}} and {{Main|{{nihongo|Mikasa|ミカサ}}}}"
+        self.assertEqual(self._names(raw), ['Eren', 'Mikasa'])
+
+    def test_templates_in_comments_and_nowiki_are_skipped(self):
+        raw = (
+            "<!-- {{Nihongo|Hidden|隠し}} -->{{Nihongo|Eren|エレン}}"
+            "<NOWIKI >{{Nihongo|Literal|文字}}</nowiki>{{Nihongo|Armin|アルミン}}"
+        )
+        self.assertEqual(self._names(raw), ['Eren', 'Armin'])
+        self.assertEqual(self._names(raw), self._parsed_names(raw))
+
+    def test_unclosed_comment_is_text_as_for_the_parser(self):
+        raw = "{{Nihongo|Eren|エレン}}<!-- {{Nihongo|Tail|尾}}"
+        self.assertEqual(self._names(raw), ['Eren', 'Tail'])
+        self.assertEqual(self._names(raw), self._parsed_names(raw))
+
+    def test_braces_in_comments_do_not_end_the_template(self):
+        raw = "{{Nihongo|Levi<!-- }} -->|リヴァイ}}"
+        self.assertEqual(len(self._names(raw)), 1)
+        self.assertEqual(self._names(raw), self._parsed_names(raw))
+
+
+def _page(title: str, revision_id: int, content: str) -> Dict[str, Any]:
+    return {'title': title, 'revisions': [{'revid': revision_id, 'slots': {'main': {'content': content}}}]}
+
+
+class FakeSession:
+    """Answers each API query with the reply for its parameters, recording the queries"""
+
+    def __init__(self, reply: Callable[[Dict[str, str]], Dict[str, Any]]):
+        self.queries: List[Dict[str, str]] = []
+        self._reply = reply
+
+    def request(self, method: str, url: str, params: Dict[str, str]):
+        self.queries.append(params)
+        return mock.Mock(status_code=200, content=b'{}', json=lambda: self._reply(params))
+
+    def close(self):
+        pass
+
+
+class WikiTransportTest(unittest.TestCase):
+    def _transport(self, session: FakeSession, **kwargs) -> WikiTransport:
+        transport = WikiTransport(base_url='https://en.wikipedia.org', user_agent='autosub-test', **kwargs)
+        transport._session = session  # type: ignore
+        return transport
+
+    def test_continued_query_keeps_the_content_of_every_page(self):
+        def reply(params: Dict[str, str]) -> Dict[str, Any]:
+            if 'rvcontinue' not in params:
+                # The content of the second page did not fit in the first response
+                return {
+                    'continue': {'rvcontinue': '2|0', 'continue': '||'},
+                    'query': {'pages': [_page('Eren', 1, 'eren'), {'title': 'Mikasa'}]},
+                }
+            return {'query': {'pages': [{'title': 'Eren'}, _page('Mikasa', 2, 'mikasa')]}}
+
+        session = FakeSession(reply)
+        pages = self._transport(session).retrieve_wikipages(['Eren', 'Mikasa'])
+        self.assertEqual({title: page.wikicodes[0].raw for (title, page) in pages.items()}, {'Eren': 'eren', 'Mikasa': 'mikasa'})
+        self.assertEqual(len(session.queries), 2)
+        self.assertEqual(session.queries[1]['rvcontinue'], '2|0')
+        self.assertEqual(session.queries[1]['titles'], 'Eren|Mikasa')
+
+    def test_pages_are_returned_under_the_requested_title_after_normalisation_and_redirects(self):
+        session = FakeSession(lambda params: {'query': {
+            'normalized': [{'from': 'eren yeager', 'to': 'Eren yeager'}],
+            'redirects': [{'from': 'Eren yeager', 'to': 'Eren Yeager'}, {'from': 'Captain Levi', 'to': 'Levi'}],
+            'pages': [_page('Eren Yeager', 1, 'eren'), _page('Levi', 2, 'levi'), {'title': 'Nobody', 'missing': True}],
+        }})
+        pages = self._transport(session).retrieve_wikipages(['eren yeager', 'Captain Levi', 'Nobody'])
+        self.assertEqual({title: page.revision_id for (title, page) in pages.items()}, {'eren yeager': 1, 'Captain Levi': 2})
+        self.assertEqual(pages['eren yeager'].title, 'eren yeager')
+
+    def test_titles_are_queried_in_batches_the_api_accepts(self):
+        session = FakeSession(lambda params: {'query': {'pages': [_page(title, 1, title) for title in params['titles'].split('|')]}})
+        titles = [f"Page {index}" for index in range(120)]
+        pages = self._transport(session).retrieve_wikipages(titles + titles[:10])
+        self.assertEqual(len(pages), 120)
+        self.assertEqual([len(query['titles'].split('|')) for query in session.queries], [50, 50, 20])
+
+    def test_cached_page_is_downloaded_again_only_when_its_revision_changes(self):
+        revision_ids = {'Eren': 1, 'Levi': 1}
+
+        def reply(params: Dict[str, str]) -> Dict[str, Any]:
+            titles = params['titles'].split('|')
+            return {'query': {'pages': [_page(title, revision_ids[title], f"{title} r{revision_ids[title]}") for title in titles]}}
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self._transport(FakeSession(reply), cache_dir=cache_dir).retrieve_wikipages(['Eren', 'Levi'])
+            revision_ids['Levi'] = 2
+            session = FakeSession(reply)
+            pages = self._transport(session, cache_dir=cache_dir).retrieve_wikipages(['Eren', 'Levi'])
+
+        self.assertEqual({title: page.wikicodes[0].raw for (title, page) in pages.items()}, {'Eren': 'Eren r1', 'Levi': 'Levi r2'})
+        self.assertEqual([(query['rvprop'], query['titles']) for query in session.queries], [('ids', 'Eren|Levi'), ('ids|content', 'Levi')])